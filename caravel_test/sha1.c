@@ -0,0 +1,286 @@
+/*
+ * SPDX-FileCopyrightText: 2021 Konrad Rzeszutek Wilk
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *      http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ * SPDX-License-Identifier: Apache-2.0
+ */
+
+#include "sha1.h"
+
+/* What the interrupts said since the last word went to CTRL_MSG_IN. */
+static volatile uint32_t sha1_irq_status;
+
+#ifdef SHA1_HOST
+/*
+ * test/test_firmware.py builds this on the host: the bus is the simulated
+ * sha1_wb, and while we spin it runs clocks and calls sha1_irq() for the
+ * IRQ. A wait it gives up on (non zero) returns instead of hanging.
+ */
+uint32_t (*sha1_host_read)(unsigned long addr);
+void (*sha1_host_write)(unsigned long addr, uint32_t val);
+int (*sha1_host_relax)(void);
+
+#define sha1_read(addr)		sha1_host_read(addr)
+#define sha1_write(addr, val)	sha1_host_write(addr, val)
+#define sha1_relax()		do { if (sha1_host_relax()) return; } while (0)
+#else
+static inline uint32_t sha1_read(unsigned long addr)
+{
+	return *(volatile uint32_t *)addr;
+}
+
+static inline void sha1_write(unsigned long addr, uint32_t val)
+{
+	*(volatile uint32_t *)addr = val;
+}
+
+#define sha1_relax()		do { } while (0)
+#endif
+
+/* rv32imc has no byte swap, only the digest as a key needs one. */
+static inline uint32_t be32(uint32_t val)
+{
+	return (val >> 24) | ((val >> 8) & 0xff00) | ((val << 8) & 0xff0000) | (val << 24);
+}
+
+static inline uint32_t le32_bytes(const uint8_t *p)
+{
+	return p[0] | ((uint32_t)p[1] << 8) | ((uint32_t)p[2] << 16) | ((uint32_t)p[3] << 24);
+}
+
+uint32_t sha1_irq(void)
+{
+	uint32_t status = sha1_read(CTRL_IRQ_STATUS);
+
+	sha1_write(CTRL_IRQ_STATUS, status); /* Ack the IRQ */
+	sha1_irq_status |= status;
+
+	return status;
+}
+
+/*
+ * CTRL_MSG_IN holds the bus while both buffers are full, so the words go
+ * out back to back with no looking at CTRL_SHA1_OPS in between. After
+ * sha1_restore() the first block goes on top of the h0..h4 written.
+ */
+#define SHA1_PUT16(get)						\
+	do {							\
+		if (ctx->loaded) {				\
+			sha1_write(CTRL_SHA1_OPS, SHA1_CONTINUE);	\
+			ctx->loaded = 0;			\
+		}						\
+		sha1_write(CTRL_MSG_IN, get(0));		\
+		sha1_write(CTRL_MSG_IN, get(1));		\
+		sha1_write(CTRL_MSG_IN, get(2));		\
+		sha1_write(CTRL_MSG_IN, get(3));		\
+		sha1_write(CTRL_MSG_IN, get(4));		\
+		sha1_write(CTRL_MSG_IN, get(5));		\
+		sha1_write(CTRL_MSG_IN, get(6));		\
+		sha1_write(CTRL_MSG_IN, get(7));		\
+		sha1_write(CTRL_MSG_IN, get(8));		\
+		sha1_write(CTRL_MSG_IN, get(9));		\
+		sha1_write(CTRL_MSG_IN, get(10));		\
+		sha1_write(CTRL_MSG_IN, get(11));		\
+		sha1_write(CTRL_MSG_IN, get(12));		\
+		sha1_write(CTRL_MSG_IN, get(13));		\
+		sha1_write(CTRL_MSG_IN, get(14));		\
+		sha1_write(CTRL_MSG_IN, get(15));		\
+		sha1_irq_status = 0;				\
+		ctx->saved = 0;					\
+	} while (0)
+
+/*
+ * Before handing the engine a new message: what CTRL_IRQ_STATUS has from
+ * earlier is acked, so it does not look like it is about this one.
+ */
+static void sha1_irq_clear(void)
+{
+	sha1_write(CTRL_IRQ_STATUS, IRQ_BLOCK | IRQ_MSG);
+	sha1_irq_status = 0;
+}
+
+static void sha1_wait(uint32_t irq)
+{
+	/*
+	 * Any IRQ that is in came after the last word, so CTRL_SHA1_OPS is
+	 * only read once the engine said something. IRQ_BLOCK can be for a
+	 * block before the last one, then it is not DONE and the next one
+	 * is on its way.
+	 *
+	 * Whoever wrote CTRL_IRQ_EN last (or nobody), ours are on here. What
+	 * came in while they were off is still in CTRL_IRQ_STATUS and goes
+	 * off as soon as they are.
+	 */
+	sha1_write(CTRL_IRQ_EN, IRQ_BLOCK | IRQ_MSG);
+	for (;;) {
+		while (!(sha1_irq_status & irq))
+			sha1_relax();
+		if (irq == IRQ_MSG)
+			return;
+		sha1_irq_status = 0;
+		if (sha1_read(CTRL_SHA1_OPS) & SHA1_DONE)
+			return;
+	}
+}
+
+void sha1_init(struct sha1_ctx *ctx)
+{
+	ctx->len = 0;
+	ctx->blocks = 0;
+	ctx->used = 0;
+	ctx->loaded = 0;
+	ctx->saved = 0;
+
+	sha1_write(CTRL_SHA1_OPS, SHA1_RESET);
+	sha1_write(CTRL_MSG_CFG, MSG_SWAP);
+	sha1_irq_clear();
+}
+
+void sha1_update(struct sha1_ctx *ctx, const void *data, uint32_t len)
+{
+	const uint8_t *p = data;
+
+	ctx->len += len;
+
+	/* Top up what is left over from last time. */
+	while (ctx->used && len) {
+		uint32_t i = ctx->used >> 2;
+		uint32_t shift = (ctx->used & 3) << 3;
+
+		ctx->w[i] = (ctx->used & 3 ? ctx->w[i] : 0) | ((uint32_t)*p++ << shift);
+		len--;
+		if (++ctx->used == SHA1_BLOCK_SIZE) {
+#define CTX_WORD(n)	ctx->w[n]
+			SHA1_PUT16(CTX_WORD);
+#undef CTX_WORD
+			ctx->blocks++;
+			ctx->used = 0;
+		}
+	}
+
+	/* Whole blocks straight from the buffer, MSG_SWAP does the byte order. */
+	if (((unsigned long)p & 3) == 0) {
+		const uint32_t *w = (const uint32_t *)p;
+
+		for (; len >= SHA1_BLOCK_SIZE; len -= SHA1_BLOCK_SIZE, w += 16, ctx->blocks++) {
+#define ALIGNED_WORD(n)	w[n]
+			SHA1_PUT16(ALIGNED_WORD);
+#undef ALIGNED_WORD
+		}
+		p = (const uint8_t *)w;
+	} else {
+		for (; len >= SHA1_BLOCK_SIZE; len -= SHA1_BLOCK_SIZE, p += SHA1_BLOCK_SIZE, ctx->blocks++) {
+#define UNALIGNED_WORD(n)	le32_bytes(p + 4 * (n))
+			SHA1_PUT16(UNALIGNED_WORD);
+#undef UNALIGNED_WORD
+		}
+	}
+
+	/* And keep the rest for later. */
+	for (; len; len--, ctx->used++) {
+		uint32_t i = ctx->used >> 2;
+		uint32_t shift = (ctx->used & 3) << 3;
+
+		ctx->w[i] = (ctx->used & 3 ? ctx->w[i] : 0) | ((uint32_t)*p++ << shift);
+	}
+}
+
+void sha1_final(struct sha1_ctx *ctx, uint32_t digest[SHA1_DIGEST_WORDS])
+{
+	uint32_t i;
+
+	/* CONTINUE has to wait for the full blocks to be done. */
+	if (ctx->blocks && !ctx->loaded && !ctx->saved)
+		sha1_wait(IRQ_BLOCK);
+
+	sha1_irq_status = 0;
+	sha1_write(CTRL_MSG_LEN, ctx->len);
+	sha1_write(CTRL_SHA1_OPS, ctx->blocks ? SHA1_FINAL | SHA1_CONTINUE : SHA1_FINAL);
+	for (i = 0; i < (ctx->used + 3) >> 2; i++)
+		sha1_write(CTRL_MSG_IN, ctx->w[i]);
+
+	sha1_wait(IRQ_MSG);
+
+	for (i = 0; i < SHA1_DIGEST_WORDS; i++)
+		digest[i] = sha1_read(CTRL_DIGEST_H0 + 4 * i);
+}
+
+void sha1_save(struct sha1_ctx *ctx)
+{
+	uint32_t i;
+
+	/*
+	 * Nothing since sha1_restore() or the last sha1_save(), h[] is still
+	 * what it was. There would be no IRQ to wait for either.
+	 */
+	if (!ctx->blocks || ctx->loaded || ctx->saved)
+		return;
+
+	sha1_wait(IRQ_BLOCK);
+	for (i = 0; i < SHA1_DIGEST_WORDS; i++)
+		ctx->h[i] = sha1_read(CTRL_DIGEST_H0 + 4 * i);
+	ctx->saved = 1;
+}
+
+void sha1_restore(struct sha1_ctx *ctx)
+{
+	uint32_t i;
+
+	/* Before the first block it is a new message. */
+	if (!ctx->blocks) {
+		sha1_write(CTRL_SHA1_OPS, SHA1_RESET);
+		return;
+	}
+
+	for (i = 0; i < SHA1_DIGEST_WORDS; i++)
+		sha1_write(CTRL_DIGEST_H0 + 4 * i, ctx->h[i]);
+	sha1_write(CTRL_MSG_HASHED, ctx->blocks * SHA1_BLOCK_SIZE);
+	ctx->loaded = 1;
+}
+
+void sha1_hmac_use(int slot)
+{
+	sha1_write(CTRL_HMAC, slot < 0 ? HMAC_OFF : HMAC_MSG | HMAC_SLOT(slot));
+}
+
+void sha1_hmac_key(uint32_t slot, const void *key, uint32_t len)
+{
+	const uint8_t *p = key;
+	struct sha1_ctx ctx;
+	uint32_t w[16];
+	uint32_t i;
+
+	for (i = 0; i < 16; i++)
+		w[i] = 0;
+
+	/* Longer ones are hashed first, the digest is the key. */
+	if (len > SHA1_BLOCK_SIZE) {
+		sha1_hmac_use(-1);
+		sha1_init(&ctx);
+		sha1_update(&ctx, key, len);
+		sha1_final(&ctx, w);
+		for (i = 0; i < SHA1_DIGEST_WORDS; i++)
+			w[i] = be32(w[i]);
+	} else {
+		for (i = 0; i < len; i++)
+			w[i >> 2] |= (uint32_t)p[i] << ((i & 3) << 3);
+	}
+
+	sha1_irq_clear();
+	sha1_write(CTRL_MSG_CFG, MSG_SWAP);
+	sha1_write(CTRL_HMAC, HMAC_KEY | HMAC_SLOT(slot));
+	for (i = 0; i < 16; i++)
+		sha1_write(CTRL_MSG_IN, w[i]);
+	/* The ipad and the opad blocks. */
+	sha1_wait(IRQ_BLOCK);
+}
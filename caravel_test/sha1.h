@@ -0,0 +1,112 @@
+/*
+ * SPDX-FileCopyrightText: 2021 Konrad Rzeszutek Wilk
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *      http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ * SPDX-License-Identifier: Apache-2.0
+ */
+#ifndef SHA1_H
+#define SHA1_H
+
+#include <stdint.h>
+
+#define BASE_ADDRESS 		0x30000024
+#define CTRL_GET_NR		(BASE_ADDRESS + 0x00)
+#define CTRL_GET_ID		(BASE_ADDRESS + 0x04)
+#define CTRL_SHA1_OPS		(BASE_ADDRESS + 0x08)
+#define CTRL_MSG_IN		(BASE_ADDRESS + 0x0C)
+#define CTRL_SHA1_DIGEST	(BASE_ADDRESS + 0x10)
+#define CTRL_PANIC		(BASE_ADDRESS + 0x14)
+#define CTRL_MSG_LEN		(BASE_ADDRESS + 0x18)
+#define CTRL_DIGEST_H0		(BASE_ADDRESS + 0x1C) /* .. H4 at 0x2C */
+#define CTRL_IRQ_EN		(BASE_ADDRESS + 0x30)
+#define CTRL_IRQ_STATUS		(BASE_ADDRESS + 0x34) /* Write 1 to clear */
+#define CTRL_MSG_HASHED		(BASE_ADDRESS + 0x4C) /* After sha1_dma's */
+#define CTRL_HMAC		(BASE_ADDRESS + 0x50)
+#define CTRL_MSG_CFG		(BASE_ADDRESS + 0x54)
+#define CTRL_PERF_BUSY		(BASE_ADDRESS + 0x58) /* Write 0 to clear */
+#define CTRL_PERF_BLOCKS	(BASE_ADDRESS + 0x5C)
+#define CTRL_PERF_PADDED	(BASE_ADDRESS + 0x60)
+#define CTRL_PERF_REJECTS	(BASE_ADDRESS + 0x64)
+#define CTRL_PERF_EARLY		(BASE_ADDRESS + 0x68)
+#define CTRL_PERF_PANICS	(BASE_ADDRESS + 0x6C)
+
+#define CTRL_ID			0x53484131
+#define CTRL_NR			8
+
+/* CTRL_SHA1_OPS */
+#define SHA1_RESET		(1 << 1) /* Write */
+#define SHA1_CONTINUE		(1 << 2) /* Write */
+#define SHA1_FINAL		(1 << 3) /* Write */
+#define SHA1_DONE		(1 << 3) /* Read */
+
+/* CTRL_IRQ_EN and CTRL_IRQ_STATUS */
+#define IRQ_BLOCK		(1 << 0)
+#define IRQ_MSG			(1 << 1)
+#define IRQ_PANIC		(1 << 2)
+
+/* CTRL_HMAC, the slot in [10:8] */
+#define HMAC_OFF		0
+#define HMAC_MSG		1
+#define HMAC_KEY		2
+#define HMAC_SLOT(n)		((n) << 8)
+
+/* CTRL_MSG_CFG */
+#define MSG_SWAP		(1 << 0) /* CTRL_MSG_IN words are little endian */
+
+#define SHA1_BLOCK_SIZE		64
+#define SHA1_DIGEST_WORDS	5
+
+/*
+ * The engine takes the words as they are in memory (MSG_SWAP) and pads the
+ * last block itself, so all that is kept here is what has not made a full
+ * block yet. It only goes to
+ * CTRL_MSG_IN once sha1_final() knows it is the last one.
+ *
+ * h[] is only used by sha1_save() and sha1_restore().
+ */
+struct sha1_ctx {
+	uint32_t len;		/* Bytes so far */
+	uint32_t blocks;	/* Blocks given to the engine */
+	uint32_t used;		/* Bytes in w[] */
+	uint32_t loaded;	/* h[] is back in the engine, no block since */
+	uint32_t saved;		/* h[] is what the engine has, no block since */
+	uint32_t w[16];
+	uint32_t h[SHA1_DIGEST_WORDS];
+};
+
+/*
+ * Completion is by interrupt. The CPU irq() handler has to call
+ * sha1_irq(), which acks CTRL_IRQ_STATUS and gives back what it was.
+ */
+uint32_t sha1_irq(void);
+
+void sha1_init(struct sha1_ctx *ctx);
+void sha1_update(struct sha1_ctx *ctx, const void *data, uint32_t len);
+void sha1_final(struct sha1_ctx *ctx, uint32_t digest[SHA1_DIGEST_WORDS]);
+
+/*
+ * More than one message at a time: sha1_save() the one on the engine before
+ * sha1_update() on another, and sha1_restore() it before carrying on.
+ */
+void sha1_save(struct sha1_ctx *ctx);
+void sha1_restore(struct sha1_ctx *ctx);
+
+/*
+ * HMAC-SHA1: sha1_hmac_key() puts a key in a slot on the engine and makes
+ * it the one in use, sha1_hmac_use() goes back to one (-1 for plain SHA-1).
+ * sha1_init() .. sha1_final() then give the MAC.
+ */
+void sha1_hmac_key(uint32_t slot, const void *key, uint32_t len);
+void sha1_hmac_use(int slot);
+
+#endif
@@ -18,16 +18,7 @@
 #include "verilog/dv/caravel/defs.h"
 #include "verilog/dv/caravel/stub.c"
 
-#define BASE_ADDRESS 		0x30000024
-#define CTRL_GET_NR		(BASE_ADDRESS + 0x00)
-#define CTRL_GET_ID		(BASE_ADDRESS + 0x04)
-#define CTRL_SHA1_OPS		(BASE_ADDRESS + 0x08)
-#define CTRL_MSG_IN		(BASE_ADDRESS + 0x0C)
-#define CTRL_SHA1_DIGEST	(BASE_ADDRESS + 0x10)
-#define CTRL_PANIC		(BASE_ADDRESS + 0x14)
-
-#define CTRL_ID			0x53484131
-#define CTRL_NR			4
+#include "sha1.h"
 
 static uint32_t read(unsigned long addr)
 {
@@ -118,20 +109,22 @@ void panic(uint32_t line)
 #define MAGIC_END 0x0badf00d
 
 volatile bool flag;
+volatile uint32_t progress;
 
 // gets jumped to from the interrupt handler defined in start.S
 uint32_t *irq()
 {
-	flag = 0;
+	uint32_t status = sha1_irq();
 
-	write(CTRL_SHA1_OPS, 0); /* Ack the IRQ */
+	BUG_ON(!(status & (IRQ_BLOCK | IRQ_MSG)));
 
-	write(CTRL_PANIC, MAGIC_END);
+	if (status & IRQ_MSG)
+		flag = 0;
 }
 
 void wishbone_test(void)
 {
-	uint32_t val, i;
+	uint32_t val;
 
 	val = read(CTRL_GET_ID);
 	BUG_ON(val != CTRL_ID);
@@ -143,22 +136,21 @@ void wishbone_test(void)
 	val = read(CTRL_SHA1_OPS);
         BUG_ON(val & 0x1 == 0x1)
 
-	write(CTRL_MSG_IN, 0x61626380); /* [0]= */
-        for (i = 1; i < 15; i++)
-		write(CTRL_MSG_IN, 0x0);
+	/* Tell us when the digest is ready. */
+	write(CTRL_IRQ_EN, IRQ_MSG);
 
-        write(CTRL_MSG_IN, 0x18); /* [15]= */
+	/* "abc" - the engine does the 0x80, zeros and the length. */
+	write(CTRL_MSG_LEN, 3);
+	write(CTRL_SHA1_OPS, SHA1_FINAL);
+	write(CTRL_MSG_IN, 0x61626300);
 
-        /* The sha1_done should be set */
-	val = read(CTRL_SHA1_OPS);
-        BUG_ON(val & 0x1 != 0x1)
+	/* Free to do something else until the IRQ comes in. */
+	while (flag)
+		progress++;
+	BUG_ON(progress == 0);
 
-        do {
-	   val = read(CTRL_SHA1_OPS);
-           /* [3] will be set when it is done. */
-           if (val & 1 << 3)
-              break;
-        } while (val & 1); /* Spin as long as sha1_on is set */
+	val = read(CTRL_SHA1_OPS);
+	BUG_ON(!(val & SHA1_DONE));
 
 
         val = read(CTRL_SHA1_DIGEST);
@@ -176,11 +168,76 @@ void wishbone_test(void)
         val = read(CTRL_SHA1_DIGEST);
         BUG_ON(val != 0x9cd0d89d);
 
-	do {
-		// Spin until IRQ come in (it may already..)
-	} while (flag);
+        /* Or just the word we want. */
+        val = read(CTRL_DIGEST_H0 + 4 * 2);
+        BUG_ON(val != 0xba3e2571);
 
-	write(CTRL_PANIC, MAGIC_END);
+}
+
+/* FIPS 180-2 "abcdbcdecdefdefgefghfghighijhijkijkljklmklmnlmnomnopnopq", one
+ * byte in so it is not word aligned. */
+static const char lib_msg[] = "xabcdbcdecdefdefgefghfghighijhijkijkljklmklmnlmnomnopnopq";
+static const uint32_t lib_digest[SHA1_DIGEST_WORDS] = {
+	0x84983e44, 0x1c3bd26e, 0xbaae4aa1, 0xf95129e5, 0xe54670f1 };
+
+void library_test(void)
+{
+	struct sha1_ctx ctx;
+	uint32_t digest[SHA1_DIGEST_WORDS];
+	uint32_t i;
+
+	/* In three goes, so the left overs get topped up. */
+	sha1_init(&ctx);
+	sha1_update(&ctx, lib_msg + 1, 5);
+	sha1_update(&ctx, lib_msg + 6, 30);
+	sha1_update(&ctx, lib_msg + 36, sizeof(lib_msg) - 37);
+	sha1_final(&ctx, digest);
+
+	for (i = 0; i < SHA1_DIGEST_WORDS; i++)
+		BUG_ON(digest[i] != lib_digest[i]);
+}
+
+/*
+ * BENCH_LEN bytes of i & 0xff out of RAM (there is only 1KB of it), timed
+ * with rdcycle from sha1_init() to the digest. It all goes out through
+ * CTRL_PANIC, MAGIC_BENCH first, so test_caravel.py can check the digest
+ * and work out the cycles per byte.
+ */
+#define MAGIC_BENCH	0xbe9c0000
+#define BENCH_LEN	256
+
+static uint32_t bench_buf[BENCH_LEN / 4];
+
+static inline uint32_t rdcycle(void)
+{
+	uint32_t cycles;
+
+	asm volatile ("rdcycle %0" : "=r"(cycles));
+	return cycles;
+}
+
+void bench(void)
+{
+	struct sha1_ctx ctx;
+	uint32_t digest[SHA1_DIGEST_WORDS];
+	uint8_t *p = (uint8_t *)bench_buf;
+	uint32_t start, cycles;
+	uint32_t i;
+
+	for (i = 0; i < BENCH_LEN; i++)
+		p[i] = i;
+
+	start = rdcycle();
+	sha1_init(&ctx);
+	sha1_update(&ctx, p, BENCH_LEN);
+	sha1_final(&ctx, digest);
+	cycles = rdcycle() - start;
+
+	write(CTRL_PANIC, MAGIC_BENCH);
+	write(CTRL_PANIC, BENCH_LEN);
+	write(CTRL_PANIC, cycles);
+	for (i = 0; i < SHA1_DIGEST_WORDS; i++)
+		write(CTRL_PANIC, digest[i]);
 }
 
 void main()
@@ -199,6 +256,12 @@ void main()
 	reset();
 
 	wishbone_test();
+
+	library_test();
+
+	bench();
+
+	write(CTRL_PANIC, MAGIC_END);
 	/* There it goes .. */
 
 }
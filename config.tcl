@@ -7,7 +7,9 @@ set ::env(DESIGN_NAME) wrapper_sha1
 set ::env(VERILOG_FILES) "/work/src/wrapper_sha1.v \
 	/work/src/sha1_wb.v"
 
-# Fill this
+# Fill this. A faster clock for the retimed round adder is out of scope until
+# make timing has OpenSTA and the PDK: all it has shown is logic depth
+# (26 to 22 levels), no fmax, so 10 ns it stays.
 set ::env(CLOCK_PERIOD) "10"
 set ::env(CLOCK_PORT) "wb_clk_i"
 
@@ -32,6 +32,27 @@
 #include <stdio.h>
 #include "sha1.h"
 
+/*
+ *  The shared library for the cocotb tests is built with SHA1_QUIET,
+ *  it has SHA1Trace instead of the prints.
+ */
+#ifdef SHA1_QUIET
+#define printf(...)
+#endif
+
+SHA1Round *SHA1Trace = NULL;
+
+#define SHA1TraceRound(t)               \
+    if (SHA1Trace)                      \
+    {                                   \
+        SHA1Trace[t].W = W[t];          \
+        SHA1Trace[t].A = A;             \
+        SHA1Trace[t].B = B;             \
+        SHA1Trace[t].C = C;             \
+        SHA1Trace[t].D = D;             \
+        SHA1Trace[t].E = E;             \
+    }
+
 /*
  *  Define the SHA1 circular left shift macro
  */
@@ -282,6 +303,7 @@ void SHA1ProcessMessageBlock(SHA1Context *context)
 
         B = A;
         A = temp;
+        SHA1TraceRound(t);
     }
 
     for(t = 20; t < 40; t++)
@@ -293,6 +315,7 @@ void SHA1ProcessMessageBlock(SHA1Context *context)
         C = SHA1CircularShift(30,B);
         B = A;
         A = temp;
+        SHA1TraceRound(t);
     }
 
     for(t = 40; t < 60; t++)
@@ -305,6 +328,7 @@ void SHA1ProcessMessageBlock(SHA1Context *context)
         C = SHA1CircularShift(30,B);
         B = A;
         A = temp;
+        SHA1TraceRound(t);
     }
 
     for(t = 60; t < 80; t++)
@@ -316,6 +340,7 @@ void SHA1ProcessMessageBlock(SHA1Context *context)
         C = SHA1CircularShift(30,B);
         B = A;
         A = temp;
+        SHA1TraceRound(t);
     }
 
     printf("A=%x\n", A);
@@ -63,6 +63,18 @@ typedef struct SHA1Context
  *  Function Prototypes
  */
 
+/*
+ *  When SHA1Trace points at 80 of these, SHA1ProcessMessageBlock
+ *  leaves W[t] and A..E after every round t in there.
+ */
+typedef struct SHA1Round
+{
+    uint32_t W;
+    uint32_t A, B, C, D, E;
+} SHA1Round;
+
+extern SHA1Round *SHA1Trace;
+
 int SHA1Reset(  SHA1Context *);
 int SHA1Input(  SHA1Context *,
                 const uint8_t *,
@@ -0,0 +1,464 @@
+// SPDX-FileCopyrightText: 2021 Konrad Rzeszutek Wilk
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//      http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+// SPDX-License-Identifier: Apache-2.0
+
+`default_nettype none
+`timescale 1ns/1ns
+
+/*
+ * sha1_wb with a Wishbone master that hashes messages out of memory.
+ *
+ * The host puts descriptors in a ring in memory, four words each:
+ *
+ *   +0x0 source address (word aligned)
+ *   +0x4 length in bytes
+ *   +0x8 where the 20 bytes of the digest go (word aligned)
+ *   +0xC flags, DESC_IRQ to get IRQ_DESC once it is done. DESC_DONE is
+ *        set here when it is done.
+ *
+ * and moves CTRL_DMA_TAIL past them. From there on we go through the
+ * sha1_wb registers the same way the host would, CTRL_DMA_HEAD is the next
+ * one we will do. Memory is little endian (as the RISC-V), the message and
+ * the digest are bytes in order.
+ *
+ * While the DMA runs the sha1_wb registers are ours, the host gets no ack
+ * for them until the ring is empty. Every descriptor starts with RESET,
+ * CTRL_MSG_CFG 0 and HMAC_OFF, so whatever MSG_SWAP or HMAC mode the host
+ * left behind is gone once the DMA has run (we do the byte swap ourselves).
+ */
+module sha1_dma #(
+    parameter    [31:0] BASE_ADDRESS   = 32'h30000024
+    ) (
+    input wire reset,
+    output wire done,
+    output wire irq,
+
+    /* WishBone logic */
+
+    input wire wb_clk_i,
+    input wire wb_rst_i,
+    input wire wbs_stb_i, /* strobe */
+    input wire wbs_cyc_i,
+    input wire wbs_we_i,
+    input wire [3:0] wbs_sel_i,
+    input wire [31:0] wbs_dat_i,
+    input wire [31:0] wbs_adr_i,
+    output wire wbs_ack_o,
+    output wire [31:0] wbs_dat_o,
+
+    /* WishBone master, to the memory. */
+    output wire wbm_cyc_o,
+    output wire wbm_stb_o,
+    output wire wbm_we_o,
+    output wire [3:0] wbm_sel_o,
+    output wire [31:0] wbm_adr_o,
+    output wire [31:0] wbm_dat_o,
+    input wire wbm_ack_i,
+    input wire [31:0] wbm_dat_i
+);
+    /* The sha1_wb ones we use. */
+    localparam CTRL_SHA1_OPS		= BASE_ADDRESS + 'h8;
+    localparam CTRL_MSG_IN		= BASE_ADDRESS + 'hC;
+    localparam CTRL_MSG_LEN		= BASE_ADDRESS + 'h18;
+    localparam CTRL_DIGEST_H0		= BASE_ADDRESS + 'h1C;
+    localparam RESET			= 32'h2;
+    localparam FINAL			= 32'h8;
+    localparam CONTINUE			= 32'h4;
+
+    /* Address of the ring, writing it (or the size) empties the ring. */
+    localparam CTRL_DMA_RING		= BASE_ADDRESS + 'h38;
+    /* How many descriptors are in it. */
+    localparam CTRL_DMA_SIZE		= BASE_ADDRESS + 'h3C;
+    /* Next one we do, can only be read. */
+    localparam CTRL_DMA_HEAD		= BASE_ADDRESS + 'h40;
+    /* One past the last one the host put in, writing it gets us going. */
+    localparam CTRL_DMA_TAIL		= BASE_ADDRESS + 'h44;
+    /*
+     * IRQ_DESC is a descriptor with DESC_IRQ done, IRQ_RING that there is
+     * nothing left in the ring. Write 1 to clear.
+     */
+    localparam CTRL_DMA_IRQ		= BASE_ADDRESS + 'h48;
+    localparam IRQ_DESC			= 2'b01;
+    localparam IRQ_RING			= 2'b10;
+    /* And sha1_wb again after ours. */
+    localparam CTRL_MSG_HASHED		= BASE_ADDRESS + 'h4C;
+    localparam CTRL_HMAC		= BASE_ADDRESS + 'h50;
+    localparam HMAC_OFF			= 32'h0;
+    localparam CTRL_MSG_CFG		= BASE_ADDRESS + 'h54;
+    localparam CTRL_PERF_PANICS		= BASE_ADDRESS + 'h6C;
+
+    localparam DESC_IRQ			= 32'h00000001;
+    localparam DESC_DONE		= 32'h80000000;
+    localparam ACK			    = 32'h0000001;
+
+    localparam D_IDLE		= 0;
+    localparam D_DESC		= 1; /* Read the descriptor. */
+    localparam D_RESET		= 2;
+    localparam D_LEN		= 3;
+    localparam D_FINAL		= 4; /* FINAL (and CONTINUE if after full blocks). */
+    localparam D_FETCH		= 5; /* Read a word of the message .. */
+    localparam D_MSG		= 6; /* .. and in CTRL_MSG_IN it goes. */
+    localparam D_BLOCKS		= 7; /* Full blocks in, wait for DONE. */
+    localparam D_WAIT		= 8; /* All in, wait for DONE. */
+    localparam D_DIGEST		= 9; /* Read h0..h4 .. */
+    localparam D_STORE		= 10; /* .. and write them out. */
+    localparam D_FLAGS		= 11;
+    localparam D_CFG		= 12; /* CTRL_MSG_CFG 0, no MSG_SWAP .. */
+    localparam D_HMAC		= 13; /* .. and HMAC_OFF. */
+    reg [3:0] dma_state;
+
+    wire wb_active = wbs_stb_i & wbs_cyc_i;
+    wire wb_req;
+    wire host_core;
+
+    reg [31:0] buffer_o;
+    reg transmit;
+
+    reg [31:0] dma_ring;
+    reg [15:0] dma_size;
+    reg [15:0] dma_head;
+    reg [15:0] dma_tail;
+    reg [1:0] dma_irq;
+    wire [1:0] irq_cause;
+
+    /* The descriptor we are on. */
+    reg [31:0] d_src;
+    reg [31:0] d_len;
+    reg [31:0] d_dst;
+    reg [31:0] d_flags;
+    reg [2:0] d_idx;
+    reg [29:0] d_word;
+    reg [31:0] d_data;
+    wire [29:0] full_words;
+    wire [29:0] total_words;
+    wire [31:0] desc_adr;
+    wire [15:0] head_next;
+
+    /* What we ask of sha1_wb and of the memory. */
+    reg core_req;
+    reg mem_req;
+    reg req_we;
+    reg [31:0] req_adr;
+    reg [31:0] req_dat;
+    wire req_ack;
+
+    wire core_stb;
+    wire core_cyc;
+    wire core_we;
+    wire [3:0] core_sel;
+    wire [31:0] core_adr;
+    wire [31:0] core_dat_i;
+    wire core_ack;
+    wire [31:0] core_dat;
+    wire core_done;
+    wire core_irq;
+    wire dma_own;
+
+    sha1_wb #(
+        .BASE_ADDRESS(BASE_ADDRESS))
+    sha1_wishbone (
+        .reset(reset),
+        .chicken_bits_in(8'b0),
+        .chicken_bits_out(),
+        .done(core_done),
+        .busy(),
+        .irq(core_irq),
+        .wb_clk_i(wb_clk_i),
+        .wb_rst_i(wb_rst_i),
+        .wbs_stb_i(core_stb),
+        .wbs_cyc_i(core_cyc),
+        .wbs_we_i(core_we),
+        .wbs_sel_i(core_sel),
+        .wbs_dat_i(core_dat_i),
+        .wbs_adr_i(core_adr),
+        .wbs_ack_o(core_ack),
+        .wbs_stall_o(),
+        .wbs_dat_o(core_dat));
+
+    /* The message goes in as big endian words. */
+    function [31:0] bswap;
+        input [31:0] val;
+        bswap = {val[7:0], val[15:8], val[23:16], val[31:24]};
+    endfunction
+
+    always @(*) begin
+        core_req = 1'b0;
+        mem_req = 1'b0;
+        req_we = 1'b0;
+        req_adr = 0;
+        req_dat = 0;
+        case (dma_state)
+            D_DESC: begin
+                mem_req = 1'b1;
+                req_adr = desc_adr + {27'b0, d_idx, 2'b0};
+            end
+            D_RESET: begin
+                core_req = 1'b1;
+                req_we = 1'b1;
+                req_adr = CTRL_SHA1_OPS;
+                req_dat = RESET;
+            end
+            D_CFG: begin
+                core_req = 1'b1;
+                req_we = 1'b1;
+                req_adr = CTRL_MSG_CFG;
+                req_dat = 0;
+            end
+            D_HMAC: begin
+                core_req = 1'b1;
+                req_we = 1'b1;
+                req_adr = CTRL_HMAC;
+                req_dat = HMAC_OFF;
+            end
+            D_LEN: begin
+                core_req = 1'b1;
+                req_we = 1'b1;
+                req_adr = CTRL_MSG_LEN;
+                req_dat = d_len;
+            end
+            D_FINAL: begin
+                core_req = 1'b1;
+                req_we = 1'b1;
+                req_adr = CTRL_SHA1_OPS;
+                req_dat = (d_word != 0) ? (FINAL | CONTINUE) : FINAL;
+            end
+            D_FETCH: begin
+                mem_req = 1'b1;
+                req_adr = {d_src[31:2], 2'b0} + {d_word, 2'b0};
+            end
+            D_MSG: begin
+                core_req = 1'b1;
+                req_we = 1'b1;
+                req_adr = CTRL_MSG_IN;
+                req_dat = d_data;
+            end
+            D_DIGEST: begin
+                core_req = 1'b1;
+                req_adr = CTRL_DIGEST_H0 + {27'b0, d_idx, 2'b0};
+            end
+            D_STORE: begin
+                mem_req = 1'b1;
+                req_we = 1'b1;
+                req_adr = {d_dst[31:2], 2'b0} + {27'b0, d_idx, 2'b0};
+                req_dat = bswap(d_data);
+            end
+            D_FLAGS: begin
+                mem_req = 1'b1;
+                req_we = 1'b1;
+                req_adr = desc_adr + 'hC;
+                req_dat = d_flags | DESC_DONE;
+            end
+            default: ;
+        endcase
+    end
+
+    always @(posedge wb_clk_i) begin
+        if (reset) begin
+            dma_state <= D_IDLE;
+            dma_ring <= 0;
+            dma_size <= 0;
+            dma_head <= 0;
+            dma_tail <= 0;
+            dma_irq <= 0;
+            buffer_o <= 0;
+            transmit <= 1'b0;
+        end else begin
+            transmit <= 1'b0;
+            dma_irq <= dma_irq | irq_cause;
+
+            case (dma_state)
+                D_IDLE: begin
+                    /* Once the host is done with sha1_wb. */
+                    if ((dma_head != dma_tail) && !host_core && !core_ack) begin
+                        d_idx <= 0;
+                        d_word <= 0;
+                        dma_state <= D_DESC;
+                    end
+                end
+                D_DESC: begin
+                    if (req_ack) begin
+                        case (d_idx)
+                            0: d_src <= wbm_dat_i;
+                            1: d_len <= wbm_dat_i;
+                            2: d_dst <= wbm_dat_i;
+                            default: d_flags <= wbm_dat_i;
+                        endcase
+                        d_idx <= d_idx + 1'b1;
+                        if (d_idx == 3)
+                            dma_state <= D_RESET;
+                    end
+                end
+                D_RESET: begin
+                    if (req_ack)
+                        dma_state <= D_CFG;
+                end
+                D_CFG: begin
+                    if (req_ack)
+                        dma_state <= D_HMAC;
+                end
+                D_HMAC: begin
+                    if (req_ack)
+                        dma_state <= D_LEN;
+                end
+                D_LEN: begin
+                    if (req_ack) begin
+                        if (full_words == 0)
+                            dma_state <= D_FINAL;
+                        else
+                            dma_state <= D_FETCH;
+                    end
+                end
+                D_FINAL: begin
+                    if (req_ack) begin
+                        if (d_word == total_words)
+                            dma_state <= D_WAIT;
+                        else
+                            dma_state <= D_FETCH;
+                    end
+                end
+                D_FETCH: begin
+                    if (req_ack) begin
+                        d_data <= bswap(wbm_dat_i);
+                        dma_state <= D_MSG;
+                    end
+                end
+                D_MSG: begin
+                    if (req_ack) begin
+                        d_word <= d_word + 1'b1;
+                        if (d_word + 1'b1 == full_words)
+                            dma_state <= D_BLOCKS;
+                        else if (d_word + 1'b1 == total_words)
+                            dma_state <= D_WAIT;
+                        else
+                            dma_state <= D_FETCH;
+                    end
+                end
+                D_BLOCKS: begin
+                    if (core_done)
+                        dma_state <= D_FINAL;
+                end
+                D_WAIT: begin
+                    if (core_done) begin
+                        d_idx <= 0;
+                        dma_state <= D_DIGEST;
+                    end
+                end
+                D_DIGEST: begin
+                    if (req_ack) begin
+                        d_data <= core_dat;
+                        dma_state <= D_STORE;
+                    end
+                end
+                D_STORE: begin
+                    if (req_ack) begin
+                        d_idx <= d_idx + 1'b1;
+                        if (d_idx == 4)
+                            dma_state <= D_FLAGS;
+                        else
+                            dma_state <= D_DIGEST;
+                    end
+                end
+                D_FLAGS: begin
+                    if (req_ack) begin
+                        dma_head <= head_next;
+                        dma_state <= D_IDLE;
+                    end
+                end
+                default:
+                    dma_state <= D_IDLE;
+            endcase
+
+            if (wb_req && !wbs_we_i) begin
+                case (wbs_adr_i)
+                    CTRL_DMA_RING:
+                        buffer_o <= dma_ring;
+                    CTRL_DMA_SIZE:
+                        buffer_o <= {16'b0, dma_size};
+                    CTRL_DMA_HEAD:
+                        buffer_o <= {16'b0, dma_head};
+                    CTRL_DMA_TAIL:
+                        buffer_o <= {16'b0, dma_tail};
+                    CTRL_DMA_IRQ:
+                        buffer_o <= {30'b0, dma_irq};
+                endcase
+                if ((wbs_adr_i >= CTRL_DMA_RING) && (wbs_adr_i <= CTRL_DMA_IRQ))
+                    transmit <= 1'b1;
+            end
+            if (wb_req && wbs_we_i && &wbs_sel_i) begin
+                case (wbs_adr_i)
+                    CTRL_DMA_RING:
+                    begin
+                        dma_ring <= wbs_dat_i;
+                        dma_head <= 0;
+                        dma_tail <= 0;
+                    end
+                    CTRL_DMA_SIZE:
+                    begin
+                        dma_size <= wbs_dat_i[15:0];
+                        dma_head <= 0;
+                        dma_tail <= 0;
+                    end
+                    CTRL_DMA_TAIL:
+                        dma_tail <= wbs_dat_i[15:0];
+                    CTRL_DMA_IRQ:
+                        /* Unless it just came in again. */
+                        dma_irq <= (dma_irq & ~wbs_dat_i[1:0]) | irq_cause;
+                endcase
+                buffer_o <= ACK;
+                if ((wbs_adr_i >= CTRL_DMA_RING) && (wbs_adr_i <= CTRL_DMA_IRQ))
+                    transmit <= 1'b1;
+            end
+        end
+    end
+
+    /* Done with a descriptor, and maybe with all of them. */
+    assign irq_cause = (dma_state == D_FLAGS && req_ack) ?
+                       ((|(d_flags & DESC_IRQ) ? IRQ_DESC : 2'b0) |
+                        ((head_next == dma_tail) ? IRQ_RING : 2'b0)) : 2'b0;
+    assign full_words = {d_len[31:6], 4'b0};
+    assign total_words = d_len[31:2] + {29'b0, |d_len[1:0]};
+    assign desc_adr = dma_ring + {12'b0, dma_head, 4'b0};
+    assign head_next = (dma_head + 1'b1 == dma_size) ? 16'b0 : dma_head + 1'b1;
+
+    assign wb_req = wb_active && !transmit;
+    assign host_core = wb_active && (((wbs_adr_i >= BASE_ADDRESS) && (wbs_adr_i < CTRL_DMA_RING)) ||
+                                     ((wbs_adr_i >= CTRL_MSG_HASHED) && (wbs_adr_i <= CTRL_PERF_PANICS)));
+
+    /* sha1_wb is ours from the descriptor to the digest. */
+    assign dma_own = (dma_state != D_IDLE);
+    assign core_stb = dma_own ? core_req : wbs_stb_i;
+    assign core_cyc = dma_own ? core_req : wbs_cyc_i;
+    assign core_we = dma_own ? req_we : wbs_we_i;
+    assign core_sel = dma_own ? 4'b1111 : wbs_sel_i;
+    assign core_adr = dma_own ? req_adr : wbs_adr_i;
+    assign core_dat_i = dma_own ? req_dat : wbs_dat_i;
+
+    assign req_ack = (core_req && core_ack) || (mem_req && wbm_ack_i);
+
+    assign wbm_cyc_o = mem_req;
+    assign wbm_stb_o = mem_req;
+    assign wbm_we_o = req_we;
+    assign wbm_sel_o = 4'b1111;
+    assign wbm_adr_o = req_adr;
+    assign wbm_dat_o = req_dat;
+
+    assign wbs_ack_o = reset ? 1'b0 : (transmit || (!dma_own && core_ack));
+
+    assign wbs_dat_o = reset ? 32'b0 : (transmit ? buffer_o : core_dat);
+
+    assign done = core_done;
+
+    assign irq = reset ? 1'b0 : (core_irq || |dma_irq);
+endmodule
+`default_nettype wire
@@ -0,0 +1,333 @@
+// SPDX-FileCopyrightText: 2021 Konrad Rzeszutek Wilk
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//      http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+// SPDX-License-Identifier: Apache-2.0
+
+`default_nettype none
+`timescale 1ns/1ns
+
+/*
+ * NUM_CORES sha1_wb behind one Wishbone slave, each hashing its own message.
+ *
+ * Core n has the whole sha1_wb register map at BASE_ADDRESS + n * 0x100, so
+ * core 0 is where a single sha1_wb would be and CTRL_GET_NR[15:8] there
+ * says how many more follow. After core 0's registers are the ones for all
+ * of them, bit n is core n.
+ *
+ * With PIPE_STAGES there is a sha1_pipe next to the cores, for independent
+ * blocks the host has padded itself, at BASE_ADDRESS + 0xC0 .. 0xE0 where
+ * core 0 has nothing. It takes a block every 80 / PIPE_STAGES clocks, but
+ * with 23 register accesses a block even the Wishbone B4 pipelined bus
+ * (PIPELINED) only keeps up with PIPE_STAGES of 4 or less.
+ */
+module sha1_multi #(
+    parameter    [31:0] BASE_ADDRESS   = 32'h30000024,
+    parameter  NUM_CORES = 2,
+    parameter  PIPELINED = 0,
+    parameter  PIPE_STAGES = 0
+    ) (
+    input wire reset,
+    output wire [NUM_CORES-1:0] done,
+    output wire irq,
+
+    /* WishBone logic */
+
+    input wire wb_clk_i,
+    input wire wb_rst_i,
+    input wire wbs_stb_i, /* strobe */
+    input wire wbs_cyc_i,
+    input wire wbs_we_i,
+    input wire [3:0] wbs_sel_i,
+    input wire [31:0] wbs_dat_i,
+    input wire [31:0] wbs_adr_i,
+    output wire wbs_ack_o,
+    output wire wbs_stall_o,
+    output wire [31:0] wbs_dat_o
+
+);
+    localparam CORE_SIZE		= 'h100;
+
+    /* Bitmap of the cores that have a message and are not done with it. */
+    localparam CTRL_CORE_BUSY		= BASE_ADDRESS + 'hF0;
+    /* Bitmap of the cores that have the digest ready. */
+    localparam CTRL_CORE_DONE		= BASE_ADDRESS + 'hF4;
+    /* Cores that got DONE since last cleared, write 1 to clear. */
+    localparam CTRL_CORE_IRQ		= BASE_ADDRESS + 'hF8;
+
+    /*
+     * The sha1_pipe ones. CTRL_PIPE_IN takes the 16 words of the block, w[0]
+     * first, CTRL_PIPE_H h0..h4 to start from. Writing CTRL_PIPE_GO with the
+     * tag in [7:0] (PIPE_INIT to start from the initial values instead of
+     * CTRL_PIPE_H) hands it over, and the next one can be written. Until the
+     * pipe has taken the last one, which is at most 80 / PIPE_STAGES clocks,
+     * the next CTRL_PIPE_GO waits. Without all the words it is EINVAL, with
+     * PIPE_FIFO blocks handed over and not read back yet EBUSY and the block
+     * stays for another go.
+     */
+    localparam CTRL_PIPE_IN		= BASE_ADDRESS + 'hC0;
+    localparam CTRL_PIPE_H		= BASE_ADDRESS + 'hC4;
+    localparam CTRL_PIPE_GO		= BASE_ADDRESS + 'hC8;
+    localparam PIPE_INIT		= 32'h80000000;
+    /*
+     * Reading it takes the next digest out, in the order they went in:
+     * PIPE_VALID and the tag, or 0 if there is none yet. Its h0..h4 are
+     * at CTRL_PIPE_H0 .. H4 until the next one.
+     */
+    localparam CTRL_PIPE_OUT		= BASE_ADDRESS + 'hCC;
+    localparam PIPE_VALID		= 32'h80000000;
+    localparam CTRL_PIPE_H0		= BASE_ADDRESS + 'hD0;
+    localparam CTRL_PIPE_H4		= BASE_ADDRESS + 'hE0;
+    /* The ones in the pipe and the digests waiting to be read. */
+    localparam FIFO_BITS		= $clog2(2 * PIPE_STAGES);
+    localparam PIPE_FIFO		= 1 << FIFO_BITS;
+    localparam INITIAL_H		= 160'h67452301EFCDAB8998BADCFE10325476C3D2E1F0;
+
+    localparam ACK			    = 32'h0000001;
+    localparam EINVAL			= 32'hfffffea; /* -14 */
+    localparam EBUSY            = 32'hfffffff0; /* -10 */
+
+    wire wb_active = wbs_stb_i & wbs_cyc_i;
+    wire wb_req;
+
+    wire pipe_ack;
+    wire pipe_stall;
+    wire [31:0] pipe_dat;
+
+    wire [NUM_CORES-1:0] core_ack;
+    wire [NUM_CORES-1:0] core_stall;
+    wire [NUM_CORES-1:0] core_busy;
+    wire [31:0] core_dat[NUM_CORES-1:0];
+    reg [31:0] core_dat_o;
+
+    reg [31:0] buffer_o;
+    reg transmit;
+    reg [NUM_CORES-1:0] done_q;
+    reg [NUM_CORES-1:0] irq_cause;
+    integer i;
+
+    genvar n;
+    generate
+        for (n = 0; n < NUM_CORES; n = n + 1) begin : core
+            sha1_wb #(
+                .BASE_ADDRESS(BASE_ADDRESS + n * CORE_SIZE),
+                .PIPELINED(PIPELINED),
+                .NUM_CORES(n == 0 ? NUM_CORES : 1))
+            sha1_wishbone (
+                .reset(reset),
+                .chicken_bits_in(8'b0),
+                .chicken_bits_out(),
+                .done(done[n]),
+                .busy(core_busy[n]),
+                .irq(),
+                .wb_clk_i(wb_clk_i),
+                .wb_rst_i(wb_rst_i),
+                .wbs_stb_i(wbs_stb_i),
+                .wbs_cyc_i(wbs_cyc_i),
+                .wbs_we_i(wbs_we_i),
+                .wbs_sel_i(wbs_sel_i),
+                .wbs_dat_i(wbs_dat_i),
+                .wbs_adr_i(wbs_adr_i),
+                .wbs_ack_o(core_ack[n]),
+                .wbs_stall_o(core_stall[n]),
+                .wbs_dat_o(core_dat[n]));
+        end
+
+        if (PIPE_STAGES != 0) begin : pipe
+            /* What CTRL_PIPE_IN and CTRL_PIPE_H have so far. */
+            reg [511:0] block;
+            reg [159:0] h;
+            reg [4:0] words;
+            reg [2:0] h_words;
+            /*
+             * What CTRL_PIPE_GO handed over, in_valid until the pipe takes
+             * it. The next block can be written in the meantime.
+             */
+            reg [511:0] in_block;
+            reg [159:0] in_h;
+            reg [7:0] in_tag;
+            reg pending;
+            /* Handed over and not read back with CTRL_PIPE_OUT yet. */
+            reg [7:0] queued;
+
+            /* {tag, h0..h4} as they come out. */
+            reg [167:0] fifo[PIPE_FIFO-1:0];
+            reg [7:0] fifo_n;
+            reg [FIFO_BITS-1:0] fifo_rd;
+            reg [FIFO_BITS-1:0] fifo_wr;
+            reg [167:0] out_q;
+
+            reg [31:0] dat_q;
+            reg ack_q;
+
+            wire in_ready;
+            wire out_valid;
+            wire [159:0] out_digest;
+            wire [7:0] out_tag;
+            wire pop;
+            wire hold;
+            wire req;
+
+            sha1_pipe #(
+                .STAGES(PIPE_STAGES),
+                .UNROLL(1),
+                .TAG_WIDTH(8))
+            sha1_pipe (
+                .clk(wb_clk_i),
+                .reset(reset),
+                .in_valid(pending),
+                .in_ready(in_ready),
+                .in_block(in_block),
+                .in_h(in_h),
+                .in_tag(in_tag),
+                .out_valid(out_valid),
+                .out_digest(out_digest),
+                .out_tag(out_tag));
+
+            always @(posedge wb_clk_i) begin
+                if (reset) begin
+                    dat_q <= 0;
+                    ack_q <= 1'b0;
+                    words <= 0;
+                    h_words <= 0;
+                    pending <= 1'b0;
+                    queued <= 0;
+                    fifo_n <= 0;
+                    fifo_rd <= 0;
+                    fifo_wr <= 0;
+                    out_q <= 0;
+                end else begin
+                    ack_q <= req;
+                    if (in_ready)
+                        pending <= 1'b0;
+
+                    if (out_valid) begin
+                        fifo[fifo_wr] <= {out_tag, out_digest};
+                        fifo_wr <= fifo_wr + 1'b1;
+                    end
+                    fifo_n <= fifo_n + out_valid - pop;
+
+                    if (req && !wbs_we_i) begin
+                        dat_q <= 0;
+                        if (wbs_adr_i == CTRL_PIPE_OUT && fifo_n != 0) begin
+                            out_q <= fifo[fifo_rd];
+                            fifo_rd <= fifo_rd + 1'b1;
+                            queued <= queued - 1'b1;
+                            dat_q <= PIPE_VALID | {24'b0, fifo[fifo_rd][167:160]};
+                        end
+                        if (wbs_adr_i >= CTRL_PIPE_H0)
+                            dat_q <= out_q[159 - 8 * (wbs_adr_i - CTRL_PIPE_H0) -: 32];
+                    end
+                    if (req && wbs_we_i && &wbs_sel_i) begin
+                        dat_q <= ACK;
+                        case (wbs_adr_i)
+                            CTRL_PIPE_IN:
+                                if (words == 16)
+                                    dat_q <= EINVAL;
+                                else begin
+                                    block[511 - 32 * words -: 32] <= wbs_dat_i;
+                                    words <= words + 1'b1;
+                                end
+                            CTRL_PIPE_H:
+                                if (h_words == 5)
+                                    dat_q <= EINVAL;
+                                else begin
+                                    h[159 - 32 * h_words -: 32] <= wbs_dat_i;
+                                    h_words <= h_words + 1'b1;
+                                end
+                            CTRL_PIPE_GO:
+                                if (words != 16 || ((wbs_dat_i & PIPE_INIT) == 0 && h_words != 5))
+                                    dat_q <= EINVAL;
+                                else if ({24'b0, queued} == PIPE_FIFO)
+                                    dat_q <= EBUSY;
+                                else begin
+                                    in_block <= block;
+                                    in_h <= ((wbs_dat_i & PIPE_INIT) != 0) ? INITIAL_H : h;
+                                    in_tag <= wbs_dat_i[7:0];
+                                    words <= 0;
+                                    h_words <= 0;
+                                    pending <= 1'b1;
+                                    queued <= queued + 1'b1;
+                                end
+                        endcase
+                    end
+                end
+            end
+
+            /* In the pipe window, and not a CTRL_PIPE_GO that has to wait. */
+            assign req = wb_req && !hold && (wbs_adr_i >= CTRL_PIPE_IN) && (wbs_adr_i <= CTRL_PIPE_H4);
+            assign hold = wbs_we_i && pending && (wbs_adr_i == CTRL_PIPE_GO);
+            assign pop = req && !wbs_we_i && (wbs_adr_i == CTRL_PIPE_OUT) && (fifo_n != 0);
+
+            assign pipe_ack = ack_q;
+            assign pipe_stall = PIPELINED && wb_active && hold;
+            assign pipe_dat = ack_q ? dat_q : 32'b0;
+        end else begin : no_pipe
+            assign pipe_ack = 1'b0;
+            assign pipe_stall = 1'b0;
+            assign pipe_dat = 32'b0;
+        end
+    endgenerate
+
+    always @(posedge wb_clk_i) begin
+        if (reset) begin
+            buffer_o <= 0;
+            transmit <= 1'b0;
+            done_q <= 0;
+            irq_cause <= 0;
+        end else begin
+            transmit <= 1'b0;
+            done_q <= done;
+            irq_cause <= irq_cause | (done & ~done_q);
+
+            if (wb_req && !wbs_we_i) begin
+                case (wbs_adr_i)
+                    CTRL_CORE_BUSY:
+                        buffer_o <= {{(32 - NUM_CORES){1'b0}}, core_busy};
+                    CTRL_CORE_DONE:
+                        buffer_o <= {{(32 - NUM_CORES){1'b0}}, done};
+                    CTRL_CORE_IRQ:
+                        buffer_o <= {{(32 - NUM_CORES){1'b0}}, irq_cause};
+                endcase
+                if ((wbs_adr_i >= CTRL_CORE_BUSY) && (wbs_adr_i <= CTRL_CORE_IRQ))
+                    transmit <= 1'b1;
+            end
+            if (wb_req && wbs_we_i && &wbs_sel_i) begin
+                if (wbs_adr_i == CTRL_CORE_IRQ) begin
+                    /* Unless it just came in again. */
+                    irq_cause <= (irq_cause & ~wbs_dat_i[NUM_CORES-1:0]) | (done & ~done_q);
+                    buffer_o <= ACK;
+                end
+                if ((wbs_adr_i >= CTRL_CORE_BUSY) && (wbs_adr_i <= CTRL_CORE_IRQ))
+                    transmit <= 1'b1;
+            end
+        end
+    end
+
+    /* Only the core (or us) that the address is for acks it. */
+    always @(*) begin
+        core_dat_o = (transmit ? buffer_o : 32'b0) | pipe_dat;
+        for (i = 0; i < NUM_CORES; i = i + 1)
+            core_dat_o = core_dat_o | (core_ack[i] ? core_dat[i] : 32'b0);
+    end
+
+    assign wb_req = wb_active && !wbs_stall_o && (PIPELINED || !(transmit || pipe_ack));
+
+    assign wbs_ack_o = reset ? 1'b0 : (transmit || pipe_ack || |core_ack);
+
+    assign wbs_stall_o = reset ? 1'b0 : (|core_stall || pipe_stall);
+
+    assign wbs_dat_o = reset ? 32'b0 : core_dat_o;
+
+    assign irq = reset ? 1'b0 : |irq_cause;
+endmodule
+`default_nettype wire
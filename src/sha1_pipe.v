@@ -0,0 +1,179 @@
+// SPDX-FileCopyrightText: 2021 Konrad Rzeszutek Wilk
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//      http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+// SPDX-License-Identifier: Apache-2.0
+
+`default_nettype none
+`timescale 1ns/1ns
+
+/*
+ * High throughput SHA-1 for many independent blocks.
+ *
+ * The 80 rounds are split over STAGES pipeline stages, each doing UNROLL
+ * rounds per clock, so a new block goes in every 80 / (STAGES * UNROLL)
+ * clocks (STAGES * UNROLL has to divide 80) and the digests come out in the
+ * same order, with the tag they went in with.
+ *
+ * in_block is the padded 512 bit block, w[0] in [511:480]. in_h is what to
+ * start from: h0..h4 ({h0, h1, h2, h3, h4}) of the previous block of the
+ * same message, or the initial values for the first one. out_digest is the
+ * new h0..h4, there for one clock with out_valid.
+ *
+ * sha1_multi has one behind the bus with PIPE_STAGES, see CTRL_PIPE_IN.
+ */
+module sha1_pipe #(
+    parameter  STAGES = 4,
+    parameter  UNROLL = 1,
+    parameter  TAG_WIDTH = 8
+    ) (
+    input wire clk,
+    input wire reset,
+
+    input wire in_valid,
+    output wire in_ready,
+    input wire [511:0] in_block,
+    input wire [159:0] in_h,
+    input wire [TAG_WIDTH-1:0] in_tag,
+
+    output reg out_valid,
+    output reg [159:0] out_digest,
+    output reg [TAG_WIDTH-1:0] out_tag
+);
+    /* Rounds and clocks in each stage. */
+    localparam ROUNDS = 80 / STAGES;
+    localparam CLOCKS = ROUNDS / UNROLL;
+
+    /* Where we are in every stage, they all move on together. */
+    reg [6:0] cnt;
+    wire step;
+
+    /*
+     * Per stage: a..e, h0..h4 to add at the end and the last 16 of w[],
+     * w[i] in [31:0].
+     */
+    reg [159:0] state[STAGES-1:0];
+    reg [159:0] h[STAGES-1:0];
+    reg [511:0] window[STAGES-1:0];
+    reg [TAG_WIDTH-1:0] tag[STAGES-1:0];
+    reg [STAGES-1:0] valid;
+
+    wire [159:0] state_next[STAGES-1:0];
+    wire [511:0] window_next[STAGES-1:0];
+    wire [511:0] in_window;
+
+    integer s;
+
+    /* a, b, c, d, e in, a, b, c, d, e after round t. */
+    function [159:0] sha1_round;
+        input [159:0] abcde;
+        input [31:0] w;
+        input [31:0] t;
+        reg [31:0] a, b, c, d, e, f, k;
+        begin
+            {a, b, c, d, e} = abcde;
+            if (t < 20) begin
+                f = (b & c) | ((~b) & d);
+                k = 32'h5A827999;
+            end else if (t < 40) begin
+                f = b ^ c ^ d;
+                k = 32'h6ED9EBA1;
+            end else if (t < 60) begin
+                f = (b & c) | (b & d) | (c & d);
+                k = 32'h8F1BBCDC;
+            end else begin
+                f = b ^ c ^ d;
+                k = 32'hCA62C1D6;
+            end
+            sha1_round = {{a[26:0], a[31:27]} + f + e + k + w, a, {b[1:0], b[31:2]}, c, d};
+        end
+    endfunction
+
+    genvar n, j;
+    generate
+        for (j = 0; j < 16; j = j + 1) begin : in_w
+            assign in_window[32 * j +: 32] = in_block[511 - 32 * j -: 32];
+        end
+
+        for (n = 0; n < STAGES; n = n + 1) begin : stage
+            /* w[i .. i + 15 + UNROLL]. */
+            wire [32 * (16 + UNROLL) - 1:0] w;
+
+            assign w[511:0] = window[n];
+            /*
+             * Every round has its own a..e, out of the one before it. As one
+             * array the chain looks circular to Verilator (UNOPTFLAT).
+             */
+            for (j = 0; j < UNROLL; j = j + 1) begin : round
+                wire [159:0] abcde;
+
+                /* w[i+16] = (w[i+13] xor w[i+8] xor w[i+2] xor w[i]) leftrotate 1 */
+                wire [31:0] x = w[32 * (j + 13) +: 32] ^ w[32 * (j + 8) +: 32] ^
+                                w[32 * (j + 2) +: 32] ^ w[32 * j +: 32];
+                assign w[32 * (j + 16) +: 32] = {x[30:0], x[31]};
+                if (j == 0) begin : first
+                    assign abcde = sha1_round(state[n], w[31:0], n * ROUNDS + cnt * UNROLL);
+                end else begin : next
+                    assign abcde = sha1_round(round[j - 1].abcde, w[32 * j +: 32], n * ROUNDS + cnt * UNROLL + j);
+                end
+            end
+            assign state_next[n] = round[UNROLL - 1].abcde;
+            assign window_next[n] = w[32 * UNROLL +: 512];
+        end
+    endgenerate
+
+    always @(posedge clk) begin
+        if (reset) begin
+            cnt <= 0;
+            valid <= 0;
+            out_valid <= 1'b0;
+        end else begin
+            out_valid <= 1'b0;
+            if (step) begin
+                /* Last rounds of every stage, into the next one. */
+                cnt <= 0;
+                for (s = STAGES - 1; s > 0; s = s - 1) begin
+                    state[s] <= state_next[s - 1];
+                    window[s] <= window_next[s - 1];
+                    h[s] <= h[s - 1];
+                    tag[s] <= tag[s - 1];
+                    valid[s] <= valid[s - 1];
+                end
+                state[0] <= in_h;
+                window[0] <= in_window;
+                h[0] <= in_h;
+                tag[0] <= in_tag;
+                valid[0] <= in_valid;
+
+                out_valid <= valid[STAGES - 1];
+                out_tag <= tag[STAGES - 1];
+                out_digest <= {h[STAGES - 1][159:128] + state_next[STAGES - 1][159:128],
+                               h[STAGES - 1][127:96] + state_next[STAGES - 1][127:96],
+                               h[STAGES - 1][95:64] + state_next[STAGES - 1][95:64],
+                               h[STAGES - 1][63:32] + state_next[STAGES - 1][63:32],
+                               h[STAGES - 1][31:0] + state_next[STAGES - 1][31:0]};
+            end else begin
+                cnt <= cnt + 1'b1;
+                for (s = 0; s < STAGES; s = s + 1) begin
+                    state[s] <= state_next[s];
+                    window[s] <= window_next[s];
+                end
+            end
+        end
+    end
+
+    assign step = ({25'b0, cnt} == CLOCKS - 1);
+
+    /* A block goes in when all the stages move on. */
+    assign in_ready = reset ? 1'b0 : step;
+endmodule
+`default_nettype wire
@@ -25,12 +25,21 @@
 module sha1_wb #(
     parameter    [31:0] BASE_ADDRESS   = 32'h30000024,
     parameter  IDX_WIDTH = 6,
-    parameter  DATA_WIDTH = 32
+    parameter  DATA_WIDTH = 32,
+    /* Wishbone B4 pipelined mode, one transfer per clock and wbs_stall_o. */
+    parameter  PIPELINED = 0,
+    /* How many there are behind sha1_multi, reported in CTRL_GET_NR. */
+    parameter  NUM_CORES = 1,
+    /* HMAC keys kept on chip, up to 8. */
+    parameter  HMAC_SLOTS = 2,
+    /* chicken_bits_out has the low bits of the CTRL_PERF counters. */
+    parameter  PERF_LA = 0
     ) (
     input wire reset,
     input wire [7:0] chicken_bits_in,
     output wire [15:0] chicken_bits_out,
     output wire done,
+    output wire busy,
     output wire irq,
 
     /* WishBone logic */
@@ -44,10 +53,18 @@ module sha1_wb #(
     input wire [31:0] wbs_dat_i,
     input wire [31:0] wbs_adr_i,
     output wire wbs_ack_o,
+    output wire wbs_stall_o,
     output wire [31:0] wbs_dat_o
 
 );
     wire wb_active = wbs_stb_i & wbs_cyc_i;
+    /*
+     * The request we act on this clock. In classic mode the master keeps
+     * stb up until it sees the ack, so the clock the ack is out is the same
+     * request again. In pipelined mode every clock without stall is a new one.
+     */
+    wire wb_req;
+    wire wb_in_range;
 
     reg [31:0] buffer;
     reg [31:0] buffer_o;
@@ -56,14 +73,86 @@ module sha1_wb #(
     reg sha1_reset;
     reg sha1_panic;
     reg sha1_done;
+    reg sha1_continue;
+    reg sha1_loaded;
+    reg sha1_last;
+    reg sha1_final;
+    reg sha1_pad;
+    reg sha1_extra;
+    reg [2:0] sha1_irq_en;
+    reg [2:0] sha1_irq_status;
+    reg sha1_done_q;
+    reg sha1_panic_q;
+    wire [2:0] irq_cause;
+    reg [31:0] sha1_msg_len;
+    /* CTRL_MSG_LEN was written since RESET or ON. */
+    reg sha1_len_set;
+    reg [31:0] sha1_msg_hashed;
+    /* Free running, see CTRL_PERF_BUSY. */
+    reg [31:0] perf_busy;
+    reg [31:0] perf_blocks;
+    reg [31:0] perf_padded;
+    reg [31:0] perf_rejects;
+    reg [31:0] perf_early;
+    reg [31:0] perf_panics;
+    wire early_read;
     wire finish;
     reg [2:0] sha1_digest_idx;
     reg [6:0] sha1_msg_idx;
+    reg [4:0] sha1_next_idx;
     reg transmit;
 
     wire [159:0] digest;
-    reg [DATA_WIDTH-1:0] message[79:0];
+    /* Only the last 16 of the 80 w[] are needed, w[i] is in message[i % 16]. */
+    reg [DATA_WIDTH-1:0] message[15:0];
+    reg [DATA_WIDTH-1:0] message_next[15:0];
     reg [IDX_WIDTH:0] index;
+    reg chain;
+    integer i;
+
+    wire next_full;
+    wire next_take;
+    wire msg_stall;
+    wire idle;
+    wire h_load;
+
+    reg [1:0] hmac_mode;
+    /* Wide enough for HMAC_SLOTS - 1, CTRL_HMAC has it in [10:8]. */
+    localparam SLOT_WIDTH = (HMAC_SLOTS > 1) ? $clog2(HMAC_SLOTS) : 1;
+    reg [SLOT_WIDTH-1:0] hmac_slot;
+    /* The slot in a CTRL_HMAC write is one there is. */
+    wire hmac_slot_ok;
+    /* As CTRL_HMAC reads them. */
+    reg [2:0] hmac_slot_rd;
+    reg [7:0] hmac_valid_rd;
+    reg [HMAC_SLOTS-1:0] hmac_valid;
+    reg hmac_outer;
+    wire hmac_on;
+    wire hmac_key;
+    /* What the key XOR ipad and XOR opad blocks hash to, from the IV. */
+    reg [159:0] hmac_in[HMAC_SLOTS-1:0];
+    reg [159:0] hmac_out[HMAC_SLOTS-1:0];
+    wire [31:0] pad_len;
+    reg [DATA_WIDTH-1:0] outer_word;
+
+    wire [5:0] pad_rem;
+    wire [4:0] pad_words;
+    wire pad_fits;
+    wire [DATA_WIDTH-1:0] pad_mask;
+    reg [DATA_WIDTH-1:0] pad_word;
+
+    reg msg_swap;
+    /* CTRL_MSG_IN bytes short of a word, the first of them in [23:16]. */
+    reg [23:0] msg_part;
+    reg [1:0] msg_part_n;
+    wire [DATA_WIDTH-1:0] msg_in;
+    wire [3:0] msg_sel;
+    reg [55:0] msg_acc;
+    reg [2:0] msg_acc_n;
+    wire msg_full;
+    wire [DATA_WIDTH-1:0] msg_word;
+    wire pad_ready;
+    integer j;
 
     localparam STATE_INIT   = 0;
     localparam STATE_START  = 1;
@@ -77,25 +166,36 @@ module sha1_wb #(
     reg [3:0] state;
 
     wire [DATA_WIDTH-1:0] w;
+    wire [3:0] w_3;
+    wire [3:0] w_8;
+    wire [3:0] w_14;
+    wire [3:0] w_16;
     wire [DATA_WIDTH-1:0] a_left_5;
-    wire [DATA_WIDTH-1:0] w_left_1;
-    wire [DATA_WIDTH-1:0] b_old_left_30;
+    wire [DATA_WIDTH-1:0] b_left_30;
+    wire [DATA_WIDTH-1:0] temp_next;
+    wire round;
 
     reg [DATA_WIDTH-1:0] a;
-    reg [DATA_WIDTH-1:0] a_old;
     reg [DATA_WIDTH-1:0] b;
-    reg [DATA_WIDTH-1:0] b_old;
     reg [DATA_WIDTH-1:0] c;
-    reg [DATA_WIDTH-1:0] c_old;
     reg [DATA_WIDTH-1:0] d;
-    reg [DATA_WIDTH-1:0] d_old;
     reg [DATA_WIDTH-1:0] e;
-    reg [DATA_WIDTH-1:0] e_old;
 
     reg [DATA_WIDTH-1:0] k;
+    /* k of the next round. */
+    reg [DATA_WIDTH-1:0] k_next;
+    /*
+     * e + k + w[i] for the round we are in, done the round before and kept
+     * as sum and carry (see csa), so there is no carry to wait for.
+     */
+    reg [DATA_WIDTH-1:0] ekw_s;
+    reg [DATA_WIDTH-1:0] ekw_c;
+    wire [2*DATA_WIDTH-1:0] csa_1;
+    wire [2*DATA_WIDTH-1:0] csa_2;
+    wire [DATA_WIDTH-1:0] w_next;
+    reg [159:0] start_h;
     reg [DATA_WIDTH-1:0] f;
     reg [DATA_WIDTH-1:0] temp;
-    reg [DATA_WIDTH-1:0] temp_old;
 
     reg [DATA_WIDTH-1:0] h0;
     reg [DATA_WIDTH-1:0] h1;
@@ -104,13 +204,13 @@ module sha1_wb #(
     reg [DATA_WIDTH-1:0] h4;
 
     reg panic;
-    reg inc_counter;
-    reg copy_values;
-    reg compute;
 
-    /* CTRL_GET parameters. */
+    /*
+     * CTRL_GET parameters. CTRL_GET_NR is [7:0] the number of commands and
+     * [15:8] how many more cores follow this one (see sha1_multi).
+     */
     localparam CTRL_GET_NR		= BASE_ADDRESS;
-    localparam CTRL_NR 			= 4;
+    localparam CTRL_NR 			= 8;
 
     localparam CTRL_GET_ID		= BASE_ADDRESS + 'h4;
     localparam CTRL_ID			= 32'h53484131; /* SHA1 */
@@ -118,15 +218,36 @@ module sha1_wb #(
     /*
      * When writing: The [2:0] are operations.
      * When reading: [10:4] in what loop we are [0->79]. [1:0] are operations.
+     *
+     * CONTINUE can only be written once DONE is set, or after h0..h4 were
+     * written (see CTRL_DIGEST_H0). It keeps the digest (h0..h4) and the
+     * next 16 CTRL_MSG_IN are hashed as the next block of the same message.
+     * Writing ON or RESET starts a new message.
+     *
+     * FINAL (can be or'ed with CONTINUE) is written before the last block.
+     * After that only the CTRL_MSG_LEN % 64 bytes left are written and the
+     * engine adds the 0x80, the zeros and the length, and if the length does
+     * not fit hashes one more block for it. DONE is set for the last block.
+     * CTRL_MSG_LEN has to be written first (after RESET or ON), FINAL
+     * without it is EINVAL.
      */
     localparam CTRL_SHA1_OPS    = BASE_ADDRESS + 'h8;
     localparam ON			    = 4'b0001;
     localparam OFF			    = 4'b0000;
     localparam RESET			= 4'b0010;
     localparam PANIC			= 4'b0100; /* Can only be read. */
+    localparam CONTINUE			= 4'b0100; /* Can only be written. */
+    localparam FINAL			= 4'b1000; /* Can only be written. */
     localparam DONE			    = 4'b1000; /* Can only be read. */
 
-    /* This requires 16 CTRL_MSG_IN and after that we start processing. */
+    /*
+     * This requires 16 CTRL_MSG_IN and after that we start processing.
+     *
+     * While it is processing the next 16 go in a second buffer and are the
+     * next block of the same message, which starts as soon as this one is
+     * done. Writes past those 16 are held (no ack) until the engine takes
+     * the buffer.
+     */
     localparam CTRL_MSG_IN		= BASE_ADDRESS + 'hC;
     localparam ACK			    = 32'h0000001;
     localparam EINVAL			= 32'hfffffea; /* -14 */
@@ -136,6 +257,104 @@ module sha1_wb #(
     localparam EBUSY            = 32'hfffffff0; /* -10 */
     localparam CTRL_PANIC 			= BASE_ADDRESS + 'h14;
 
+    /*
+     * Length of the whole message in bytes, used by FINAL. Written before
+     * FINAL, while the engine pads with it writes are EINVAL.
+     */
+    localparam CTRL_MSG_LEN		= BASE_ADDRESS + 'h18;
+
+    /*
+     * The digest one word per address, in any order and as often as needed.
+     * Unlike CTRL_SHA1_DIGEST these do not move sha1_digest_idx.
+     *
+     * Once DONE they are also the midstate to save, with CTRL_MSG_HASHED, to
+     * switch to another message. Writing them while the engine is idle (else
+     * EBUSY) puts it back, and CONTINUE hashes the next block on top of it.
+     */
+    localparam CTRL_DIGEST_H0		= BASE_ADDRESS + 'h1C;
+    localparam CTRL_DIGEST_H1		= BASE_ADDRESS + 'h20;
+    localparam CTRL_DIGEST_H2		= BASE_ADDRESS + 'h24;
+    localparam CTRL_DIGEST_H3		= BASE_ADDRESS + 'h28;
+    localparam CTRL_DIGEST_H4		= BASE_ADDRESS + 'h2C;
+
+    /*
+     * Which of the causes raise irq. They are latched in CTRL_IRQ_STATUS
+     * whether enabled or not, writing 1 to a bit there clears it.
+     */
+    localparam CTRL_IRQ_EN		= BASE_ADDRESS + 'h30;
+    localparam CTRL_IRQ_STATUS		= BASE_ADDRESS + 'h34;
+    localparam IRQ_BLOCK		= 3'b001; /* A block is hashed. */
+    localparam IRQ_MSG			= 3'b010; /* DONE, the digest is ready. */
+    localparam IRQ_PANIC		= 3'b100;
+
+    /*
+     * Bytes of the message in full blocks so far, 64 for every 16 words
+     * CTRL_MSG_IN takes before FINAL. Cleared by ON and RESET and written
+     * back with the midstate, the engine itself does not need it.
+     *
+     * 0x38 to 0x48 are sha1_dma's.
+     */
+    localparam CTRL_MSG_HASHED		= BASE_ADDRESS + 'h4C;
+
+    /*
+     * HMAC-SHA1. Writing HMAC_KEY (only when idle, else EBUSY) with the slot
+     * in [10:8] starts a new message that is the key: the next 16 CTRL_MSG_IN
+     * are the key padded with zeros (hashed first if over 64 bytes). Both
+     * key XOR ipad and key XOR opad are hashed and kept in the slot, and at
+     * DONE the mode is HMAC_MSG with it.
+     *
+     * With HMAC_MSG every message is the MAC with that slot's key, through
+     * the usual CTRL_MSG_LEN, FINAL, CTRL_MSG_IN and digest flow. The first
+     * block starts from the ipad midstate, the padding counts the 64 bytes
+     * of it and after the last block the engine hashes the outer block by
+     * itself. HMAC_OFF is plain SHA-1 again, RESET does not change the mode.
+     *
+     * Reading gives [1:0] the mode, [10:8] the slot and [23:16] which slots
+     * have a key. HMAC_MSG for a slot without one is EINVAL.
+     */
+    localparam CTRL_HMAC		= BASE_ADDRESS + 'h50;
+    localparam HMAC_OFF			= 2'b00;
+    localparam HMAC_MSG			= 2'b01;
+    localparam HMAC_KEY			= 2'b10;
+    localparam IPAD			= 32'h36363636;
+    localparam OPAD			= 32'h5c5c5c5c;
+    /* The outer block is 64 + 20 bytes in. */
+    localparam OUTER_BITS		= 32'd672;
+
+    /*
+     * How CTRL_MSG_IN takes its writes. Only the byte lanes in wbs_sel_i
+     * are taken and they add up to words, so the message can be written a
+     * byte or a halfword at a time (or the last word short of it, after
+     * FINAL CTRL_MSG_LEN % 64 bytes are all it waits for). Without MSG_SWAP
+     * a write is a big-endian number, [31:24] first; with it the lanes go
+     * in memory order, [7:0] first, and a word loaded from a byte buffer is
+     * written as it is. Reading gives MSG_SWAP and in [5:4] how many bytes
+     * wait for the rest of their word. ON, RESET and CONTINUE drop those.
+     */
+    localparam CTRL_MSG_CFG		= BASE_ADDRESS + 'h54;
+    localparam MSG_SWAP			= 32'h00000001;
+
+    /*
+     * Performance counters, counting from reset and wrapping around. Each
+     * can be written, 0 to clear it; RESET and ON leave them alone.
+     *
+     * BUSY: clocks with a message in and not done (as the busy pin).
+     * BLOCKS: blocks hashed, with the padding, HMAC key and outer ones.
+     * PADDED: messages the engine padded after FINAL and got to DONE with.
+     * Ones the host pads itself are not counted, with CONTINUE every block
+     * of those ends in DONE and which is the last is not known here.
+     * REJECTS: writes answered with EINVAL or EBUSY.
+     * EARLY: digest reads (CTRL_SHA1_DIGEST, H0..H4) answered with EBUSY.
+     * PANICS: times it went into panic.
+     */
+    localparam CTRL_PERF_BUSY		= BASE_ADDRESS + 'h58;
+    localparam CTRL_PERF_BLOCKS		= BASE_ADDRESS + 'h5C;
+    localparam CTRL_PERF_PADDED		= BASE_ADDRESS + 'h60;
+    localparam CTRL_PERF_REJECTS	= BASE_ADDRESS + 'h64;
+    localparam CTRL_PERF_EARLY		= BASE_ADDRESS + 'h68;
+    localparam CTRL_PERF_PANICS		= BASE_ADDRESS + 'h6C;
+    localparam CTRL_LAST		= CTRL_PERF_PANICS;
+
     always @(posedge wb_clk_i) begin
         if (reset) begin
             buffer_o <= DEFAULT;
@@ -143,20 +362,119 @@ module sha1_wb #(
             sha1_panic <= 1'b0;
             transmit <= 1'b0;
             sha1_msg_idx <= 0;
+            sha1_next_idx <= 0;
             sha1_digest_idx <= 0;
             sha1_done <= 0;
+            sha1_continue <= 1'b0;
+            sha1_loaded <= 1'b0;
+            sha1_last <= 1'b0;
+            sha1_final <= 1'b0;
+            sha1_pad <= 1'b0;
+            sha1_extra <= 1'b0;
+            sha1_msg_len <= 0;
+            sha1_len_set <= 1'b0;
+            sha1_msg_hashed <= 0;
+            msg_swap <= 1'b0;
+            msg_part <= 0;
+            msg_part_n <= 0;
+            perf_busy <= 0;
+            perf_blocks <= 0;
+            perf_padded <= 0;
+            perf_rejects <= 0;
+            perf_early <= 0;
+            perf_panics <= 0;
+            hmac_mode <= HMAC_OFF;
+            hmac_slot <= 0;
+            hmac_valid <= 0;
+            hmac_outer <= 1'b0;
+            sha1_irq_en <= 0;
+            sha1_irq_status <= 0;
+            sha1_done_q <= 1'b0;
+            sha1_panic_q <= 1'b0;
             sha1_reset <= 1'b1; /* Reset the SHA1 compute engine */
             sha1_on <= 1'b0;
         end else begin
-            if (transmit)
-                transmit <= 1'b0;
+            transmit <= wb_req && wb_in_range;
+
+            sha1_done_q <= sha1_done;
+            sha1_panic_q <= sha1_panic || panic;
+            sha1_irq_status <= sha1_irq_status | irq_cause;
+
+            if (busy)
+                perf_busy <= perf_busy + 1'b1;
+            if (irq_cause[0])
+                perf_blocks <= perf_blocks + 1'b1;
+            if (irq_cause[1] && sha1_last)
+                perf_padded <= perf_padded + 1'b1;
+            if (irq_cause[2])
+                perf_panics <= perf_panics + 1'b1;
+            if (wb_req && !wbs_we_i && early_read)
+                perf_early <= perf_early + 1'b1;
 
+            /* Once turned off (CONTINUE) the engine is leaving STATE_FINAL. */
+            if (finish && sha1_on) begin
+                if (sha1_extra) begin
+                    /* The length did not fit, pad one more block with it. */
+                    sha1_on <= 1'b0;
+                    sha1_continue <= 1'b1;
+                    sha1_pad <= 1'b1;
+                    sha1_msg_idx <= 0;
+                    sha1_extra <= 1'b0;
+                end else if (hmac_on && sha1_last && !hmac_outer) begin
+                    /* The inner hash is done, pad the outer block with it. */
+                    sha1_on <= 1'b0;
+                    sha1_pad <= 1'b1;
+                    sha1_msg_idx <= 0;
+                    hmac_outer <= 1'b1;
+                end else if (sha1_next_idx == 0) begin
+                    sha1_done <= 1'b1;
+                    if (hmac_key) begin
+                        hmac_mode <= HMAC_MSG;
+                        hmac_valid[hmac_slot] <= 1'b1;
+                    end
+                end
+            end
+            /* The engine took the second buffer as its next block. */
+            if (next_take)
+                sha1_next_idx <= 0;
+            /* The host wrote what is left of the message, pad the rest. */
+            if (sha1_final && !sha1_pad && !sha1_on && pad_ready) begin
+                sha1_pad <= 1'b1;
+                sha1_msg_idx <= {3'b0, pad_rem[5:2]};
+                sha1_extra <= !pad_fits;
+                /* Written in bytes the last word is short, pad_word masks the rest. */
+                if (msg_part_n != 0) begin
+                    message[pad_rem[5:2]] <= {msg_part, 8'b0};
+                    msg_part_n <= 0;
+                end
+            end
+            if (sha1_pad) begin
+                message[sha1_msg_idx[3:0]] <= pad_word;
+                if (sha1_msg_idx == 'hf) begin
+                    sha1_pad <= 1'b0;
+                    sha1_final <= 1'b0;
+                    sha1_on <= 1'b1;
+                    sha1_msg_idx <= 0;
+                    /* Unless the length goes in one more. */
+                    sha1_last <= !sha1_extra;
+                end else
+                    sha1_msg_idx <= sha1_msg_idx + 1'b1;
+            end
             if (sha1_reset) begin
                 sha1_digest_idx <= 0;
+                sha1_next_idx <= 0;
+                sha1_done <= 0;
+                sha1_continue <= 1'b0;
+                sha1_final <= 1'b0;
+                sha1_pad <= 1'b0;
+                sha1_extra <= 1'b0;
+                sha1_msg_hashed <= 0;
+                msg_part_n <= 0;
+                sha1_len_set <= 1'b0;
+                sha1_last <= 1'b0;
+                hmac_outer <= 1'b0;
                 sha1_reset <= 1'b0;
             end
-            if (finish)
-                sha1_done <= 1'b1;
             if (chicken_bits_in) begin
 		case (chicken_bits_in[7:0])
 		   8'b0000_0001: sha1_on <= 1'b1;
@@ -170,11 +488,11 @@ module sha1_wb #(
 		   default: ;
                 endcase
             end
-            if (wb_active && !wbs_we_i) begin
+            if (wb_req && !wbs_we_i) begin
                 case (wbs_adr_i)
                     CTRL_GET_NR:
                     begin
-                        buffer_o <= CTRL_NR;
+                        buffer_o <= CTRL_NR | ((NUM_CORES - 1) << 8);
                     end
                     CTRL_GET_ID:
                         buffer_o <= CTRL_ID;
@@ -193,52 +511,152 @@ module sha1_wb #(
                                 'h0: buffer_o <= h0;
                                 default: sha1_panic <= 1'b1;
                             endcase
-                            if (!transmit) begin
-                                if (sha1_digest_idx == 4)
-                                    sha1_digest_idx <= 0;
-                                else
-                                    sha1_digest_idx <= sha1_digest_idx + 1'b1;
-                            end
+                            if (sha1_digest_idx == 4)
+                                sha1_digest_idx <= 0;
+                            else
+                                sha1_digest_idx <= sha1_digest_idx + 1'b1;
                         end else
                             buffer_o <= EBUSY;
                     end
                     CTRL_PANIC:
                         buffer_o <= {31'b0, sha1_panic};
+                    CTRL_MSG_LEN:
+                        buffer_o <= sha1_msg_len;
+                    CTRL_IRQ_EN:
+                        buffer_o <= {29'b0, sha1_irq_en};
+                    CTRL_IRQ_STATUS:
+                        buffer_o <= {29'b0, sha1_irq_status};
+                    CTRL_DIGEST_H0:
+                        buffer_o <= (sha1_done || sha1_loaded) ? h0 : EBUSY;
+                    CTRL_DIGEST_H1:
+                        buffer_o <= (sha1_done || sha1_loaded) ? h1 : EBUSY;
+                    CTRL_DIGEST_H2:
+                        buffer_o <= (sha1_done || sha1_loaded) ? h2 : EBUSY;
+                    CTRL_DIGEST_H3:
+                        buffer_o <= (sha1_done || sha1_loaded) ? h3 : EBUSY;
+                    CTRL_DIGEST_H4:
+                        buffer_o <= (sha1_done || sha1_loaded) ? h4 : EBUSY;
+                    CTRL_MSG_HASHED:
+                        buffer_o <= sha1_msg_hashed;
+                    CTRL_HMAC:
+                        buffer_o <= {8'b0, hmac_valid_rd, 5'b0, hmac_slot_rd, 6'b0, hmac_mode};
+                    CTRL_MSG_CFG:
+                        buffer_o <= {26'b0, msg_part_n, 3'b0, msg_swap};
+                    CTRL_PERF_BUSY:
+                        buffer_o <= perf_busy;
+                    CTRL_PERF_BLOCKS:
+                        buffer_o <= perf_blocks;
+                    CTRL_PERF_PADDED:
+                        buffer_o <= perf_padded;
+                    CTRL_PERF_REJECTS:
+                        buffer_o <= perf_rejects;
+                    CTRL_PERF_EARLY:
+                        buffer_o <= perf_early;
+                    CTRL_PERF_PANICS:
+                        buffer_o <= perf_panics;
                 endcase
-                if ((wbs_adr_i[31:0] >= BASE_ADDRESS) && (wbs_adr_i <= CTRL_PANIC))
-                    transmit <= 1'b1;
             end
-		    /* Write case */
-            if (wb_active && wbs_we_i && &wbs_sel_i) begin
+		    /* Write case, CTRL_MSG_IN takes any of the byte lanes. */
+            if (wb_req && wbs_we_i && (&wbs_sel_i || (wbs_adr_i == CTRL_MSG_IN))) begin
                 case (wbs_adr_i)
                     CTRL_SHA1_OPS:
                     begin
-                        sha1_on <= wbs_dat_i[0];
-                        sha1_reset <= wbs_dat_i[1];
-                        if (wbs_dat_i[0]) begin
-                            sha1_msg_idx <= 0;
-                            sha1_done <= 0;
-                            sha1_digest_idx <= 0;
+                        if (wbs_dat_i[2] || wbs_dat_i[3]) begin
+                            /* CONTINUE is only valid once the block is done (or h0..h4 written). */
+                            if (wbs_dat_i[2] && !sha1_done && !sha1_loaded) begin
+                                buffer_o <= EINVAL;
+                                perf_rejects <= perf_rejects + 1'b1;
+                            end else if (wbs_dat_i[3] && !sha1_len_set) begin
+                                /* FINAL pads with CTRL_MSG_LEN, it has to be written first. */
+                                buffer_o <= EINVAL;
+                                perf_rejects <= perf_rejects + 1'b1;
+                            end else begin
+                                if (wbs_dat_i[2]) begin
+                                    sha1_on <= 1'b0;
+                                    sha1_done <= 0;
+                                    sha1_msg_idx <= 0;
+                                    sha1_digest_idx <= 0;
+                                    sha1_continue <= 1'b1;
+                                    sha1_loaded <= 1'b0;
+                                    msg_part_n <= 0;
+                                    sha1_last <= 1'b0;
+                                    hmac_outer <= 1'b0;
+                                end
+                                if (wbs_dat_i[3])
+                                    sha1_final <= 1'b1;
+                                buffer_o <= {21'b0, index, 1'b0, sha1_panic, sha1_reset, 1'b0};
+                            end
+                        end else begin
+                            sha1_on <= wbs_dat_i[0];
+                            sha1_reset <= wbs_dat_i[1];
+                            sha1_loaded <= 1'b0;
+                            if (wbs_dat_i[0]) begin
+                                sha1_msg_idx <= 0;
+                                sha1_next_idx <= 0;
+                                sha1_done <= 0;
+                                sha1_digest_idx <= 0;
+                                sha1_continue <= 1'b0;
+                                sha1_final <= 1'b0;
+                                sha1_pad <= 1'b0;
+                                sha1_extra <= 1'b0;
+                                sha1_msg_hashed <= 0;
+                                msg_part_n <= 0;
+                                sha1_len_set <= 1'b0;
+                                sha1_last <= 1'b0;
+                                hmac_outer <= 1'b0;
+                            end
+                            buffer_o <= {21'b0, index, sha1_done, sha1_panic, wbs_dat_i[1], wbs_dat_i[0]};
                         end
-                        buffer_o <= {21'b0, index, sha1_done, sha1_panic, wbs_dat_i[1], wbs_dat_i[0]};
                     end
                     CTRL_MSG_IN:
                     begin
-                        if (sha1_on)
+                        if (sha1_pad || (sha1_on && sha1_final)) begin
                             buffer_o <= EINVAL;
-                        else begin
+                            perf_rejects <= perf_rejects + 1'b1;
+                        end else if (!msg_full) begin
+                            /* Not a word yet. */
+                            buffer_o <= ACK;
+                            msg_part <= msg_acc[55:32];
+                            msg_part_n <= msg_acc_n[1:0];
+                        end else if (sha1_on) begin
+                            /* Next block, msg_stall holds us off when both buffers are full. */
+                            buffer_o <= ACK;
+                            msg_part <= msg_acc[23:0];
+                            msg_part_n <= msg_acc_n[1:0];
+                            message_next[sha1_next_idx[3:0]] <= msg_word;
+                            sha1_next_idx <= sha1_next_idx + 1'b1;
+                            if (sha1_next_idx == 'hf)
+                                sha1_msg_hashed <= sha1_msg_hashed + 'd64;
+                            sha1_done <= 0;
+                            sha1_digest_idx <= 0;
+                        end else if (hmac_key) begin
+                            /* The opad block waits in the second buffer. */
                             buffer_o <= ACK;
+                            msg_part <= msg_acc[23:0];
+                            msg_part_n <= msg_acc_n[1:0];
+                            message[sha1_msg_idx[3:0]] <= msg_word ^ IPAD;
+                            message_next[sha1_msg_idx[3:0]] <= msg_word ^ OPAD;
+                            if (sha1_msg_idx == 'hf) begin
+                                sha1_on <= 1'b1;
+                                sha1_msg_idx <= 0;
+                                sha1_next_idx <= 16;
+                            end else
+                                sha1_msg_idx <= sha1_msg_idx + 1'b1;
+                        end else begin
+                            buffer_o <= ACK;
+                            msg_part <= msg_acc[23:0];
+                            msg_part_n <= msg_acc_n[1:0];
                             if (sha1_msg_idx > 15)
-                                    sha1_panic <= 1'b1;
+                                sha1_panic <= 1'b1;
                             else
-                                message[sha1_msg_idx] <= wbs_dat_i;
-                            if (!transmit) begin
-                                if (sha1_msg_idx == 'hf) begin
-                                    sha1_on <= 1'b1;
-                                    sha1_msg_idx <= 0;
-                                end else
-                                    sha1_msg_idx <= sha1_msg_idx + 1'b1;
-                            end
+                                message[sha1_msg_idx[3:0]] <= msg_word;
+                            /* With FINAL it is the padding that turns us on. */
+                            if ((sha1_msg_idx == 'hf) && !sha1_final) begin
+                                sha1_on <= 1'b1;
+                                sha1_msg_idx <= 0;
+                                sha1_msg_hashed <= sha1_msg_hashed + 'd64;
+                            end else
+                                sha1_msg_idx <= sha1_msg_idx + 1'b1;
                         end
                     end
                     CTRL_PANIC:
@@ -247,9 +665,108 @@ module sha1_wb #(
                         buffer <= wbs_dat_i;
                         buffer_o <= ACK;
                     end
+                    CTRL_MSG_LEN:
+                    begin
+                        /* Not once FINAL is padding with it. */
+                        if (sha1_final || sha1_pad || sha1_extra) begin
+                            buffer_o <= EINVAL;
+                            perf_rejects <= perf_rejects + 1'b1;
+                        end else begin
+                            sha1_msg_len <= wbs_dat_i;
+                            sha1_len_set <= 1'b1;
+                            buffer_o <= ACK;
+                        end
+                    end
+                    CTRL_IRQ_EN:
+                    begin
+                        sha1_irq_en <= wbs_dat_i[2:0];
+                        buffer_o <= ACK;
+                    end
+                    CTRL_IRQ_STATUS:
+                    begin
+                        /* Unless it just came in again. */
+                        sha1_irq_status <= (sha1_irq_status & ~wbs_dat_i[2:0]) | irq_cause;
+                        buffer_o <= ACK;
+                    end
+                    CTRL_DIGEST_H0, CTRL_DIGEST_H1, CTRL_DIGEST_H2, CTRL_DIGEST_H3, CTRL_DIGEST_H4:
+                    begin
+                        /* The engine block does the write, see h_load. */
+                        if (idle) begin
+                            sha1_loaded <= 1'b1;
+                            buffer_o <= ACK;
+                        end else begin
+                            buffer_o <= EBUSY;
+                            perf_rejects <= perf_rejects + 1'b1;
+                        end
+                    end
+                    CTRL_MSG_HASHED:
+                    begin
+                        sha1_msg_hashed <= wbs_dat_i;
+                        buffer_o <= ACK;
+                    end
+                    CTRL_HMAC:
+                    begin
+                        if (!idle) begin
+                            buffer_o <= EBUSY;
+                            perf_rejects <= perf_rejects + 1'b1;
+                        end else if ((wbs_dat_i[1:0] == HMAC_KEY) && hmac_slot_ok) begin
+                            hmac_mode <= HMAC_KEY;
+                            hmac_slot <= wbs_dat_i[8 +: SLOT_WIDTH];
+                            hmac_valid[wbs_dat_i[8 +: SLOT_WIDTH]] <= 1'b0;
+                            /* As RESET would. */
+                            sha1_on <= 1'b0;
+                            sha1_reset <= 1'b1;
+                            sha1_msg_idx <= 0;
+                            buffer_o <= ACK;
+                        end else if ((wbs_dat_i[1:0] == HMAC_MSG) && hmac_slot_ok &&
+                                     hmac_valid[wbs_dat_i[8 +: SLOT_WIDTH]]) begin
+                            hmac_mode <= HMAC_MSG;
+                            hmac_slot <= wbs_dat_i[8 +: SLOT_WIDTH];
+                            buffer_o <= ACK;
+                        end else if (wbs_dat_i[1:0] == HMAC_OFF) begin
+                            hmac_mode <= HMAC_OFF;
+                            buffer_o <= ACK;
+                        end else begin
+                            buffer_o <= EINVAL;
+                            perf_rejects <= perf_rejects + 1'b1;
+                        end
+                    end
+                    CTRL_MSG_CFG:
+                    begin
+                        msg_swap <= wbs_dat_i[0];
+                        buffer_o <= ACK;
+                    end
+                    CTRL_PERF_BUSY:
+                    begin
+                        perf_busy <= wbs_dat_i;
+                        buffer_o <= ACK;
+                    end
+                    CTRL_PERF_BLOCKS:
+                    begin
+                        perf_blocks <= wbs_dat_i;
+                        buffer_o <= ACK;
+                    end
+                    CTRL_PERF_PADDED:
+                    begin
+                        perf_padded <= wbs_dat_i;
+                        buffer_o <= ACK;
+                    end
+                    CTRL_PERF_REJECTS:
+                    begin
+                        perf_rejects <= wbs_dat_i;
+                        buffer_o <= ACK;
+                    end
+                    CTRL_PERF_EARLY:
+                    begin
+                        perf_early <= wbs_dat_i;
+                        buffer_o <= ACK;
+                    end
+                    CTRL_PERF_PANICS:
+                    begin
+                        perf_panics <= wbs_dat_i;
+                        buffer_o <= ACK;
+                    end
                 endcase
-                if ((wbs_adr_i[31:0] >= BASE_ADDRESS) && (wbs_adr_i <= CTRL_PANIC))
-                    transmit <= 1'b1;
             end
         end
     end
@@ -258,11 +775,11 @@ module sha1_wb #(
         if (reset || sha1_reset) begin
             state <= STATE_INIT;
             temp <= DEFAULT;
+            ekw_s <= DEFAULT;
+            ekw_c <= 0;
             index <= 0;
             panic <= 0;
-            inc_counter <= 1'b0;
-            copy_values <= 1'b0;
-            compute <= 1'b0;
+            chain <= 1'b0;
         end else begin
             /* We are running and someone turned it off. */
             if ((index > 1) && !sha1_on)
@@ -273,43 +790,40 @@ module sha1_wb #(
                 panic <= 1'b1;
                 state <= STATE_PANIC;
             end
-            /* Increment if allowed to increment counter. */
-            if (inc_counter) begin
-                index <= index + 1'b1;
-                inc_counter <= 1'b0;
-            end
             /*
-             * Every LOOP_ call ends up with copying the data, so
-             * make it generic
+             * Every LOOP_ state retires one round per clock: temp goes
+             * straight into a while the rest of the values shift down.
              */
-            if (compute) begin
-                a_old <= a;
-                b_old <= b;
-                c_old <= c;
-                d_old <= d;
-            end
-            if (copy_values) begin
-                e <= d_old;
-                d <= c_old;
-                c <= b_old_left_30;
-                b <= a_old;
-                a <= temp;
-                copy_values <= 1'b0;
-                compute <= 1'b1;
-                inc_counter <= 1'b1;
+            if (round) begin
+                {ekw_c, ekw_s} <= csa(d, k_next, w_next);
+                /* k of the round after the next one, off the adder path. */
+                if (index == 18)
+                    k_next <= 32'h6ED9EBA1;
+                else if (index == 38)
+                    k_next <= 32'h8F1BBCDC;
+                else if (index == 58)
+                    k_next <= 32'hCA62C1D6;
+                temp <= temp_next;
+                e <= d;
+                d <= c;
+                c <= b_left_30;
+                b <= a;
+                a <= temp_next;
+                index <= index + 1'b1;
             end
             /*
              * For t = 16 to 79
              * w[i] = (w[i-3] xor w[i-8] xor w[i-14] xor w[i-16]) leftrotate 1
              *
-             * This means we need this ready before we get to index=16 hence
-             * the +1 adjustment for every offset.
+             * It is done two rounds ahead, so that w_next (for ekw_s) is in
+             * message[] already, hence the +2 adjustment for every offset.
+             * w[i+2] goes where w[i+2-16] was, which is not needed after this.
              */
-            if (index >= 15) begin
-                message[index+1] <= {(message[index-3+1][30:0] ^ message[index-8+1][30:0] ^
-                                     message[index-14+1][30:0] ^ message[index-16+1][30:0]),
-                                     (message[index-3+1][31] ^ message[index-8+1][31] ^
-                                      message[index-14+1][31] ^ message[index-16+1][31])};
+            if (round && (index >= 14)) begin
+                message[w_16] <= {(message[w_3][30:0] ^ message[w_8][30:0] ^
+                                   message[w_14][30:0] ^ message[w_16][30:0]),
+                                  (message[w_3][31] ^ message[w_8][31] ^
+                                   message[w_14][31] ^ message[w_16][31])};
             end
             case (state)
                 STATE_INIT: begin
@@ -319,91 +833,54 @@ module sha1_wb #(
                         state <= STATE_INIT;
                 end
                 STATE_START: begin
-                    a <= 32'h67452301;
-                    h0 <= 32'h67452301;
-                    b <= 32'hEFCDAB89;
-                    h1 <= 32'hEFCDAB89;
-                    c <= 32'h98BADCFE;
-                    h2 <= 32'h98BADCFE;
-                    d <= 32'h10325476;
-                    h3 <=  32'h10325476;
-                    e <= 32'hC3D2E1F0;
-                    h4 <= 32'hC3D2E1F0;
+                    chain <= 1'b0;
+                    {a, b, c, d, e} <= start_h;
+                    {h0, h1, h2, h3, h4} <= start_h;
+                    {ekw_c, ekw_s} <= csa(start_h[31:0], 32'h5A827999, message[0]);
+                    k_next <= 32'h5A827999;
 
                     state <= LOOP_ONE;
                     k <= 32'h5A827999;
                     index <= 0;
-                    inc_counter <= 1'b1;
-                    compute <= 1'b1;
-                    copy_values <= 1'b0;
                 end
 
                 LOOP_ONE: begin
-                    if ((index == 19) && (inc_counter)) begin
+                    if (index == 19) begin
                         state <= LOOP_TWO;
                         k <= 32'h6ED9EBA1;
                     end
-
-                    if (compute) begin
-                    /* f = (b and c) or ((not b) and d) */
-                    /* temp = (a leftrotate 5) + f + e + k + w[i] */
-                        temp <= (a_left_5) + ((b & c) | (~b) & d) + e + k + w;
-                        copy_values <= 1'b1;
-                        compute <= 1'b0;
-                    end
                 end
                 LOOP_TWO: begin
-                    if ((index == 39) && (inc_counter)) begin
+                    if (index == 39) begin
                         state <= LOOP_THREE;
                         k <= 32'h8F1BBCDC;
                     end
-                    if (compute) begin
-                    /* f = b xor c xor d */
-                    /* temp = (a leftrotate 5) + f + e + k + w[i] */
-                        temp <= (a_left_5) + (b ^ c ^ d) + e + k + w;
-                        copy_values <= 1'b1;
-                        compute <= 1'b0;
-                    end
                 end
                 LOOP_THREE: begin
-                    if ((index == 59) && (inc_counter)) begin
+                    if (index == 59) begin
                         state <= LOOP_FOUR;
                         k <= 32'hCA62C1D6;
                     end
-                    if (compute) begin
-                    /* f = (b and c) or (b and d) or (c and d) */
-                    /* temp = (a leftrotate 5) + f + e + k + w[i] */
-                        temp <= (a_left_5) + ((b & c) | (b & d) | (c & d)) + e + k + w;
-                        copy_values <= 1'b1;
-                        compute <= 1'b0;
-                    end
                 end
                 LOOP_FOUR: begin
-                    if ((index == 79)  && (inc_counter)) begin
+                    if (index == 79) begin
                         state <= STATE_DONE;
                         k <= DEFAULT;
                     end
-                    if (compute) begin
-                    /* f = b xor c xor d
-                    /* temp = (a leftrotate 5) + f + e + k + w[i] */
-                        temp <= (a_left_5) + (b ^ c ^ d) + e + k + w;
-                        copy_values <= 1'b1;
-                        compute <= 1'b0;
-                    end
                 end
                 STATE_DONE: begin
                     index <= 0;
-                    inc_counter <= 1'b0;
-                    if (compute) begin
-                        h0 <= h0 + a;
-                        h1 <= h1 + b;
-                        h2 <= h2 + c;
-                        h3 <= h3 + d;
-                        h4 <= h4 + e;
-                        state <= STATE_FINAL;
-                        copy_values <= 1'b0;
-                        compute <= 1'b0;
-                    end
+                    /* The ipad one, the opad one goes straight after it. */
+                    if (hmac_key && next_full)
+                        hmac_in[hmac_slot] <= {h0 + a, h1 + b, h2 + c, h3 + d, h4 + e};
+                    else if (hmac_key)
+                        hmac_out[hmac_slot] <= {h0 + a, h1 + b, h2 + c, h3 + d, h4 + e};
+                    h0 <= h0 + a;
+                    h1 <= h1 + b;
+                    h2 <= h2 + c;
+                    h3 <= h3 + d;
+                    h4 <= h4 + e;
+                    state <= STATE_FINAL;
                 end
                 STATE_FINAL: begin
                     if (!sha1_on)
@@ -412,27 +889,208 @@ module sha1_wb #(
                 STATE_PANIC: begin
                 end
             endcase
+            /* Go straight to the next block if it is already in. */
+            if (next_take) begin
+                for (i = 0; i < 16; i = i + 1)
+                    message[i] <= message_next[i];
+                chain <= 1'b1;
+                state <= STATE_START;
+            end
+        end
+        /* Outside of sha1_reset, RESET may have been the write before. */
+        if (h_load) begin
+            case (wbs_adr_i)
+                CTRL_DIGEST_H0: h0 <= wbs_dat_i;
+                CTRL_DIGEST_H1: h1 <= wbs_dat_i;
+                CTRL_DIGEST_H2: h2 <= wbs_dat_i;
+                CTRL_DIGEST_H3: h3 <= wbs_dat_i;
+                default: h4 <= wbs_dat_i;
+            endcase
+        end
+    end
+
+    /* What a..e and h0..h4 start the block from. */
+    always @(*) begin
+        if (hmac_outer)
+            start_h = hmac_out[hmac_slot];
+        else if (hmac_on && !sha1_continue && !chain)
+            start_h = hmac_in[hmac_slot];
+        else if ((sha1_continue || chain) && !hmac_key)
+            /* Next block of the same message, chain from h0..h4. */
+            start_h = {h0, h1, h2, h3, h4};
+        else
+            start_h = {32'h67452301, 32'hEFCDAB89, 32'h98BADCFE, 32'h10325476, 32'hC3D2E1F0};
+    end
+
+    /*
+     * Carry-save add: x + y + z is {carry, sum}'s carry + sum, bit by bit
+     * with no carry going along. Only temp_next has a carry-propagate add.
+     */
+    function [2*DATA_WIDTH-1:0] csa;
+        input [DATA_WIDTH-1:0] x;
+        input [DATA_WIDTH-1:0] y;
+        input [DATA_WIDTH-1:0] z;
+        reg [DATA_WIDTH-1:0] carry;
+        begin
+            carry = (x & y) | (x & z) | (y & z);
+            csa = {carry[DATA_WIDTH-2:0], 1'b0, x ^ y ^ z};
         end
+    endfunction
+
+    /* The round function for the loop we are in. */
+    always @(*) begin
+        case (state)
+            /* f = (b and c) or ((not b) and d) */
+            LOOP_ONE: f = (b & c) | ((~b) & d);
+            /* f = (b and c) or (b and d) or (c and d) */
+            LOOP_THREE: f = (b & c) | (b & d) | (c & d);
+            /* f = b xor c xor d (LOOP_TWO and LOOP_FOUR) */
+            default: f = b ^ c ^ d;
+        endcase
     end
 
     assign a_left_5 = {a[26:0], a[31:27]};
-    assign b_old_left_30 = {b_old[1:0], b_old[31:2]};
+    assign b_left_30 = {b[1:0], b[31:2]};
+
+    assign round = (state >= LOOP_ONE) && (state <= LOOP_FOUR);
+
+    assign next_full = (sha1_next_idx == 16);
+    assign next_take = sha1_on && next_full && ((state == STATE_DONE) || (state == STATE_FINAL));
+    assign msg_stall = wb_active && wbs_we_i && (wbs_adr_i == CTRL_MSG_IN) && sha1_on && !sha1_final && next_full;
+
+    assign wb_req = wb_active && !msg_stall && (PIPELINED || !transmit);
+    assign wb_in_range = ((wbs_adr_i >= BASE_ADDRESS) && (wbs_adr_i <= CTRL_IRQ_STATUS)) ||
+                         ((wbs_adr_i >= CTRL_MSG_HASHED) && (wbs_adr_i <= CTRL_LAST));
+
+    /* Nothing in flight, queued up or being padded: h0..h4 can be written. */
+    assign idle = !((sha1_on || sha1_pad) && !sha1_done) && (sha1_next_idx == 0) &&
+                  ((state == STATE_INIT) || (state == STATE_FINAL));
+    assign h_load = !reset && wb_req && wbs_we_i && &wbs_sel_i && idle &&
+                    (wbs_adr_i >= CTRL_DIGEST_H0) && (wbs_adr_i <= CTRL_DIGEST_H4);
+
+    /* What CTRL_PERF_EARLY counts, a read of the digest before DONE. */
+    assign early_read = ((wbs_adr_i == CTRL_SHA1_DIGEST) && !sha1_done) ||
+                        ((wbs_adr_i >= CTRL_DIGEST_H0) && (wbs_adr_i <= CTRL_DIGEST_H4) &&
+                         !(sha1_done || sha1_loaded));
+
+    assign hmac_on = (hmac_mode == HMAC_MSG);
+    assign hmac_slot_ok = ({29'b0, wbs_dat_i[10:8]} < HMAC_SLOTS);
+
+    always @(*) begin
+        hmac_slot_rd = 0;
+        hmac_slot_rd[SLOT_WIDTH-1:0] = hmac_slot;
+        hmac_valid_rd = 0;
+        hmac_valid_rd[HMAC_SLOTS-1:0] = hmac_valid;
+    end
+    assign hmac_key = (hmac_mode == HMAC_KEY);
+
+    /*
+     * temp = (a leftrotate 5) + f + e + k + w[i], with e + k + w[i] already
+     * in ekw_s and ekw_c. The next round's e is our d, so its ekw is done
+     * alongside. Four down to two and then the one add, with f (the last
+     * to be ready) going in the second carry-save add.
+     */
+    assign csa_1 = csa(a_left_5, ekw_s, ekw_c);
+    assign csa_2 = csa(csa_1[DATA_WIDTH-1:0], csa_1[2*DATA_WIDTH-1:DATA_WIDTH], f);
+    assign temp_next = csa_2[DATA_WIDTH-1:0] + csa_2[2*DATA_WIDTH-1:DATA_WIDTH];
+
+    /* w[i+1], from 16 on it went in the round before. */
+    assign w_next = message[index[3:0] + 4'd1];
 
     /* Provides the w[index] funcionality */
-    assign w =  message[index];
+    assign w =  message[index[3:0]];
+
+    /* Where w[index+2-3], -8, -14 and -16 are in message[]. */
+    assign w_3 = index[3:0] - 4'd1;
+    assign w_8 = index[3:0] - 4'd6;
+    assign w_14 = index[3:0] - 4'd12;
+    assign w_16 = index[3:0] + 4'd2;
 
     assign digest = {h0, h1, h2, h3, h4};
 
+    /*
+     * Padding of the last block: the CTRL_MSG_LEN % 64 bytes the host wrote,
+     * 0x80, zeros and the length in bits in the last two words - if they fit
+     * after the 0x80, otherwise they go in an extra block.
+     */
+    assign pad_rem = sha1_msg_len[5:0];
+    assign pad_words = pad_rem[5:2] + |pad_rem[1:0];
+    assign pad_fits = (pad_rem < 56);
+    assign pad_mask = 32'hffffffff >> {pad_rem[1:0], 3'b0};
+    /* All of them are in, as words or (the last one short) as bytes. */
+    assign pad_ready = ((sha1_msg_idx == {2'b0, pad_words}) && (msg_part_n == 0)) ||
+                       ((sha1_msg_idx == {3'b0, pad_rem[5:2]}) && (msg_part_n != 0) &&
+                        (msg_part_n == pad_rem[1:0]));
+
+    /* With MSG_SWAP byte 0 of the message is in [7:0]. */
+    assign msg_in = msg_swap ? {wbs_dat_i[7:0], wbs_dat_i[15:8], wbs_dat_i[23:16], wbs_dat_i[31:24]} : wbs_dat_i;
+    assign msg_sel = msg_swap ? {wbs_sel_i[0], wbs_sel_i[1], wbs_sel_i[2], wbs_sel_i[3]} : wbs_sel_i;
+
+    /* The bytes left over and after them the lanes written, [31:24] first. */
+    always @(*) begin
+        msg_acc_n = {1'b0, msg_part_n};
+        /* msg_part is not cleared when they are dropped. */
+        msg_acc = {msg_part, 32'b0} & ~({56{1'b1}} >> {msg_acc_n, 3'b0});
+        for (j = 3; j >= 0; j = j - 1) begin
+            if (msg_sel[j]) begin
+                msg_acc = msg_acc | ({msg_in[8 * j +: 8], 48'b0} >> {msg_acc_n, 3'b0});
+                msg_acc_n = msg_acc_n + 1'b1;
+            end
+        end
+    end
+    assign msg_full = msg_acc_n[2];
+    assign msg_word = msg_acc[55:24];
+
+    /* The HMAC inner hash has the 64 bytes of key XOR ipad before the message. */
+    assign pad_len = hmac_on ? sha1_msg_len + 32'd64 : sha1_msg_len;
+
+    /* The outer block: the inner digest, 0x80, zeros and OUTER_BITS. */
+    always @(*) begin
+        case (sha1_msg_idx[3:0])
+            4'd0: outer_word = h0;
+            4'd1: outer_word = h1;
+            4'd2: outer_word = h2;
+            4'd3: outer_word = h3;
+            4'd4: outer_word = h4;
+            4'd5: outer_word = 32'h80000000;
+            4'd15: outer_word = OUTER_BITS;
+            default: outer_word = 0;
+        endcase
+    end
+
+    always @(*) begin
+        if (hmac_outer)
+            pad_word = outer_word;
+        else if (sha1_final && (sha1_msg_idx == {3'b0, pad_rem[5:2]}))
+            pad_word = (message[sha1_msg_idx[3:0]] & ~pad_mask) | (32'h80000000 >> {pad_rem[1:0], 3'b0});
+        else if ((!sha1_final || pad_fits) && (sha1_msg_idx == 14))
+            pad_word = {29'b0, pad_len[31:29]};
+        else if ((!sha1_final || pad_fits) && (sha1_msg_idx == 15))
+            pad_word = {pad_len[28:0], 3'b0};
+        else
+            pad_word = 0;
+    end
+
     assign finish = (state == STATE_FINAL) ? 1'b1 : 1'b0;
 
     assign wbs_ack_o = reset ? 1'b0 : transmit;
 
+    assign wbs_stall_o = (reset || !PIPELINED) ? 1'b0 : msg_stall;
+
     assign wbs_dat_o = reset ? 32'b0 : buffer_o;
 
     assign done = reset ? 1'b0 : sha1_done;
 
-    assign irq = reset ? 1'b0: sha1_done;
+    /* Has a message and is not done with it. */
+    assign busy = reset ? 1'b0 : (sha1_on || sha1_pad) && !sha1_done;
+
+    assign irq_cause = {(sha1_panic || panic) && !sha1_panic_q,
+                        sha1_done && !sha1_done_q,
+                        (state == STATE_DONE)};
+
+    assign irq = reset ? 1'b0: |(sha1_irq_status & sha1_irq_en);
 
-    assign chicken_bits_out = {buffer_o[14:0], sha1_panic};
+    assign chicken_bits_out = PERF_LA ? {perf_blocks[8:0], perf_rejects[3:0], perf_panics[1:0], sha1_panic} :
+                                        {buffer_o[14:0], sha1_panic};
 endmodule
 `default_nettype wire
@@ -100,6 +100,7 @@ module wrapper_sha1  (
         .chicken_bits_in(la_data_in[12:5]),
         .chicken_bits_out(buf_la_data_out[20:5]),
         .done(buf_io_out[8]),
+        .busy(),
         .irq(buf_irq[0]),
         .wb_clk_i(wb_clk_i),
         .wb_rst_i(wb_rst_i),
@@ -110,6 +111,8 @@ module wrapper_sha1  (
         .wbs_dat_i(wbs_dat_i),
         .wbs_adr_i(wbs_adr_i),
         .wbs_ack_o(buf_wbs_ack_o),
+        /* Caravel is classic Wishbone, there is no stall. */
+        .wbs_stall_o(),
         .wbs_dat_o(buf_wbs_dat_o));
 
 endmodule
@@ -0,0 +1,87 @@
+// SPDX-FileCopyrightText: 2021 Konrad Rzeszutek Wilk
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//      http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+// SPDX-License-Identifier: Apache-2.0
+
+/*
+ * Waves for the test/dump_*.v modules, only when asked for:
+ *
+ *   +waves                `DUMP_NAME.vcd (or .fst with +fst, vvp needs -fst too)
+ *   +dumpfile=<file>      somewhere else
+ *   +dumpdepth=<n>        levels below the scope, 0 (default) is all of them
+ *   +dumpscope=inner      just `DUMP_INNER, when there is one
+ *   +dumpstart=<n>        from clock n ..
+ *   +dumpstop=<n>         .. to clock n
+ *   +dumpon=<status>      from when the test puts that in status (`DUMP_STATUS)
+ *
+ * The module says what it has with `DUMP_NAME, `DUMP_SCOPE, `DUMP_CLK and
+ * maybe `DUMP_INNER and `DUMP_STATUS. Verilator has its own --trace.
+ */
+`ifndef VERILATOR
+    reg [8*128-1:0] dump_file;
+    reg [8*16-1:0] dump_scope;
+    reg [8*64-1:0] dump_on;
+    integer dump_depth;
+    integer dump_start;
+    integer dump_stop;
+    integer dump_cycle = 0;
+
+    always @(posedge `DUMP_CLK)
+        dump_cycle <= dump_cycle + 1;
+
+    initial begin
+        if ($test$plusargs("waves") || $value$plusargs("dumpfile=%s", dump_file)) begin
+            if (!$value$plusargs("dumpfile=%s", dump_file))
+                dump_file = $test$plusargs("fst") ? {`DUMP_NAME, ".fst"} : {`DUMP_NAME, ".vcd"};
+            if (!$value$plusargs("dumpdepth=%d", dump_depth))
+                dump_depth = 0;
+            if (!$value$plusargs("dumpscope=%s", dump_scope))
+                dump_scope = "";
+
+            $dumpfile(dump_file);
+`ifdef DUMP_INNER
+            if (dump_scope == "inner")
+                $dumpvars(dump_depth, `DUMP_INNER);
+            else
+`endif
+                $dumpvars(dump_depth, `DUMP_SCOPE);
+
+            if ($value$plusargs("dumpstart=%d", dump_start)) begin
+                $dumpoff;
+                wait (dump_cycle >= dump_start);
+                $dumpon;
+            end
+`ifdef DUMP_STATUS
+            if ($value$plusargs("dumpon=%s", dump_on)) begin
+                $dumpoff;
+                wait (`DUMP_STATUS == dump_on);
+                $dumpon;
+            end
+`endif
+            if ($value$plusargs("dumpstop=%d", dump_stop)) begin
+                wait (dump_cycle >= dump_stop);
+                $dumpoff;
+                $dumpflush;
+            end
+        end
+    end
+`endif
+`undef DUMP_NAME
+`undef DUMP_SCOPE
+`undef DUMP_CLK
+`ifdef DUMP_INNER
+`undef DUMP_INNER
+`endif
+`ifdef DUMP_STATUS
+`undef DUMP_STATUS
+`endif
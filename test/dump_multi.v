@@ -0,0 +1,21 @@
+// SPDX-FileCopyrightText: 2021 Konrad Rzeszutek Wilk
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//      http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+// SPDX-License-Identifier: Apache-2.0
+module dump();
+`define DUMP_NAME "multi"
+`define DUMP_SCOPE sha1_multi
+`define DUMP_CLK sha1_multi.wb_clk_i
+`define DUMP_INNER sha1_multi.core[0].sha1_wishbone
+`include "dump.vh"
+endmodule
@@ -13,9 +13,8 @@
 // limitations under the License.
 // SPDX-License-Identifier: Apache-2.0
 module dump();
-    initial begin
-        $dumpfile ("wb_logic.vcd");
-        $dumpvars (0, sha1_wb);
-        #1;
-    end
+`define DUMP_NAME "wb_logic"
+`define DUMP_SCOPE sha1_wb
+`define DUMP_CLK sha1_wb.wb_clk_i
+`include "dump.vh"
 endmodule
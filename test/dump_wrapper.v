@@ -13,11 +13,6 @@
 // limitations under the License.
 // SPDX-License-Identifier: Apache-2.0
 module dump;
-    initial begin
-        $dumpfile ("wrapper.vcd");
-        $dumpvars (0, dump);
-        #1;
-    end
     reg [8191:0] status = "START";
 
     reg power1, power2, power3, power4;
@@ -87,4 +82,11 @@ module dump;
     // active input, only connect tristated outputs if this is high
         .active(active)
     );
+
+`define DUMP_NAME "wrapper"
+`define DUMP_SCOPE dump
+`define DUMP_CLK wb_clk_i
+`define DUMP_INNER wrapper_sha1.sha1_wishbone
+`define DUMP_STATUS status
+`include "dump.vh"
 endmodule
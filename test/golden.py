@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2021 Konrad Rzeszutek Wilk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# SPDX-License-Identifier: Apache-2.0
+#
+# SHA-1 over a lot of messages at once with NumPy, every round on uint32
+# arrays of all the messages that still have a block to go. What comes out
+# (the messages, digests and H0..H4 after every block) is kept in
+# GOLDEN_CACHE, one directory per seed/count/max_len, and loaded back
+# memory mapped:
+#
+#   vecs = vectors(seed, count, max_len)
+#   vecs[n].msg, vecs[n].digest, vecs[n].midstates
+#
+#   python3 -m test.golden --seed 1 -n 100000
+import argparse
+import hashlib
+import os
+import random
+import sys
+import tempfile
+from collections import namedtuple
+
+import numpy as np
+
+ROOT            = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GOLDEN_CACHE    = os.environ.get("GOLDEN_CACHE", os.path.join(ROOT, "golden_cache"))
+
+INITIAL_H       = (0x67452301, 0xEFCDAB89, 0x98BADCFE, 0x10325476, 0xC3D2E1F0)
+K               = (0x5A827999, 0x6ED9EBA1, 0x8F1BBCDC, 0xCA62C1D6)
+
+# rfc3174/sha1test.c, TEST1 to TEST4 with their repeat counts. Only the ones
+# up to RFC3174_MAX_LEN are short enough to simulate and go in the cache,
+# TEST3 (a million bytes) is only checked against hashlib.
+RFC3174_MAX_LEN = 1024
+RFC3174_VECTORS = [
+    (b"abc", "a9993e364706816aba3e25717850c26c9cd0d89d"),
+    (b"abcdbcdecdefdefgefghfghighijhijkijkljklmklmnlmnomnopnopq", "84983e441c3bd26ebaae4aa1f95129e5e54670f1"),
+    (b"a" * 1000000, "34aa973cd4c4daa4f61eeb2bdbad27316534016f"),
+    (b"01234567" * 8 * 10, "dea356a2cddd90c7a7ecedc5ebb563934f460452"),
+]
+
+# Padded bytes per batch, the messages are split up to stay under it.
+BATCH_BYTES     = 64 << 20
+
+# In the cache directory names, so a change to the model (or to which
+# messages regress_msgs gives) does not load answers made by the old one.
+with open(os.path.abspath(__file__), "rb") as _f:
+    MODEL_HASH  = hashlib.sha1(_f.read()).hexdigest()[:12]
+
+# The message, the digest and H0..H4 after each of its blocks.
+Vector = namedtuple("Vector", ["msg", "digest", "midstates"])
+
+def regress_msgs(seed, count, max_len):
+    # The same seed gives the same messages, so a failure can be rerun alone.
+    rnd = random.Random(seed)
+    for n in range(count):
+        # Most of them short, with the padding corners more often than not.
+        size = rnd.choice([rnd.randrange(max_len + 1), rnd.randrange(120), 55 + rnd.randrange(10)])
+        yield n, bytes(rnd.getrandbits(8) for i in range(size))
+
+def rotl(x, n):
+    return (x << np.uint32(n)) | (x >> np.uint32(32 - n))
+
+def compress(h, w):
+    # h is (M, 5) and w (M, 16), one block for each of the M messages.
+    w = np.concatenate([w, np.zeros((len(w), 64), dtype=np.uint32)], axis=1)
+    for t in range(16, 80):
+        w[:, t] = rotl(w[:, t - 3] ^ w[:, t - 8] ^ w[:, t - 14] ^ w[:, t - 16], 1)
+
+    a, b, c, d, e = (h[:, i].copy() for i in range(5))
+    for t in range(80):
+        if t < 20:
+            f = (b & c) | (~b & d)
+        elif t < 40 or t >= 60:
+            f = b ^ c ^ d
+        else:
+            f = (b & c) | (b & d) | (c & d)
+        temp = rotl(a, 5) + f + e + w[:, t] + np.uint32(K[t // 20])
+        e, d, c, b, a = d, c, rotl(b, 30), a, temp
+    return h + np.stack([a, b, c, d, e], axis=1)
+
+def pad(msgs, blocks):
+    # What the engine hashes: 0x80, zeros and the length in bits.
+    data = np.zeros((len(msgs), blocks.max() * 64), dtype=np.uint8)
+    for n, msg in enumerate(msgs):
+        data[n, :len(msg)] = np.frombuffer(msg, dtype=np.uint8)
+        data[n, len(msg)] = 0x80
+        end = blocks[n] * 64
+        data[n, end - 8:end] = np.frombuffer((len(msg) * 8).to_bytes(8, byteorder='big'), dtype=np.uint8)
+    return data.view(">u4").astype(np.uint32).reshape(len(msgs), blocks.max(), 16)
+
+def sha1_batch(msgs):
+    # Gives back the digests as (N, 5) words and the midstates as (N, blocks, 5),
+    # with zeros after the last block of the shorter ones.
+    blocks = np.array([(len(msg) + 8) // 64 + 1 for msg in msgs], dtype=np.int64)
+    h = np.tile(np.array(INITIAL_H, dtype=np.uint32), (len(msgs), 1))
+    mids = np.zeros((len(msgs), blocks.max() if len(msgs) else 0, 5), dtype=np.uint32)
+
+    w = pad(msgs, blocks) if len(msgs) else None
+    for j in range(mids.shape[1]):
+        live = blocks > j
+        h[live] = compress(h[live], w[live, j])
+        mids[live, j] = h[live]
+    return h, mids
+
+def build(msgs):
+    # All of them, in batches of about the same length.
+    blocks = np.array([(len(msg) + 8) // 64 + 1 for msg in msgs], dtype=np.int64)
+    digests = np.zeros((len(msgs), 5), dtype=np.uint32)
+    offsets = np.concatenate([[0], np.cumsum(blocks)])
+    midstates = np.zeros((offsets[-1], 5), dtype=np.uint32)
+
+    order = np.argsort(blocks, kind="stable")
+    start = 0
+    while start < len(order):
+        end = start + 1
+        while end < len(order) and (end - start + 1) * blocks[order[end]] * 64 <= BATCH_BYTES:
+            end += 1
+        batch = order[start:end]
+        h, mids = sha1_batch([msgs[n] for n in batch])
+        digests[batch] = h
+        for i, n in enumerate(batch):
+            midstates[offsets[n]:offsets[n + 1]] = mids[i, :blocks[n]]
+        start = end
+    return digests, midstates, offsets
+
+class Vectors:
+
+    # The arrays in a cache directory, memory mapped.
+    def __init__(self, path):
+        self.path = path
+        self.data = np.load(os.path.join(path, "msgs.npy"), mmap_mode="r")
+        self.msg_offsets = np.load(os.path.join(path, "msg_offsets.npy"), mmap_mode="r")
+        self.digests = np.load(os.path.join(path, "digests.npy"), mmap_mode="r")
+        self.midstates = np.load(os.path.join(path, "midstates.npy"), mmap_mode="r")
+        self.block_offsets = np.load(os.path.join(path, "block_offsets.npy"), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.digests)
+
+    def __getitem__(self, n):
+        if n < 0 or n >= len(self):
+            raise IndexError(n)
+        msg = bytes(self.data[self.msg_offsets[n]:self.msg_offsets[n + 1]])
+        digest = self.digests[n].astype(">u4").tobytes()
+        mids = [tuple(int(h) for h in row) for row in self.midstates[self.block_offsets[n]:self.block_offsets[n + 1]]]
+        return Vector(msg, digest, mids)
+
+def save(path, msgs):
+    digests, midstates, block_offsets = build(msgs)
+    # Nothing goes in the cache that hashlib does not agree with.
+    for n, msg in enumerate(msgs):
+        digest = digests[n].astype(">u4").tobytes()
+        assert digest == hashlib.sha1(msg).digest(), "golden model: message %d (%d bytes) is %s" % (n, len(msg), digest.hex())
+    msg_offsets = np.concatenate([[0], np.cumsum([len(msg) for msg in msgs], dtype=np.int64)])
+
+    # Into a new directory and renamed, as the regress shards can race for it.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=os.path.dirname(path))
+    np.save(os.path.join(tmp, "msgs.npy"), np.frombuffer(b"".join(msgs), dtype=np.uint8))
+    np.save(os.path.join(tmp, "msg_offsets.npy"), msg_offsets)
+    np.save(os.path.join(tmp, "digests.npy"), digests)
+    np.save(os.path.join(tmp, "midstates.npy"), midstates)
+    np.save(os.path.join(tmp, "block_offsets.npy"), block_offsets)
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        # Someone else got there first, theirs is as good.
+        for f in os.listdir(tmp):
+            os.unlink(os.path.join(tmp, f))
+        os.rmdir(tmp)
+
+def cached(name, make):
+    path = os.path.join(GOLDEN_CACHE, "%s_%s" % (name, MODEL_HASH))
+    if not os.path.exists(os.path.join(path, "block_offsets.npy")):
+        save(path, make())
+    return Vectors(path)
+
+def vectors(seed, count, max_len):
+    # What regress_msgs(seed, count, max_len) gives, with the answers.
+    return cached("seed%d_count%d_max%d" % (seed, count, max_len),
+                  lambda: [msg for n, msg in regress_msgs(seed, count, max_len)])
+
+def rfc3174_vectors():
+    # The fixed ones short enough to simulate, as (TEST number, vector). All
+    # of them are checked against what sha1test.c says they should be.
+    for n, (msg, digest) in enumerate(RFC3174_VECTORS):
+        assert hashlib.sha1(msg).hexdigest() == digest, "rfc3174 TEST%d" % (n + 1)
+    short = [(n + 1, msg) for n, (msg, digest) in enumerate(RFC3174_VECTORS) if len(msg) <= RFC3174_MAX_LEN]
+    vecs = cached("rfc3174", lambda: [msg for test, msg in short])
+    for i, (test, msg) in enumerate(short):
+        assert vecs[i].digest.hex() == RFC3174_VECTORS[test - 1][1], "rfc3174 TEST%d: %s" % (test, vecs[i].digest.hex())
+    return [(test, vecs[i]) for i, (test, msg) in enumerate(short)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill the golden SHA-1 cache")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("-n", "--count", type=int, default=1000)
+    parser.add_argument("--max-len", type=int, default=300)
+    args = parser.parse_args()
+
+    rfc3174_vectors()
+    vecs = vectors(args.seed, args.count, args.max_len)
+    print("%s: %d messages, %d blocks" % (vecs.path, len(vecs), len(vecs.midstates)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2021 Konrad Rzeszutek Wilk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Random messages through sha1_wb against test/golden.py, split over a pool of
+# simulators. Every shard has its own build directory and seed (seed + n),
+# so `make regress JOBS=1 REGRESS_SEED=<seed>` gets a failing shard back. Only
+# shard 0 does the rfc3174 ones.
+#
+#   python3 -m test.regress -j 8 -n 4000 --sim verilator
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+from test import golden
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCES = [os.path.join(ROOT, "src/sha1_wb.v")]
+
+def build_shard(sim, build, log):
+    # Returns the command line that runs the simulation.
+    libs = os.path.join(subprocess.check_output(["cocotb-config", "--prefix"], text=True).strip(), "cocotb", "libs")
+    if sim == "verilator":
+        share = subprocess.check_output(["cocotb-config", "--share"], text=True).strip()
+        subprocess.check_call(["verilator", "-cc", "--exe", "-Mdir", build, "-DCOCOTB_SIM=1", "-DMPRJ_IO_PADS=38",
+                               "--top-module", "sha1_wb", "--vpi", "--public-flat-rw", "--no-timing",
+                               "-Wno-fatal", "-Wno-lint", "-Wno-style", "--prefix", "Vtop", "-o", "Vtop",
+                               "-LDFLAGS", "-Wl,-rpath,%s -L%s -lcocotbvpi_verilator" % (libs, libs)] +
+                              SOURCES + [os.path.join(share, "lib", "verilator", "verilator.cpp")],
+                              stdout=log, stderr=log)
+        subprocess.check_call(["make", "-C", build, "-f", "Vtop.mk"], stdout=log, stderr=log)
+        return [os.path.join(build, "Vtop")]
+
+    subprocess.check_call(["iverilog", "-o", os.path.join(build, "sim.vvp"), "-DMPRJ_IO_PADS=38",
+                           "-s", "sha1_wb", "-g2012"] + SOURCES, stdout=log, stderr=log)
+    return ["vvp", "-M", libs, "-m", "libcocotbvpi_icarus", os.path.join(build, "sim.vvp")]
+
+def run_shard(args):
+    n, seed, count, max_len, build, sim, midstates = args
+    build = os.path.abspath(os.path.join(build, "shard%d" % n))
+    os.makedirs(build, exist_ok=True)
+    out = os.path.join(build, "regress.json")
+    log = open(os.path.join(build, "sim.log"), "w")
+
+    try:
+        cmd = build_shard(sim, build, log)
+    except (OSError, subprocess.CalledProcessError) as e:
+        return {"seed": seed, "hashes": 0, "bytes": 0, "cycles": 0, "seconds": 0,
+                "failures": [{"seed": seed, "index": None, "build": str(e)}]}
+
+    env = dict(os.environ, MODULE="test.test_regress", TOPLEVEL="sha1_wb", TOPLEVEL_LANG="verilog",
+               COCOTB_RESULTS_FILE=os.path.join(build, "results.xml"),
+               REGRESS_SEED=str(seed), REGRESS_COUNT=str(count),
+               REGRESS_MAX_LEN=str(max_len), REGRESS_OUT=out,
+               REGRESS_MIDSTATES="1" if midstates else "0", GOLDEN_CACHE=golden.GOLDEN_CACHE,
+               REGRESS_RFC3174="1" if n == 0 else "0",
+               PYTHONPATH=os.pathsep.join([ROOT] + os.environ.get("PYTHONPATH", "").split(os.pathsep)))
+    if "LIBPYTHON_LOC" not in env:
+        # Newer cocotb wants to be told which Python to embed.
+        try:
+            env["LIBPYTHON_LOC"] = subprocess.check_output(["cocotb-config", "--libpython"], text=True).strip()
+        except (OSError, subprocess.CalledProcessError):
+            pass
+    if os.path.exists(out):
+        os.unlink(out)
+    subprocess.call(cmd, env=env, cwd=ROOT, stdout=log, stderr=log)
+
+    if not os.path.exists(out):
+        # Did not get to the end, the log says why.
+        return {"seed": seed, "hashes": 0, "bytes": 0, "cycles": 0, "seconds": 0,
+                "failures": [{"seed": seed, "index": None, "log": log.name}]}
+    with open(out) as f:
+        return json.load(f)
+
+def main():
+    parser = argparse.ArgumentParser(description="Randomized sha1_wb regression against the golden model")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count())
+    parser.add_argument("-n", "--count", type=int, default=1000, help="messages in all")
+    parser.add_argument("--seed", type=int, default=1, help="shard n uses seed + n")
+    parser.add_argument("--max-len", type=int, default=300)
+    parser.add_argument("--sim", default="icarus", choices=["icarus", "verilator"])
+    parser.add_argument("--midstates", action="store_true", help="check H0..H4 after every block too")
+    parser.add_argument("--build", default="sim_build/regress")
+    parser.add_argument("-o", "--output", default="regress.json")
+    args = parser.parse_args()
+
+    per = -(-args.count // args.jobs)
+    shards = [(n, args.seed + n, min(per, args.count - n * per), args.max_len, args.build, args.sim, args.midstates)
+              for n in range(args.jobs) if n * per < args.count]
+
+    # The expected values once, here, and not in every simulator.
+    start = time.time()
+    golden.rfc3174_vectors()
+    for shard in shards:
+        golden.vectors(shard[1], shard[2], shard[3])
+    print("golden vectors in %.1fs" % (time.time() - start))
+
+    start = time.time()
+    with multiprocessing.Pool(len(shards)) as pool:
+        results = pool.map(run_shard, shards)
+    wall = time.time() - start
+
+    merged = {"sim": args.sim,
+              "shards": len(results),
+              "hashes": sum(r["hashes"] for r in results),
+              "bytes": sum(r["bytes"] for r in results),
+              "cycles": sum(r["cycles"] for r in results),
+              "wall": wall,
+              "failures": [f for r in results for f in r["failures"]]}
+    # With the builds, and only what the shards spent simulating.
+    merged["hashes_per_sec"] = merged["hashes"] / wall
+    merged["sim_hashes_per_sec"] = sum(r["hashes"] / r["seconds"] for r in results if r["seconds"])
+    with open(args.output, "w") as f:
+        json.dump(merged, f, indent=2)
+
+    print("%s: %d hashes (%d bytes) on %d shards in %.1fs: %.1f hashes/s (%.1f simulating), %d cycles simulated" %
+          (args.sim, merged["hashes"], merged["bytes"], merged["shards"], wall, merged["hashes_per_sec"],
+           merged["sim_hashes_per_sec"], merged["cycles"]))
+    for f in merged["failures"]:
+        print("FAIL %s" % json.dumps(f))
+    return 1 if merged["failures"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
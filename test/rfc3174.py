@@ -0,0 +1,82 @@
+# SPDX-FileCopyrightText: 2021 Konrad Rzeszutek Wilk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# SPDX-License-Identifier: Apache-2.0
+#
+# rfc3174/sha1.c through ctypes, for what A..E and W are after each round
+# of a block, so a test can tell where the RTL went off the rails:
+#
+#   ref, h = block(words)
+#   ref[t].a, ref[t].w ..
+import ctypes
+import os
+import subprocess
+from collections import namedtuple
+
+RFC3174     = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rfc3174")
+LIB         = os.path.join(RFC3174, "libsha1.so")
+
+INITIAL_H   = (0x67452301, 0xEFCDAB89, 0x98BADCFE, 0x10325476, 0xC3D2E1F0)
+
+# W[t] going in and A..E coming out of round t.
+Round = namedtuple("Round", ["w", "a", "b", "c", "d", "e"])
+
+class SHA1Round(ctypes.Structure):
+    _fields_ = [(name, ctypes.c_uint32) for name in ("W", "A", "B", "C", "D", "E")]
+
+class SHA1Context(ctypes.Structure):
+    _fields_ = [("Intermediate_Hash", ctypes.c_uint32 * 5),
+                ("Length_Low", ctypes.c_uint32),
+                ("Length_High", ctypes.c_uint32),
+                ("Message_Block_Index", ctypes.c_int16),
+                ("Message_Block", ctypes.c_uint8 * 64),
+                ("Computed", ctypes.c_int),
+                ("Corrupted", ctypes.c_int)]
+
+_lib = None
+
+def lib():
+    global _lib
+    if _lib is None:
+        src = [os.path.join(RFC3174, f) for f in ("sha1.c", "sha1.h")]
+        if not os.path.exists(LIB) or os.path.getmtime(LIB) < max(os.path.getmtime(f) for f in src):
+            subprocess.check_call(["make", "-s", "-C", RFC3174, "libsha1.so"])
+        _lib = ctypes.CDLL(LIB)
+    return _lib
+
+def block(words, h=INITIAL_H):
+    # One block of 16 words (already padded, as the engine gets it) on top
+    # of h. Gives back the 80 rounds and the H0..H4 after it.
+    sha = lib()
+    ctx = SHA1Context()
+    sha.SHA1Reset(ctypes.byref(ctx))
+    ctx.Intermediate_Hash[:] = h
+
+    trace = (SHA1Round * 80)()
+    ptr = ctypes.c_void_p.in_dll(sha, "SHA1Trace")
+    ptr.value = ctypes.addressof(trace)
+    try:
+        data = b''.join(w.to_bytes(4, byteorder='big') for w in words)
+        sha.SHA1Input(ctypes.byref(ctx), data, len(data))
+    finally:
+        ptr.value = None
+
+    return [Round(r.W, r.A, r.B, r.C, r.D, r.E) for r in trace], list(ctx.Intermediate_Hash)
+
+def diverged(dut, t, ref, fields):
+    # The first of fields where the DUT is not what RFC 3174 has for round t.
+    for name in fields:
+        val = int(getattr(dut, name).value)
+        if val != getattr(ref[t], name):
+            return "round %d: %s is %08x, RFC 3174 has %08x" % (t, name, val, getattr(ref[t], name))
+    return None
@@ -0,0 +1,220 @@
+# SPDX-FileCopyrightText: 2021 Konrad Rzeszutek Wilk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# SPDX-License-Identifier: Apache-2.0
+from cocotb.triggers import RisingEdge
+from cocotbext.wishbone.driver import WBOp
+
+# Offsets from CTRL_GET_NR, as in test_wb_logic.
+CTRL_SHA1_OPS       = 0x8
+CTRL_MSG_IN         = 0xC
+CTRL_MSG_LEN        = 0x18
+CTRL_DIGEST_H0      = 0x1C
+CTRL_IRQ_EN         = 0x30
+CTRL_IRQ_STATUS     = 0x34
+CTRL_MSG_HASHED     = 0x4C
+CTRL_HMAC           = 0x50
+
+RESET               = 1 << 1
+CONTINUE            = 1 << 2
+FINAL               = 1 << 3
+DONE                = 1 << 3
+IRQ_BLOCK           = 1 << 0
+HMAC_OFF            = 0
+HMAC_MSG            = 1
+HMAC_KEY            = 2
+
+def high(sig):
+    # Bit 0, without tripping over 'x' or 'z'.
+    return str(sig.value)[-1:] == '1'
+
+class Sha1Driver:
+
+    # hashlib like SHA-1 on sha1_wb through a cocotbext.wishbone WishboneMaster:
+    #
+    #   sha1 = Sha1Driver(dut, wbs, done=dut.done)
+    #   await sha1.update(b'abc')
+    #   assert (await sha1.digest() == hashlib.sha1(b'abc').digest())
+    #
+    # update() takes bytes or an iterable (or async iterable) of bytes. All
+    # the full blocks there are go out in one send_cycle, CTRL_MSG_IN holds
+    # the bus while the second buffer is full. The length is only needed for
+    # FINAL so it is written by digest(), with the rest of the message.
+    #
+    # For DONE it waits on irq (IRQ_BLOCK) if given, else on done, else it
+    # polls CTRL_SHA1_OPS.
+    #
+    # Several of them can share one sha1_wb, save() before the next one goes
+    # and restore() before carrying on:
+    #
+    #   await a.update(x); await a.save()
+    #   await b.update(y); await b.save()
+    #   await a.restore(); await a.update(z)
+    #
+    # HMAC-SHA1 is set_key() once per key and use_key() to go back to it,
+    # update() and digest() then give the MAC:
+    #
+    #   await sha1.set_key(0, b'key')
+    #   await sha1.reset()
+    #   await sha1.update(b'abc')
+    #   assert (await sha1.digest() == hmac.new(b'key', b'abc', 'sha1').digest())
+    name = "sha1"
+    digest_size = 20
+    block_size = 64
+
+    def __init__(self, dut, wbs, base=0x30000024, done=None, irq=None, clk=None):
+        self.dut = dut
+        self.wbs = wbs
+        self.base = base
+        self.done = done
+        self.irq = irq
+        self.clk = clk if clk is not None else dut.wb_clk_i
+        self.started = False
+        self.result = None
+
+    async def send(self, ops):
+        res = await self.wbs.send_cycle([WBOp(self.base + adr, dat=dat) if dat is not None else WBOp(self.base + adr)
+                                         for adr, dat in ops])
+        return [r.datrd.integer if r.datrd is not None else None for r in res]
+
+    async def reset(self):
+        ops = [(CTRL_SHA1_OPS, RESET)]
+        if self.irq is not None:
+            ops += [(CTRL_IRQ_EN, IRQ_BLOCK), (CTRL_IRQ_STATUS, IRQ_BLOCK)]
+        await self.send(ops)
+        self.buf = b''
+        self.length = 0
+        self.blocks = 0
+        self.loaded = False
+        self.result = None
+        self.started = True
+
+    async def wait_done(self):
+        if self.irq is not None:
+            # The IRQ can be from a block that was done before the next one
+            # came in, so it is DONE only if CTRL_SHA1_OPS says so.
+            while True:
+                while not high(self.irq):
+                    await RisingEdge(self.clk)
+                res = await self.send([(CTRL_IRQ_STATUS, IRQ_BLOCK), (CTRL_SHA1_OPS, None)])
+                if res[1] & DONE:
+                    return
+        elif self.done is not None:
+            while not high(self.done):
+                await RisingEdge(self.clk)
+        else:
+            for i in range(200):
+                res = await self.send([(CTRL_SHA1_OPS, None)])
+                if res[0] & DONE:
+                    return
+            assert False, "Timed out waiting for DONE"
+
+    @staticmethod
+    def words(data):
+        data = data + b'\x00' * (-len(data) % 4)
+        return [int.from_bytes(data[j:j+4], byteorder='big') for j in range(0, len(data), 4)]
+
+    async def update(self, data):
+        assert (self.result is None), "update() after digest()"
+        if not self.started:
+            await self.reset()
+
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            await self.put(bytes(data))
+        elif hasattr(data, "__aiter__"):
+            async for chunk in data:
+                await self.put(bytes(chunk))
+        else:
+            for chunk in data:
+                await self.put(bytes(chunk))
+
+    async def put(self, data):
+        self.buf += data
+        self.length += len(data)
+        full = len(self.buf) - len(self.buf) % self.block_size
+        if full:
+            # Restored, the blocks go on top of the H0..H4 written.
+            ops = [(CTRL_SHA1_OPS, CONTINUE)] if self.loaded else []
+            await self.send(ops + [(CTRL_MSG_IN, w) for w in self.words(self.buf[:full])])
+            self.loaded = False
+            self.blocks += full // self.block_size
+            self.buf = self.buf[full:]
+
+    async def digest(self):
+        if self.result is not None:
+            return self.result
+        if not self.started:
+            await self.reset()
+
+        # CONTINUE has to wait for the full blocks to be done.
+        if self.blocks and not self.loaded:
+            await self.wait_done()
+        ops = [(CTRL_MSG_LEN, self.length), (CTRL_SHA1_OPS, (FINAL | CONTINUE) if self.blocks else FINAL)]
+        await self.send(ops + [(CTRL_MSG_IN, w) for w in self.words(self.buf)])
+
+        res = await self.midstate()
+        self.result = b''.join(val.to_bytes(4, byteorder='big') for val in res)
+        self.started = False
+        return self.result
+
+    async def midstate(self):
+        # H0..H4 once the blocks so far are done.
+        await self.wait_done()
+        return await self.send([(CTRL_DIGEST_H0 + 4 * i, None) for i in range(5)])
+
+    async def save(self):
+        # H0..H4 and CTRL_MSG_HASHED, what is not a full block yet stays in buf.
+        if self.loaded:
+            # Nothing since restore(), it is still what it was.
+            return
+        if self.blocks:
+            res = await self.midstate()
+            res += await self.send([(CTRL_MSG_HASHED, None)])
+            assert (res[5] == self.blocks * self.block_size), "CTRL_MSG_HASHED is %d" % res[5]
+            self.context = res
+        else:
+            self.context = None
+
+    async def restore(self):
+        # Before any block it is a new message again.
+        if self.context is None:
+            await self.send([(CTRL_SHA1_OPS, RESET)])
+            return
+        ops = [(CTRL_DIGEST_H0 + 4 * i, h) for i, h in enumerate(self.context[:5])]
+        res = await self.send(ops + [(CTRL_MSG_HASHED, self.context[5])])
+        assert (res == [1] * 6), "restore: %s" % res
+        self.loaded = True
+
+    async def use_key(self, slot):
+        # None is plain SHA-1 again.
+        if slot is None:
+            res = await self.send([(CTRL_HMAC, HMAC_OFF)])
+        else:
+            res = await self.send([(CTRL_HMAC, HMAC_MSG | slot << 8)])
+        assert (res[0] == 1), "CTRL_HMAC: %s" % hex(res[0])
+
+    async def set_key(self, slot, key):
+        # Longer ones are hashed first, in plain SHA-1.
+        if len(key) > self.block_size:
+            await self.use_key(None)
+            await self.reset()
+            await self.update(key)
+            key = await self.digest()
+        key = key + b'\x00' * (self.block_size - len(key))
+        res = await self.send([(CTRL_HMAC, HMAC_KEY | slot << 8)] + [(CTRL_MSG_IN, w) for w in self.words(key)])
+        assert (res[0] == 1), "CTRL_HMAC: %s" % hex(res[0])
+        await self.wait_done()
+        self.started = False
+
+    async def hexdigest(self):
+        return (await self.digest()).hex()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2021 Konrad Rzeszutek Wilk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Runs the same make targets with every SIM= and says how long each took,
+# the build on its own and the tests (from results.xml) on their own.
+#
+#   python3 -m test.sim_speed test_sha1 test_wb_logic test_wrapper
+import argparse
+import json
+import subprocess
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+def run(target, sim):
+    start = time.time()
+    rc = subprocess.call(["make", target, "SIM=%s" % sim], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wall = time.time() - start
+
+    tests = 0.0
+    sim_ns = 0.0
+    try:
+        for case in ET.parse("results.xml").getroot().iter("testcase"):
+            tests += float(case.get("time", 0))
+            sim_ns += float(case.get("sim_time_ns", 0))
+    except (OSError, ET.ParseError):
+        rc = rc or 1
+    return {"target": target, "sim": sim, "ok": rc == 0, "wall": wall,
+            "build": wall - tests, "tests": tests, "cycles": sim_ns / 10}
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the cocotb tests on each simulator")
+    parser.add_argument("targets", nargs="*", default=["test_sha1", "test_wb_logic", "test_wrapper"])
+    parser.add_argument("--sims", default="icarus,verilator")
+    parser.add_argument("-o", "--output", default="sim_speed.json")
+    args = parser.parse_args()
+    sims = args.sims.split(",")
+
+    results = [run(target, sim) for target in args.targets for sim in sims]
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print("%-20s %-10s %8s %8s %8s %12s" % ("target", "sim", "build", "tests", "wall", "kcycles/s"))
+    for r in results:
+        rate = "%12.1f" % (r["cycles"] / r["tests"] / 1000) if r["tests"] else "%12s" % "-"
+        print("%-20s %-10s %7.1fs %7.1fs %7.1fs %s%s" % (r["target"], r["sim"], r["build"], r["tests"],
+              r["wall"], rate, "" if r["ok"] else "  FAILED"))
+    for target in args.targets:
+        base = [r for r in results if r["target"] == target and r["sim"] == sims[0]][0]
+        for r in results:
+            if r["target"] == target and r["sim"] != sims[0] and r["tests"] and base["tests"]:
+                print("%s: %s runs the tests %.1fx faster than %s" % (target, r["sim"], base["tests"] / r["tests"], sims[0]))
+    return 0 if all(r["ok"] for r in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
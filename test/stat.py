@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2021 Konrad Rzeszutek Wilk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Synthesizes wrapper_sha1 as it is in a git revision and as it is now, and
+# says how many generic yosys cells and flip-flops each comes to, same as
+# make stat does for the working tree alone.
+#
+#   python3 -m test.stat --before HEAD~1
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT        = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCES     = ["src/wrapper_sha1.v", "src/sha1_wb.v"]
+
+def sources(rev, tmp):
+    # The working tree for None, else what git has.
+    if rev is None:
+        return [os.path.join(ROOT, src) for src in SOURCES]
+    paths = []
+    for src in SOURCES:
+        path = os.path.join(tmp, "%s_%s.v" % (os.path.splitext(os.path.basename(src))[0], re.sub(r'\W', '_', rev)))
+        with open(path, "wb") as f:
+            f.write(subprocess.check_output(["git", "-C", ROOT, "show", "%s:%s" % (rev, src)]))
+        paths.append(path)
+    return paths
+
+def measure(paths, tmp):
+    log = os.path.join(tmp, "stat.log")
+    # The wrapper's undriven buf_* warnings would drown the table, they are
+    # only shown if yosys fails.
+    r = subprocess.run(["yosys", "-q", "-p", "read_verilog -DMPRJ_IO_PADS=38 %s; synth -top wrapper_sha1 -flatten; "
+                        "tee -q -o %s stat" % (" ".join(paths), log)],
+                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    if r.returncode:
+        sys.stderr.write(r.stdout)
+        r.check_returncode()
+    with open(log) as f:
+        out = f.read()
+    # Older yosys says "Number of cells: N" and "$_DFF_P_ N", newer "N cells"
+    # and "N $_DFF_P_".
+    m = re.search(r'Number of cells:\s+(\d+)', out) or re.search(r'^\s*(\d+) cells$', out, re.M)
+    ffs = re.findall(r'^\s*\$_\w*DFF\w*\s+(\d+)$', out, re.M) or re.findall(r'^\s*(\d+)\s+\$_\w*DFF\w*$', out, re.M)
+    return int(m.group(1)), sum(int(n) for n in ffs)
+
+def main():
+    parser = argparse.ArgumentParser(description="Cell count of wrapper_sha1 before and after")
+    parser.add_argument("--before", required=True, help="git revision to compare against")
+    args = parser.parse_args()
+
+    if shutil.which("yosys") is None:
+        print("yosys is needed", file=sys.stderr)
+        return 1
+
+    tmp = tempfile.mkdtemp(prefix="stat")
+    try:
+        print("%-20s %10s %10s" % ("wrapper_sha1", "cells", "flip-flops"))
+        for label, rev in [(args.before, args.before), ("working tree", None)]:
+            cells, ffs = measure(sources(rev, tmp), tmp)
+            print("%-20s %10d %10d" % (label, cells, ffs))
+    finally:
+        shutil.rmtree(tmp)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+# SPDX-FileCopyrightText: 2021 Konrad Rzeszutek Wilk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# SPDX-License-Identifier: Apache-2.0
+import cocotb
+import hashlib
+import json
+import os
+import random
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles
+from cocotb.utils import get_sim_time
+
+from test.test_wb_logic import wb_burst
+from test.test_wb_logic import CTRL_SHA1_OPS, CTRL_MSG_IN, CTRL_MSG_LEN, CTRL_DIGEST_H0
+from test.test_wb_logic import RESET, CONTINUE, FINAL, DONE
+from test.sha1_driver import Sha1Driver
+
+# Where the numbers go, what they are held against and by how much they
+# can be worse. BENCH_UPDATE=1 makes these numbers the baseline.
+BENCH_OUT           = os.environ.get("BENCH_OUT", "bench.json")
+BENCH_BASELINE      = os.environ.get("BENCH_BASELINE", os.path.join(os.path.dirname(__file__), "bench_baseline.json"))
+BENCH_TOLERANCE     = float(os.environ.get("BENCH_TOLERANCE", "0.02"))
+BENCH_UPDATE        = os.environ.get("BENCH_UPDATE", "0") == "1"
+
+# Smaller is better for all of them but bytes per clock.
+HIGHER_IS_BETTER    = ("bytes_per_clock",)
+
+def now():
+    return int(get_sim_time(units='ns')) // 10
+
+class Bus:
+
+    # wb_burst, counting the transactions.
+    def __init__(self, dut, pipelined):
+        self.dut = dut
+        self.pipelined = pipelined
+        self.transactions = 0
+
+    async def burst(self, ops):
+        res, cycles = await wb_burst(self.dut, ops, self.pipelined)
+        self.transactions += len(ops)
+        return res
+
+    async def wait_done(self):
+        # As test_engine does it, CTRL_SHA1_OPS until DONE.
+        for i in range(200):
+            res = await self.burst([(CTRL_SHA1_OPS, None)])
+            if res[0] & DONE:
+                return
+        assert False, "Timed out waiting for DONE"
+
+async def hash_msg(bus, msg):
+
+    # Full blocks streamed, then FINAL with the rest and the digest.
+    words = Sha1Driver.words(msg)
+    full = (len(msg) // 64) * 16
+
+    await bus.burst([(CTRL_SHA1_OPS, RESET), (CTRL_MSG_LEN, len(msg))])
+    for j in range(0, full, 16):
+        await bus.burst([(CTRL_MSG_IN, w) for w in words[j:j+16]])
+    if full:
+        await bus.wait_done()
+    ops = [(CTRL_SHA1_OPS, (FINAL | CONTINUE) if full else FINAL)]
+    await bus.burst(ops + [(CTRL_MSG_IN, w) for w in words[full:]])
+    await bus.wait_done()
+
+    res = await bus.burst([(CTRL_DIGEST_H0 + 4 * i, None) for i in range(5)])
+    digest = b''.join(val.to_bytes(4, byteorder='big') for val in res)
+    assert (digest == hashlib.sha1(msg).digest())
+
+async def bench_latency(bus):
+
+    # One block with no FINAL, from the 16th CTRL_MSG_IN being acked to
+    # CTRL_SHA1_OPS saying DONE.
+    words = [random.getrandbits(32) for i in range(16)]
+    await bus.burst([(CTRL_SHA1_OPS, RESET)])
+    await bus.burst([(CTRL_MSG_IN, w) for w in words])
+    start = now()
+    await bus.wait_done()
+    return now() - start
+
+async def bench_blocks(bus, blocks):
+
+    # Back to back blocks with no FINAL, from the first one being in to the
+    # last one being done.
+    await bus.burst([(CTRL_SHA1_OPS, RESET)])
+    start = None
+    for n in range(blocks):
+        await bus.burst([(CTRL_MSG_IN, random.getrandbits(32)) for i in range(16)])
+        if start is None:
+            start = now()
+    await bus.wait_done()
+    return (now() - start) / blocks
+
+async def bench_msg(bus, blocks):
+
+    # A message that pads out to exactly `blocks`, RESET to the last
+    # word of the digest.
+    msg = bytes(random.getrandbits(8) for i in range(64 * blocks - 9))
+    transactions = bus.transactions
+    start = now()
+    await hash_msg(bus, msg)
+    cycles = now() - start
+    return {"cycles": cycles,
+            "transactions": bus.transactions - transactions,
+            "bytes_per_clock": round(len(msg) / cycles, 4)}
+
+def compare(results, baseline):
+    worse = []
+    for name, val in results.items():
+        if isinstance(val, dict):
+            worse += ["%s.%s" % (name, w) for w in compare(val, baseline.get(name, {}))]
+            continue
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        if name in HIGHER_IS_BETTER:
+            if val < base * (1 - BENCH_TOLERANCE):
+                worse.append("%s %s < %s" % (name, val, base))
+        elif val > base * (1 + BENCH_TOLERANCE):
+            worse.append("%s %s > %s" % (name, val, base))
+    return worse
+
+@cocotb.test()
+async def test_bench(dut):
+    clock = Clock(dut.wb_clk_i, 10, units="ns")
+    cocotb.fork(clock.start())
+
+    pipelined = int(dut.PIPELINED.value) == 1
+    mode = "pipelined" if pipelined else "classic"
+    bus = Bus(dut, pipelined)
+    random.seed(0xbe9c)
+
+    dut.wbs_cyc_i <= 0
+    dut.wbs_stb_i <= 0
+    dut.reset <= 1
+    await ClockCycles(dut.wb_clk_i, 5)
+    dut.reset <= 0
+    await ClockCycles(dut.wb_clk_i, 5)
+
+    results = {"latency": await bench_latency(bus),
+               "cycles_per_block": round(await bench_blocks(bus, 64), 2)}
+    for blocks in [1, 4, 64]:
+        results["msg_%d" % blocks] = await bench_msg(bus, blocks)
+    for name, val in results.items():
+        dut._log.info("%s %s: %s" % (mode, name, val))
+
+    baseline = {}
+    if os.path.exists(BENCH_BASELINE):
+        with open(BENCH_BASELINE) as f:
+            baseline = json.load(f)
+    with open(BENCH_OUT, "w") as f:
+        json.dump({mode: results}, f, indent=2)
+
+    if BENCH_UPDATE:
+        baseline[mode] = results
+        with open(BENCH_BASELINE, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        return
+
+    assert (mode in baseline), "No %s baseline, BENCH_UPDATE=1 to make one" % mode
+    worse = compare(results, baseline[mode])
+    assert not worse, "Slower than %s: %s" % (BENCH_BASELINE, ", ".join(worse))
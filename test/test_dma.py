@@ -0,0 +1,196 @@
+# SPDX-FileCopyrightText: 2021 Konrad Rzeszutek Wilk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# SPDX-License-Identifier: Apache-2.0
+import cocotb
+import hashlib
+import random
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles, FallingEdge, RisingEdge
+from cocotb.utils import get_sim_time
+
+from test.test_wb_logic import CTRL_GET_NR, CTRL_GET_ID, CTRL_MSG_CFG, MSG_SWAP
+from test.test_multi import read_val, write_val
+
+CTRL_DMA_RING       = CTRL_GET_NR + 0x38
+CTRL_DMA_SIZE       = CTRL_GET_NR + 0x3C
+CTRL_DMA_HEAD       = CTRL_GET_NR + 0x40 # Read only
+CTRL_DMA_TAIL       = CTRL_GET_NR + 0x44
+CTRL_DMA_IRQ        = CTRL_GET_NR + 0x48 # Write 1 to clear
+IRQ_DESC            = 1 << 0
+IRQ_RING            = 1 << 1
+
+DESC_IRQ            = 1 << 0
+DESC_DONE           = 1 << 31
+
+RING                = 0x100
+RING_SIZE           = 4
+MSGS                = 0x1000
+
+class Memory:
+
+    # Little endian memory on the Wishbone master, a few clocks to ack.
+    def __init__(self, dut, size):
+        self.dut = dut
+        self.mem = bytearray(size)
+        self.reads = 0
+        self.writes = 0
+        dut.wbm_ack_i <= 0
+        dut.wbm_dat_i <= 0
+        cocotb.fork(self.slave())
+
+    def read32(self, adr):
+        return int.from_bytes(self.mem[adr:adr+4], byteorder='little')
+
+    def write32(self, adr, val):
+        self.mem[adr:adr+4] = val.to_bytes(4, byteorder='little')
+
+    async def slave(self):
+        dut = self.dut
+        while True:
+            await FallingEdge(dut.wb_clk_i)
+            if dut.wbm_ack_i.value == 1:
+                # Taken on the last rising edge.
+                dut.wbm_ack_i <= 0
+                continue
+            if dut.wbm_cyc_o.value == 1 and dut.wbm_stb_o.value == 1:
+                assert (dut.wbm_sel_o.value == 0xf)
+                adr = dut.wbm_adr_o.value.integer
+                assert (adr & 3 == 0)
+                assert (adr + 4 <= len(self.mem)), "Out of memory at %x" % adr
+                await ClockCycles(dut.wb_clk_i, random.randrange(3))
+                await FallingEdge(dut.wb_clk_i)
+                if dut.wbm_we_o.value == 1:
+                    self.write32(adr, dut.wbm_dat_o.value.integer)
+                    self.writes += 1
+                else:
+                    dut.wbm_dat_i <= self.read32(adr)
+                    self.reads += 1
+                dut.wbm_ack_i <= 1
+
+async def wait_irq(dut):
+    for i in range(50000):
+        if dut.irq.value == 1:
+            return
+        await RisingEdge(dut.wb_clk_i)
+    assert False, "No IRQ"
+
+@cocotb.test()
+async def test_dma(dut):
+    clock = Clock(dut.wb_clk_i, 10, units="ns")
+    cocotb.fork(clock.start())
+
+    dut.wbs_cyc_i <= 0
+    dut.wbs_stb_i <= 0
+    dut.reset <= 1
+    mem = Memory(dut, 0x4000)
+    await ClockCycles(dut.wb_clk_i, 5)
+    dut.reset <= 0
+    await ClockCycles(dut.wb_clk_i, 5)
+
+    val = await read_val(dut, CTRL_GET_ID, False);
+    assert (val == 0x53484131);
+
+    val = await write_val(dut, CTRL_DMA_RING, RING, False);
+    assert (val == 1);
+    val = await write_val(dut, CTRL_DMA_SIZE, RING_SIZE, False);
+    assert (val == 1);
+    val = await read_val(dut, CTRL_DMA_RING, False);
+    assert (val == RING);
+    val = await read_val(dut, CTRL_DMA_HEAD, False);
+    assert (val == 0);
+
+    # Around the padding corners, with the ring wrapping a few times.
+    random.seed(0xd3a)
+    sizes = [0, 1, 3, 4, 55, 56, 63, 64, 65, 119, 120, 128, 200, 1000]
+    msgs = [bytes(random.getrandbits(8) for i in range(size)) for size in sizes]
+
+    tail = 0
+    adr = MSGS
+    blocks = 0
+    start = get_sim_time(units='ns')
+    todo = list(enumerate(msgs))
+    while todo:
+        # At most RING_SIZE - 1 in flight, head == tail is empty.
+        batch = todo[:random.randrange(1, RING_SIZE)]
+        todo = todo[len(batch):]
+        descs = []
+        any_irq = False
+        for n, msg in batch:
+            src = adr
+            dst = (src + len(msg) + 3) & ~3
+            adr = dst + 20 + 4 * random.randrange(2)
+            mem.mem[src:src + len(msg)] = msg
+            flags = random.choice([0, DESC_IRQ])
+            any_irq = any_irq or flags
+            desc = RING + 16 * tail
+            for i, val in enumerate([src, len(msg), dst, flags]):
+                mem.write32(desc + 4 * i, val)
+            descs.append((n, desc, dst))
+            tail = (tail + 1) % RING_SIZE
+            blocks += (len(msg) + 8) // 64 + 1
+
+        val = await write_val(dut, CTRL_DMA_TAIL, tail, False);
+        assert (val == 1);
+
+        # IRQ_DESC can come before the ring is empty, IRQ_RING is the last.
+        seen = 0
+        while not seen & IRQ_RING:
+            await wait_irq(dut)
+            val = await read_val(dut, CTRL_DMA_IRQ, False);
+            assert (val);
+            seen |= val
+            val = await write_val(dut, CTRL_DMA_IRQ, val, False);
+            assert (val == 1);
+        assert (seen == IRQ_RING | (IRQ_DESC if any_irq else 0));
+        val = await read_val(dut, CTRL_DMA_HEAD, False);
+        assert (val == tail);
+        await ClockCycles(dut.wb_clk_i, 2)
+        assert (dut.irq.value == 0);
+
+        for n, desc, dst in descs:
+            assert (mem.mem[dst:dst + 20] == hashlib.sha1(msgs[n]).digest()), "len %d" % len(msgs[n])
+            assert (mem.read32(desc + 12) & DESC_DONE);
+
+    cycles = (get_sim_time(units='ns') - start) / 10
+    dut._log.info("DMA: %d messages, %d blocks in %d cycles, %.1f blocks/kcycle, %d reads, %d writes" %
+                  (len(msgs), blocks, cycles, 1000 * blocks / cycles, mem.reads, mem.writes));
+
+    # The registers are the DMA's until it is done, the host just waits.
+    msg = b'abc'
+    mem.mem[MSGS:MSGS + 3] = msg
+    for i, val in enumerate([MSGS, len(msg), MSGS + 4, DESC_IRQ]):
+        mem.write32(RING + 16 * tail + 4 * i, val)
+    tail = (tail + 1) % RING_SIZE
+    val = await write_val(dut, CTRL_DMA_TAIL, tail, False);
+    val = await read_val(dut, CTRL_GET_ID, False);
+    assert (val == 0x53484131);
+    val = await read_val(dut, CTRL_DMA_HEAD, False);
+    assert (val == tail);
+    assert (mem.mem[MSGS + 4:MSGS + 24] == hashlib.sha1(msg).digest());
+    assert (dut.irq.value == 1);
+
+    # Whatever byte order the host left sha1_wb in, the DMA swaps the
+    # message itself and puts MSG_SWAP back to 0.
+    val = await write_val(dut, CTRL_DMA_IRQ, IRQ_DESC | IRQ_RING, False);
+    val = await write_val(dut, CTRL_MSG_CFG, MSG_SWAP, False);
+    assert (val == 1);
+    for i, val in enumerate([MSGS, len(msg), MSGS + 4, DESC_IRQ]):
+        mem.write32(RING + 16 * tail + 4 * i, val)
+    mem.mem[MSGS + 4:MSGS + 24] = bytes(20)
+    tail = (tail + 1) % RING_SIZE
+    val = await write_val(dut, CTRL_DMA_TAIL, tail, False);
+    await wait_irq(dut)
+    assert (mem.mem[MSGS + 4:MSGS + 24] == hashlib.sha1(msg).digest());
+    val = await read_val(dut, CTRL_MSG_CFG, False);
+    assert (val == 0);
@@ -0,0 +1,224 @@
+# SPDX-FileCopyrightText: 2021 Konrad Rzeszutek Wilk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# SPDX-License-Identifier: Apache-2.0
+#
+# caravel_test/sha1.c, the firmware library, built for the host (SHA1_HOST)
+# and run against sha1_wb. Its reads and writes go over the bus with
+# wb_burst, and while it spins waiting for an interrupt the clock runs and
+# sha1_irq() is called the way the CPU would once irq is up. No riscv
+# toolchain or Caravel is needed for it, it is not the real CPU either.
+import cocotb
+import ctypes
+import hashlib
+import hmac
+import os
+import random
+import subprocess
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles, RisingEdge
+
+from test.test_wb_logic import wb_burst
+from test.test_wb_logic import CTRL_SHA1_OPS, CTRL_MSG_IN, CTRL_IRQ_EN, CTRL_IRQ_STATUS
+
+CARAVEL_TEST    = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "caravel_test")
+LIB             = os.path.join(CARAVEL_TEST, "libsha1_host.so")
+
+# Clocks a wait can spin for: a block is 82, a long key three of them.
+MAX_SPIN        = 2000
+
+class Sha1Ctx(ctypes.Structure):
+    # struct sha1_ctx in caravel_test/sha1.h.
+    _fields_ = [("len", ctypes.c_uint32),
+                ("blocks", ctypes.c_uint32),
+                ("used", ctypes.c_uint32),
+                ("loaded", ctypes.c_uint32),
+                ("saved", ctypes.c_uint32),
+                ("w", ctypes.c_uint32 * 16),
+                ("h", ctypes.c_uint32 * 5)]
+
+READ    = ctypes.CFUNCTYPE(ctypes.c_uint32, ctypes.c_ulong)
+WRITE   = ctypes.CFUNCTYPE(None, ctypes.c_ulong, ctypes.c_uint32)
+RELAX   = ctypes.CFUNCTYPE(ctypes.c_int)
+
+def lib():
+    src = [os.path.join(CARAVEL_TEST, f) for f in ("sha1.c", "sha1.h")]
+    if not os.path.exists(LIB) or os.path.getmtime(LIB) < max(os.path.getmtime(f) for f in src):
+        subprocess.check_call(["make", "-s", "-C", CARAVEL_TEST, "libsha1_host.so"])
+    sha = ctypes.CDLL(LIB)
+    ctx = ctypes.POINTER(Sha1Ctx)
+    digest = ctypes.POINTER(ctypes.c_uint32)
+    for name, args in [("sha1_init", [ctx]),
+                       ("sha1_update", [ctx, ctypes.c_void_p, ctypes.c_uint32]),
+                       ("sha1_final", [ctx, digest]),
+                       ("sha1_save", [ctx]),
+                       ("sha1_restore", [ctx]),
+                       ("sha1_hmac_use", [ctypes.c_int]),
+                       ("sha1_hmac_key", [ctypes.c_uint32, ctypes.c_void_p, ctypes.c_uint32])]:
+        getattr(sha, name).argtypes = args
+    sha.sha1_irq.restype = ctypes.c_uint32
+    return sha
+
+class Firmware:
+
+    def __init__(self, dut):
+        self.dut = dut
+        self.lib = lib()
+        self.in_irq = False
+        self.irqs = 0
+        self.spin = 0
+        self.gave_up = []
+        # As test_caravel.py has it: from a CTRL_MSG_IN write to the IRQ
+        # being acked, no looking at CTRL_SHA1_OPS.
+        self.hashing = False
+        self.polled = []
+
+        # Kept here, ctypes does not hold on to them.
+        self.hooks = (READ(self.read), WRITE(self.write), RELAX(self.relax))
+        for name, hook in zip(("sha1_host_read", "sha1_host_write", "sha1_host_relax"), self.hooks):
+            ctypes.c_void_p.in_dll(self.lib, name).value = ctypes.cast(hook, ctypes.c_void_p).value
+
+    @cocotb.function
+    async def bus(self, adr, dat):
+        res, cycles = await wb_burst(self.dut, [(adr, dat)], False)
+        return res[0]
+
+    @cocotb.function
+    async def clock(self):
+        await RisingEdge(self.dut.wb_clk_i)
+
+    def interrupt(self):
+        # Between two instructions, not while in the handler already.
+        if self.in_irq or self.dut.irq.value != 1:
+            return
+        self.in_irq = True
+        self.irqs += 1
+        self.lib.sha1_irq()
+        self.in_irq = False
+
+    def read(self, adr):
+        if adr == CTRL_SHA1_OPS and self.hashing:
+            self.polled.append(self.irqs)
+        val = self.bus(adr, None)
+        self.interrupt()
+        return val
+
+    def write(self, adr, val):
+        if adr == CTRL_MSG_IN:
+            self.hashing = True
+        elif adr == CTRL_IRQ_STATUS:
+            self.hashing = False
+        self.bus(adr, val)
+        self.interrupt()
+
+    def relax(self):
+        self.spin += 1
+        if self.spin > MAX_SPIN:
+            self.gave_up.append(self.spin)
+            return 1
+        self.clock()
+        self.interrupt()
+        return 0
+
+    async def call(self, name, *args):
+        # On a thread of its own, the bus and clocks come back to cocotb.
+        def run():
+            getattr(self.lib, name)(*args)
+        self.spin = 0
+        await cocotb.external(run)()
+        assert not self.gave_up, "%s: no IRQ after %d clocks" % (name, MAX_SPIN)
+        assert not self.polled, "%s: CTRL_SHA1_OPS read while hashing" % name
+
+    async def sha1(self, msg, chunks=None, offset=0):
+        # The digest of msg, in chunks sha1_update() at a time from offset
+        # bytes into a word aligned buffer.
+        buf = (ctypes.c_uint32 * ((len(msg) + offset + 4) // 4))()
+        ctypes.memmove(ctypes.addressof(buf) + offset, msg, len(msg))
+        ctx = Sha1Ctx()
+        digest = (ctypes.c_uint32 * 5)()
+        await self.call("sha1_init", ctypes.byref(ctx))
+        pos = 0
+        for n in chunks or [len(msg)]:
+            await self.call("sha1_update", ctypes.byref(ctx), ctypes.addressof(buf) + offset + pos, n)
+            pos += n
+        await self.call("sha1_final", ctypes.byref(ctx), digest)
+        return b''.join(h.to_bytes(4, byteorder='big') for h in digest)
+
+@cocotb.test()
+async def test_firmware(dut):
+    clock = Clock(dut.wb_clk_i, 10, units="ns")
+    cocotb.fork(clock.start())
+
+    dut.wbs_cyc_i <= 0
+    dut.wbs_stb_i <= 0
+    dut.reset <= 1
+    await ClockCycles(dut.wb_clk_i, 5)
+    dut.reset <= 0
+    await ClockCycles(dut.wb_clk_i, 5)
+
+    fw = Firmware(dut)
+
+    # A key straight after reset, nothing has turned the IRQs on.
+    key = b'key'
+    await fw.call("sha1_hmac_key", 0, key, len(key))
+    msg = b'The quick brown fox jumps over the lazy dog'
+    assert (await fw.sha1(msg) == hmac.new(key, msg, hashlib.sha1).digest())
+
+    # And with only IRQ_MSG on, as wrapper.c's wishbone_test() leaves it.
+    await fw.call("sha1_hmac_use", -1)
+    await wb_burst(dut, [(CTRL_IRQ_EN, 1 << 1)], False)
+    key = bytes(range(100))
+    await fw.call("sha1_hmac_key", 1, key, len(key))
+    assert (await fw.sha1(msg) == hmac.new(key, msg, hashlib.sha1).digest())
+    await fw.call("sha1_hmac_use", -1)
+
+    # wrapper.c: library_test() and bench().
+    msg = b'abcdbcdecdefdefgefghfghighijhijkijkljklmklmnlmnomnopnopq'
+    assert (await fw.sha1(msg, [5, 30, len(msg) - 35], offset=1) == hashlib.sha1(msg).digest())
+    msg = bytes(i & 0xff for i in range(256))
+    assert (await fw.sha1(msg) == hashlib.sha1(msg).digest())
+
+    # sha1_save() twice, and sha1_final() right after one.
+    a = bytes(random.getrandbits(8) for i in range(200))
+    b = bytes(random.getrandbits(8) for i in range(150))
+    ctx_a = Sha1Ctx()
+    ctx_b = Sha1Ctx()
+    digest = (ctypes.c_uint32 * 5)()
+    await fw.call("sha1_init", ctypes.byref(ctx_a))
+    await fw.call("sha1_update", ctypes.byref(ctx_a), a, 100)
+    await fw.call("sha1_save", ctypes.byref(ctx_a))
+    await fw.call("sha1_save", ctypes.byref(ctx_a))
+    await fw.call("sha1_init", ctypes.byref(ctx_b))
+    await fw.call("sha1_update", ctypes.byref(ctx_b), b, 130)
+    await fw.call("sha1_save", ctypes.byref(ctx_b))
+    await fw.call("sha1_restore", ctypes.byref(ctx_a))
+    await fw.call("sha1_update", ctypes.byref(ctx_a), a[100:], 100)
+    await fw.call("sha1_save", ctypes.byref(ctx_a))
+    await fw.call("sha1_final", ctypes.byref(ctx_a), digest)
+    assert (b''.join(h.to_bytes(4, byteorder='big') for h in digest) == hashlib.sha1(a).digest())
+    await fw.call("sha1_restore", ctypes.byref(ctx_b))
+    await fw.call("sha1_update", ctypes.byref(ctx_b), b[130:], 20)
+    await fw.call("sha1_final", ctypes.byref(ctx_b), digest)
+    assert (b''.join(h.to_bytes(4, byteorder='big') for h in digest) == hashlib.sha1(b).digest())
+
+    # Around the padding and alignment corners, in random pieces.
+    random.seed(0xf1)
+    for size in [0, 1, 55, 56, 63, 64, 65, 119, 128, 300]:
+        msg = bytes(random.getrandbits(8) for i in range(size))
+        chunks = []
+        while sum(chunks) < size:
+            chunks.append(min(random.randrange(1, 90), size - sum(chunks)))
+        offset = random.randrange(4)
+        assert (await fw.sha1(msg, chunks, offset) == hashlib.sha1(msg).digest()), "len %d" % size
+
+    dut._log.info("firmware: %d IRQs" % fw.irqs)
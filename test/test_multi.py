@@ -0,0 +1,256 @@
+# SPDX-FileCopyrightText: 2021 Konrad Rzeszutek Wilk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# SPDX-License-Identifier: Apache-2.0
+import cocotb
+import hashlib
+import random
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles
+from cocotb.utils import get_sim_time
+
+from test.test_wb_logic import wb_burst
+from test.test_wb_logic import CTRL_GET_NR, CTRL_GET_ID, CTRL_SHA1_OPS, CTRL_MSG_IN, CTRL_MSG_LEN, CTRL_DIGEST_H0
+from test.test_wb_logic import CTRL_NR, RESET, FINAL, EINVAL, EBUSY
+from test.test_wb_logic import sha1_blocks
+
+CORE_SIZE           = 0x100
+CTRL_CORE_BUSY      = CTRL_GET_NR + 0xF0
+CTRL_CORE_DONE      = CTRL_GET_NR + 0xF4
+CTRL_CORE_IRQ       = CTRL_GET_NR + 0xF8
+
+CTRL_PIPE_IN        = CTRL_GET_NR + 0xC0
+CTRL_PIPE_H         = CTRL_GET_NR + 0xC4
+CTRL_PIPE_GO        = CTRL_GET_NR + 0xC8
+PIPE_INIT           = 0x80000000
+CTRL_PIPE_OUT       = CTRL_GET_NR + 0xCC
+PIPE_VALID          = 0x80000000
+CTRL_PIPE_H0        = CTRL_GET_NR + 0xD0
+
+async def read_val(dut, adr, pipelined):
+    res, cycles = await wb_burst(dut, [(adr, None)], pipelined);
+    return res[0]
+
+async def write_val(dut, adr, val, pipelined):
+    res, cycles = await wb_burst(dut, [(adr, val)], pipelined);
+    return res[0]
+
+def load_ops(n, msg):
+    # One block message, the engine pads it.
+    base = n * CORE_SIZE
+    ops = [(base + CTRL_SHA1_OPS, RESET),
+           (base + CTRL_MSG_LEN, len(msg)),
+           (base + CTRL_SHA1_OPS, FINAL)]
+    for j in range(0, len(msg), 4):
+        word = msg[j:j+4]
+        ops.append((base + CTRL_MSG_IN, int.from_bytes(word + b'\x00' * (4 - len(word)), byteorder='big')))
+    return ops
+
+async def run_jobs(dut, msgs, cores, pipelined):
+
+    # Keep the first `cores` busy until all of msgs are hashed.
+    todo = list(msgs)
+    jobs = {}
+    start = get_sim_time(units='ns')
+    while todo or jobs:
+        done = await read_val(dut, CTRL_CORE_DONE, pipelined);
+        for n in range(cores):
+            if n in jobs:
+                if not (done >> n) & 1:
+                    continue
+                base = n * CORE_SIZE
+                res, cycles = await wb_burst(dut, [(base + CTRL_DIGEST_H0 + 4 * i, None) for i in range(5)], pipelined);
+                digest = b''.join(val.to_bytes(4, byteorder='big') for val in res)
+                assert (digest == hashlib.sha1(jobs[n]).digest()), "core %d" % n
+                del jobs[n]
+            if todo:
+                msg = todo.pop(0)
+                res, cycles = await wb_burst(dut, load_ops(n, msg), pipelined);
+                # RESET and FINAL give back CTRL_SHA1_OPS, the rest ACK.
+                assert (res[0] & 0x3 == RESET);
+                assert (res[1] == 1);
+                assert (res[3:] == [1] * (len(res) - 3));
+                jobs[n] = msg
+
+    return (get_sim_time(units='ns') - start) / 10
+
+def pipe_ops(block, tag, h=None):
+    # One padded block into sha1_pipe, from h or the initial values.
+    ops = [(CTRL_PIPE_IN, w) for w in block]
+    if h is None:
+        return ops + [(CTRL_PIPE_GO, PIPE_INIT | tag)]
+    ops += [(CTRL_PIPE_H, h >> (32 * (4 - i)) & 0xffffffff) for i in range(5)]
+    return ops + [(CTRL_PIPE_GO, tag)]
+
+# CTRL_PIPE_OUT and the digest after it.
+PIPE_OUT_OPS = [(CTRL_PIPE_OUT, None)] + [(CTRL_PIPE_H0 + 4 * i, None) for i in range(5)]
+
+def pipe_out(res):
+    # The tag and digest from PIPE_OUT_OPS, None if nothing was out yet.
+    if not res[0] & PIPE_VALID:
+        return None
+    return (res[0] & 0xff, b''.join(val.to_bytes(4, byteorder='big') for val in res[1:]))
+
+async def pipe_wait(dut, pipelined):
+    for i in range(100):
+        res, cycles = await wb_burst(dut, PIPE_OUT_OPS, pipelined);
+        out = pipe_out(res)
+        if out:
+            return out
+    assert False, "Timed out waiting for the digest"
+
+@cocotb.test()
+async def test_multi(dut):
+    clock = Clock(dut.wb_clk_i, 10, units="ns")
+    cocotb.fork(clock.start())
+
+    num_cores = int(dut.NUM_CORES.value)
+    pipelined = int(dut.PIPELINED.value) == 1
+
+    dut.wbs_cyc_i <= 0
+    dut.wbs_stb_i <= 0
+    dut.reset <= 1
+    await ClockCycles(dut.wb_clk_i, 5)
+    dut.reset <= 0
+    await ClockCycles(dut.wb_clk_i, 5)
+
+    # Core 0 says how many there are, the others are one core each.
+    val = await read_val(dut, CTRL_GET_NR, pipelined);
+    assert (val & 0xff == CTRL_NR);
+    assert ((val >> 8) & 0xff == num_cores - 1);
+    for n in range(num_cores):
+        val = await read_val(dut, n * CORE_SIZE + CTRL_GET_ID, pipelined);
+        assert (val == 0x53484131);
+        if n:
+            val = await read_val(dut, n * CORE_SIZE + CTRL_GET_NR, pipelined);
+            assert (val == CTRL_NR);
+
+    val = await read_val(dut, CTRL_CORE_BUSY, pipelined);
+    assert (val == 0);
+    assert (dut.irq.value == 0);
+
+    # Many small messages, first on one core and then on all of them.
+    random.seed(0x3c)
+    msgs = [bytes(random.getrandbits(8) for i in range(random.randrange(56))) for j in range(8 * num_cores)]
+
+    cycles = await run_jobs(dut, msgs, 1, pipelined);
+    one = 1000 * len(msgs) / cycles
+    dut._log.info("1 core: %d blocks in %d cycles, %.1f blocks/kcycle" % (len(msgs), cycles, one));
+
+    cycles = await run_jobs(dut, msgs, num_cores, pipelined);
+    rate = 1000 * len(msgs) / cycles
+    dut._log.info("%d cores: %d blocks in %d cycles, %.1f blocks/kcycle" % (num_cores, len(msgs), cycles, rate));
+    if num_cores > 1:
+        assert (rate > one);
+    if pipelined:
+        # The bus is not what holds it back.
+        assert (rate > 0.7 * num_cores * one);
+
+    # All of them got DONE at some point.
+    val = await read_val(dut, CTRL_CORE_IRQ, pipelined);
+    assert (val == (1 << num_cores) - 1);
+    assert (dut.irq.value == 1);
+    val = await write_val(dut, CTRL_CORE_IRQ, val, pipelined);
+    assert (val == 1);
+    await ClockCycles(dut.wb_clk_i, 2)
+    val = await read_val(dut, CTRL_CORE_IRQ, pipelined);
+    assert (val == 0);
+    assert (dut.irq.value == 0);
+
+@cocotb.test()
+async def test_multi_pipe(dut):
+    clock = Clock(dut.wb_clk_i, 10, units="ns")
+    cocotb.fork(clock.start())
+
+    stages = int(dut.PIPE_STAGES.value)
+    pipelined = int(dut.PIPELINED.value) == 1
+    if not stages:
+        dut._log.info("No PIPE_STAGES, no sha1_pipe")
+        return
+    interval = 80 // stages
+
+    dut.wbs_cyc_i <= 0
+    dut.wbs_stb_i <= 0
+    dut.reset <= 1
+    await ClockCycles(dut.wb_clk_i, 5)
+    dut.reset <= 0
+    await ClockCycles(dut.wb_clk_i, 5)
+
+    # Nothing to hand over or to read yet.
+    val = await write_val(dut, CTRL_PIPE_GO, PIPE_INIT, pipelined);
+    assert (val == EINVAL);
+    val = await read_val(dut, CTRL_PIPE_OUT, pipelined);
+    assert (val == 0);
+
+    res, cycles = await wb_burst(dut, pipe_ops(sha1_blocks(b'abc')[0], 0x5a), pipelined);
+    assert (res == [1] * 17);
+    assert (await pipe_wait(dut, pipelined) == (0x5a, hashlib.sha1(b'abc').digest()));
+
+    # Without all of h0..h4, and too many words.
+    block = sha1_blocks(b'')[0]
+    res, cycles = await wb_burst(dut, pipe_ops(block, 1, 0)[:-2] + [(CTRL_PIPE_GO, 1)], pipelined);
+    assert (res[-1] == EINVAL);
+    res, cycles = await wb_burst(dut, [(CTRL_PIPE_IN, 0), (CTRL_PIPE_H, 0), (CTRL_PIPE_H, 0), (CTRL_PIPE_GO, PIPE_INIT)], pipelined);
+    assert (res == [EINVAL, 1, EINVAL, 1]);
+    assert (await pipe_wait(dut, pipelined) == (0, hashlib.sha1(b'').digest()));
+
+    # Two blocks of one message, the second from CTRL_PIPE_H.
+    msg = b'a' * 100
+    blocks = sha1_blocks(msg)
+    await wb_burst(dut, pipe_ops(blocks[0], 2), pipelined);
+    tag, digest = await pipe_wait(dut, pipelined)
+    await wb_burst(dut, pipe_ops(blocks[1], 3, int.from_bytes(digest, byteorder='big')), pipelined);
+    assert (await pipe_wait(dut, pipelined) == (3, hashlib.sha1(msg).digest()));
+
+    # With PIPE_FIFO not read back it is full, they come out in order.
+    fifo = 1 << (2 * stages - 1).bit_length()
+    for tag in range(fifo):
+        res, cycles = await wb_burst(dut, pipe_ops(blocks[0], tag), pipelined);
+        assert (res[-1] == 1);
+    res, cycles = await wb_burst(dut, pipe_ops(blocks[0], 0xff), pipelined);
+    assert (res[-1] == EBUSY);
+    for tag in range(fifo):
+        assert (await pipe_wait(dut, pipelined) == (tag, digest))
+    # The block is still there to go again.
+    val = await write_val(dut, CTRL_PIPE_GO, PIPE_INIT | 0xff, pipelined);
+    assert (val == 1);
+    assert (await pipe_wait(dut, pipelined) == (0xff, digest))
+
+    # Many independent blocks, each burst reads one out and hands the next
+    # one over. That is 23 bus cycles, with PIPE_STAGES above 4 the bus and
+    # not the pipe is what holds it back.
+    random.seed(0x919e)
+    msgs = [bytes(random.getrandbits(8) for i in range(random.randrange(56))) for j in range(64)]
+    out = []
+    start = get_sim_time(units='ns')
+    for tag, msg in enumerate(msgs):
+        res, cycles = await wb_burst(dut, PIPE_OUT_OPS + pipe_ops(sha1_blocks(msg)[0], tag), pipelined);
+        assert (res[6:] == [1] * 17);
+        if pipe_out(res[:6]):
+            out.append(pipe_out(res[:6]))
+    while len(out) < len(msgs):
+        out.append(await pipe_wait(dut, pipelined))
+    cycles = (get_sim_time(units='ns') - start) / 10
+    rate = 1000 * len(msgs) / cycles
+    dut._log.info("sha1_pipe: %d blocks in %d cycles, %.1f blocks/kcycle (a block every %d clocks)" %
+                  (len(msgs), cycles, rate, interval));
+    assert (out == [(tag, hashlib.sha1(msg).digest()) for tag, msg in enumerate(msgs)])
+
+    # Against the cores on the same.
+    cores = await run_jobs(dut, msgs, int(dut.NUM_CORES.value), pipelined);
+    dut._log.info("%d cores: %.1f blocks/kcycle" % (int(dut.NUM_CORES.value), 1000 * len(msgs) / cores));
+    if pipelined:
+        # A block every interval or burst, and the last ones through.
+        assert (cycles < (len(msgs) + stages + 2) * max(interval, 24) * 1.1);
+        if interval <= 24:
+            assert (cycles < cores);
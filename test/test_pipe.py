@@ -0,0 +1,121 @@
+# SPDX-FileCopyrightText: 2021 Konrad Rzeszutek Wilk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# SPDX-License-Identifier: Apache-2.0
+import cocotb
+import hashlib
+import random
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles, FallingEdge, RisingEdge
+
+from test.test_wb_logic import sha1_blocks
+
+INITIAL_H = 0x67452301EFCDAB8998BADCFE10325476C3D2E1F0
+
+def block_int(words):
+    val = 0
+    for w in words:
+        val = val << 32 | w
+    return val
+
+class Outputs:
+
+    # Everything that comes out, with the clock it came out on.
+    def __init__(self, dut):
+        self.dut = dut
+        self.cycle = 0
+        self.out = []
+        cocotb.fork(self.monitor())
+
+    async def monitor(self):
+        while True:
+            await FallingEdge(self.dut.clk)
+            self.cycle += 1
+            if self.dut.out_valid.value == 1:
+                self.out.append((self.cycle, self.dut.out_tag.value.integer, self.dut.out_digest.value.integer))
+
+async def push(dut, block, h, tag):
+
+    # Hold it until in_ready says it went in on this edge.
+    dut.in_valid <= 1
+    dut.in_block <= block
+    dut.in_h <= h
+    dut.in_tag <= tag
+    while True:
+        await FallingEdge(dut.clk)
+        ready = dut.in_ready.value == 1
+        await RisingEdge(dut.clk)
+        if ready:
+            break
+    dut.in_valid <= 0
+
+async def wait_out(dut, outputs, count):
+
+    for i in range(1000):
+        if len(outputs.out) >= count:
+            return
+        await ClockCycles(dut.clk, 1)
+    assert False, "Timed out waiting for the digest"
+
+@cocotb.test()
+async def test_pipe(dut):
+    clock = Clock(dut.clk, 10, units="ns")
+    cocotb.fork(clock.start())
+
+    stages = int(dut.STAGES.value)
+    unroll = int(dut.UNROLL.value)
+    interval = 80 // (stages * unroll)
+    dut._log.info("%d stages, %d rounds per clock: a block every %d clocks" % (stages, unroll, interval))
+
+    dut.in_valid <= 0
+    dut.reset <= 1
+    await ClockCycles(dut.clk, 5)
+    dut.reset <= 0
+    outputs = Outputs(dut)
+
+    # One block on its own, how long does it take.
+    await push(dut, block_int(sha1_blocks(b'abc')[0]), INITIAL_H, 0x5a)
+    start = outputs.cycle
+    await wait_out(dut, outputs, 1)
+    cycle, tag, digest = outputs.out[0]
+    dut._log.info("latency %d clocks" % (cycle - start))
+    assert (tag == 0x5a)
+    assert (digest == 0xa9993e364706816aba3e25717850c26c9cd0d89d)
+
+    # A message of two blocks is two trips, the second from the first's digest.
+    msg = b'a' * 100
+    h = INITIAL_H
+    for block in sha1_blocks(msg):
+        await push(dut, block_int(block), h, 1)
+        await wait_out(dut, outputs, len(outputs.out) + 1)
+        h = outputs.out[-1][2]
+    assert (h.to_bytes(20, byteorder='big') == hashlib.sha1(msg).digest())
+
+    # And many independent ones back to back.
+    random.seed(0x919e)
+    msgs = [bytes(random.getrandbits(8) for i in range(random.randrange(56))) for j in range(64)]
+    outputs.out = []
+    for tag, msg in enumerate(msgs):
+        await push(dut, block_int(sha1_blocks(msg)[0]), INITIAL_H, tag)
+    await wait_out(dut, outputs, len(msgs))
+
+    for tag, msg in enumerate(msgs):
+        cycle, out_tag, digest = outputs.out[tag]
+        assert (out_tag == tag)
+        assert (digest.to_bytes(20, byteorder='big') == hashlib.sha1(msg).digest())
+        if tag:
+            # In order and not a clock lost in between.
+            assert (cycle - outputs.out[tag - 1][0] == interval)
+
+    cycles = outputs.out[-1][0] - outputs.out[0][0] + interval
+    dut._log.info("%d blocks in %d clocks, %.1f blocks/kcycle" % (len(msgs), cycles, 1000 * len(msgs) / cycles))
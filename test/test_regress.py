@@ -0,0 +1,92 @@
+# SPDX-FileCopyrightText: 2021 Konrad Rzeszutek Wilk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# SPDX-License-Identifier: Apache-2.0
+import cocotb
+import json
+import os
+import time
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles
+from cocotb.utils import get_sim_time
+
+from cocotbext.wishbone.driver import WishboneMaster
+
+from test.sha1_driver import Sha1Driver
+from test.golden import vectors, rfc3174_vectors
+
+# One shard of test/regress.py, everything it needs is in the environment.
+REGRESS_SEED        = int(os.environ.get("REGRESS_SEED", "1"))
+REGRESS_COUNT       = int(os.environ.get("REGRESS_COUNT", "100"))
+REGRESS_MAX_LEN     = int(os.environ.get("REGRESS_MAX_LEN", "300"))
+REGRESS_OUT         = os.environ.get("REGRESS_OUT", "regress.json")
+# H0..H4 after every block too, not just the digest.
+REGRESS_MIDSTATES   = os.environ.get("REGRESS_MIDSTATES", "0") == "1"
+# The rfc3174/sha1test.c ones too, test/regress.py has only one shard do them.
+REGRESS_RFC3174     = os.environ.get("REGRESS_RFC3174", "1") == "1"
+
+def regress_vectors():
+    # Expected values out of test/golden.py's cache, the fixed ones first.
+    if REGRESS_RFC3174:
+        for test, vec in rfc3174_vectors():
+            yield "rfc3174-%d" % test, vec
+    vecs = vectors(REGRESS_SEED, REGRESS_COUNT, REGRESS_MAX_LEN)
+    for n in range(len(vecs)):
+        yield n, vecs[n]
+
+@cocotb.test()
+async def test_regress(dut):
+    clock = Clock(dut.wb_clk_i, 10, units="ns")
+    cocotb.fork(clock.start())
+
+    wbs = WishboneMaster(dut, "wbs", dut.wb_clk_i, width=32, timeout=100,
+                         signals_dict={"cyc": "cyc_i", "stb": "stb_i", "we": "we_i", "adr": "adr_i",
+                                       "datwr": "dat_i", "datrd": "dat_o", "ack": "ack_o", "sel": "sel_i"})
+    sha1 = Sha1Driver(dut, wbs, done=dut.done)
+
+    dut.reset <= 1
+    await ClockCycles(dut.wb_clk_i, 5)
+    dut.reset <= 0
+    await ClockCycles(dut.wb_clk_i, 5)
+
+    # Keep going on a mismatch, the runner wants all of them.
+    failures = []
+    start = time.time()
+    count = 0
+    size = 0
+    for n, vec in regress_vectors():
+        msg = vec.msg
+        await sha1.reset()
+        if REGRESS_MIDSTATES:
+            for j in range(len(msg) // 64):
+                await sha1.update(msg[64 * j:64 * (j + 1)])
+                mid = await sha1.midstate()
+                if tuple(mid) != vec.midstates[j]:
+                    dut._log.error("seed %d message %s block %d: %s" % (REGRESS_SEED, n, j, " ".join("%08x" % h for h in mid)))
+                    failures.append({"seed": REGRESS_SEED, "index": n, "len": len(msg), "block": j})
+            await sha1.update(msg[64 * (len(msg) // 64):])
+        else:
+            await sha1.update(msg)
+        digest = await sha1.digest()
+        if digest != vec.digest:
+            dut._log.error("seed %d message %s (%d bytes): %s" % (REGRESS_SEED, n, len(msg), digest.hex()))
+            failures.append({"seed": REGRESS_SEED, "index": n, "len": len(msg), "digest": digest.hex()})
+        count += 1
+        size += len(msg)
+
+    with open(REGRESS_OUT, "w") as f:
+        json.dump({"seed": REGRESS_SEED, "hashes": count, "bytes": size,
+                   "cycles": get_sim_time(units='ns') // 10, "seconds": time.time() - start,
+                   "failures": failures}, f)
+
+    assert not failures, "%d of %d digests wrong" % (len(failures), count)
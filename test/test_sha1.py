@@ -18,6 +18,9 @@ from cocotb.triggers import ClockCycles
 from cocotb.binary import BinaryValue
 
 import ctypes
+import random
+
+from test.rfc3174 import block, diverged
 
 DEFAULT     = 0xf00df00d;
 
@@ -37,6 +40,19 @@ INITIAL_H2  = 0x98BADCFE;
 INITIAL_H3  = 0x10325476;
 INITIAL_H4  = 0xC3D2E1F0;
 
+# STATE_START, 80 rounds (one per clock) and STATE_DONE.
+BLOCK_CYCLES = 82;
+
+# "abc", padded.
+ABC = [0x61626380] + [0] * 14 + [0x18];
+W_IN = ["w"];
+ROUND_OUT = ["a", "b", "c", "d", "e"];
+
+def check_round(dut, ref, t, fields):
+    # Stop at the first round and field that is not what RFC 3174 has.
+    err = diverged(dut, t, ref, fields);
+    assert not err, err;
+
 async def reset(dut):
 
     dut.sha1_on <= 0;
@@ -68,7 +84,7 @@ async def payload(dut):
     assert (dut.state == STATE_START);
 
 
-async def loop_one(dut):
+async def loop_one(dut, ref):
 
     assert (dut.state == STATE_START);
     await ClockCycles(dut.wb_clk_i, 1)
@@ -94,8 +110,6 @@ async def loop_one(dut):
     assert (dut.d == INITIAL_H3);
     assert (dut.e == INITIAL_H4);
 
-    assert (dut.compute == 1);
-    assert (dut.copy_values == 0);
     assert (dut.index == 0);
 
     # Now lets compute the first function.
@@ -112,49 +126,29 @@ async def loop_one(dut):
 
         assert (dut.index == i);
 
+        check_round(dut, ref, i, W_IN);
+
         # Compute cycle:
         f = (b & c) | ((~b) & d);
         w = int(dut.w);
         a_left_5 = (a << 5| a >> 27) & 0xFFFFFFFF;
         temp = ctypes.c_uint(a_left_5 + f + e + k + w).value;
 
-        assert (dut.compute == 1);
-        assert (dut.copy_values == 0);
-
         # Crank it and ..
         await ClockCycles(dut.wb_clk_i, 1)
 
-        # Note that we probe for dut.temp here, and the inc_counter had fired
-        # of in previous clock cycle, so we are at:
+        # .. the round is done in one clock, so the index had moved on
         assert (dut.index == i+1);
 
-        # And the dut.temp contais the value from the previous index value.
-
         dut._log.info("i=%2d w=%8x temp=%8x (temp=%8x)" % (i, w, int(dut.temp), temp));
 
         # Better have same values!
         assert (dut.temp == temp);
+        check_round(dut, ref, i, ROUND_OUT);
 
-        # .. on the next cycle (for copy) we will overwrite a, b, c, d, ..
-
-        assert (dut.compute == 0);
-        assert (dut.copy_values == 1);
-
-        # but before that in the compute cycle we copied a,b,c,d over.
-        assert (dut.a_old == a);
-        assert (dut.b_old == b);
-        assert (dut.c_old == c);
-        assert (dut.d_old == d);
-
-        # Crank it and we have copied values over
-        await ClockCycles(dut.wb_clk_i, 1)
-
-        assert (dut.compute == 1);
-        assert (dut.copy_values == 0);
-        assert (dut.inc_counter == 1);
-
-        # Also we did some transformations on a, b, c, d..
+        # And in the same cycle we did the transformations on a, b, c, d..
         assert (dut.e == d);
+        assert (dut.d == c);
         assert (dut.b == a);
         assert (dut.a == temp);
 
@@ -164,8 +158,10 @@ async def loop_one(dut):
         b = a;
         a = temp;
 
+        assert (dut.c == c);
 
-async def loop(dut, loop_state, idx, k, loop_cnt):
+
+async def loop(dut, ref, loop_state, idx, k, loop_cnt):
 
     assert (int(dut.state) + 1 == loop_state);
     # Start at the previous loop.
@@ -176,41 +172,34 @@ async def loop(dut, loop_state, idx, k, loop_cnt):
 
         w = int(dut.w);
         idx = int(dut.index);
+        check_round(dut, ref, idx, W_IN);
 
         await ClockCycles(dut.wb_clk_i, 1)
-        # It is a two clock cycle operation. In the first we copy_values:
-        assert (dut.copy_values == 1);
-        assert (dut.compute == 0);
-
+        # It is a one clock cycle operation.
         assert (int(dut.state)  == loop_state);
-
-        await ClockCycles(dut.wb_clk_i, 1)
-        # Now we actually compute the value
-        assert (dut.copy_values == 0);
-        assert (dut.compute == 1);
+        assert (dut.k == k);
 
         # And the index had moved from the start of the loop
         assert (dut.index == idx + 1);
+        check_round(dut, ref, idx, ROUND_OUT);
 
         temp = int(dut.temp);
         dut._log.info("i=%2d w=%8x temp=%8x" % (idx, w, temp));
 
     dut._log.info("%d=%d finished with idx=%d" % (int(dut.state), loop_state, int(dut.index)));
 
-async def loop_done(dut, idx, k):
+async def loop_done(dut, ref, idx, k):
+
+    check_round(dut, ref, idx - 1, W_IN);
 
-    # Crank it over (let it do its compute and increase index)
+    # Crank it over (let it do its last round and increase index)
     await ClockCycles(dut.wb_clk_i, 1)
+    check_round(dut, ref, idx - 1, ROUND_OUT);
 
     assert (dut.state == STATE_DONE);
     assert (dut.k == k);
     assert (dut.index == idx);
 
-    # Now let is copy the values over
-    assert (dut.copy_values == 1);
-    await ClockCycles(dut.wb_clk_i, 1)
-
-    assert (dut.copy_values == 0);
     dut._log.info("i=%2d temp=%8x" % (dut.index, int(dut.temp)));
 
     assert(int(dut.temp) == 0x42541b35);
@@ -222,7 +211,7 @@ async def loop_done(dut, idx, k):
     assert(int(dut.c) == 0x21834873);
     dut._log.info("D=%8x" % (int(dut.d)));
     assert(int(dut.d) == 0x681e6df6);
-    dut._log.info("E=%8x" % (int(dut.d)));
+    dut._log.info("E=%8x" % (int(dut.e)));
     assert(int(dut.e) == 0xd8fdf6ad);
 
 
@@ -284,17 +273,75 @@ async def test_sha1(dut):
 
     await reset(dut)
 
+    ref, h = block(ABC);
+
     for i in range(3):
         await payload(dut)
 
-        await loop_one(dut)
+        await loop_one(dut, ref)
+
+        await loop(dut, ref, LOOP_TWO, 19, 0x6ED9EBA1, 20);
+
+        await loop(dut, ref, LOOP_THREE, 39, 0x8F1BBCDC, 20);
+
+        await loop(dut, ref, LOOP_FOUR, 59, 0xCA62C1D6, 20);
+
+        await loop_done(dut, ref, 80, 0xf00df00d);
 
-        await loop(dut, LOOP_TWO, 19, 0x6ED9EBA1, 20);
+        await loop_final(dut);
+
+@cocotb.test()
+async def test_sha1_cycles(dut):
 
-        await loop(dut, LOOP_THREE, 39, 0x8F1BBCDC, 20);
+    clock = Clock(dut.wb_clk_i, 10, units="us")
+    cocotb.fork(clock.start())
+
+    await reset(dut)
 
-        await loop(dut, LOOP_FOUR, 59, 0xCA62C1D6, 20);
+    await payload(dut)
 
-        await loop_done(dut, 80, 0xf00df00d);
+    # We are at STATE_START, count until the digest is ready.
+    cycles = 0
+    while (dut.state != STATE_FINAL):
+        await ClockCycles(dut.wb_clk_i, 1)
+        cycles = cycles + 1;
+        assert (cycles <= 2 * BLOCK_CYCLES);
+
+    dut._log.info("block took %d cycles" % (cycles));
+    assert (cycles == BLOCK_CYCLES);
+    assert (int(dut.digest) == 0xa9993e364706816aba3e25717850c26c9cd0d89d);
+
+    await loop_final(dut);
+
+@cocotb.test()
+async def test_sha1_trace(dut):
+
+    clock = Clock(dut.wb_clk_i, 10, units="us")
+    cocotb.fork(clock.start())
+
+    await reset(dut)
+    random.seed(0x3174)
+
+    # Random blocks, every round against RFC 3174 as it happens.
+    for n in range(16):
+        words = [random.getrandbits(32) for i in range(16)];
+        ref, h = block(words);
+
+        for i in range(len(dut.message)):
+            dut.message[i] <= words[i];
+        await ClockCycles(dut.wb_clk_i, 1)
+        dut.sha1_on <= 1;
+
+        while (dut.state != LOOP_ONE):
+            await ClockCycles(dut.wb_clk_i, 1)
+
+        for t in range(80):
+            check_round(dut, ref, t, W_IN);
+            await ClockCycles(dut.wb_clk_i, 1)
+            check_round(dut, ref, t, ROUND_OUT);
+
+        await ClockCycles(dut.wb_clk_i, 1)
+        assert (dut.state == STATE_FINAL);
+        assert ([int(dut.h0), int(dut.h1), int(dut.h2), int(dut.h3), int(dut.h4)] == h);
 
         await loop_final(dut);
@@ -13,14 +13,20 @@
 # limitations under the License.
 # SPDX-License-Identifier: Apache-2.0
 import cocotb
+import hashlib
+import hmac
 import inspect
+import random
 import traceback
 from cocotb.clock import Clock
 from cocotb.binary import BinaryValue
-from cocotb.triggers import ClockCycles
+from cocotb.triggers import ClockCycles, FallingEdge, RisingEdge
+from cocotb.utils import get_sim_time
 from cocotbext.wishbone.driver import WishboneMaster
 from cocotbext.wishbone.driver import WBOp
 
+from test.sha1_driver import Sha1Driver
+
 def status(dut, s):
     try:
         b=bytes(s, 'ascii');
@@ -28,6 +34,18 @@ def status(dut, s):
     except:
         pass
 
+def two_state():
+    # Verilator (make SIM=verilator) has no 'x' or 'z'.
+    return cocotb.SIM_NAME.lower().startswith("verilator")
+
+def io_off(value):
+    # Not active the outputs are tristated. We get these annoying 'ZZ' in
+    # there, so we do this dance to get rid of it. Without 'z' they are 0.
+    bits = str(value)[:-8]
+    if two_state():
+        return bits.replace('0', '') == ""
+    return bits.replace('z', '').replace('x', '') == ""
+
 async def read_val(dut, wbs, cmd, exp):
     wbRes = await wbs.send_cycle([WBOp(cmd)]);
     dut._log.info("%s = Read %s expected %s" % (hex(cmd), hex(wbRes[0].datrd.integer), hex(exp)))
@@ -47,6 +65,54 @@ CTRL_GET_ID         = CTRL_GET_NR + 0x4
 CTRL_SHA1_OPS       = CTRL_GET_NR + 0x8
 CTRL_MSG_IN         = CTRL_GET_NR + 0xC
 CTRL_SHA1_DIGEST    = CTRL_GET_NR + 0x10
+CTRL_PANIC          = CTRL_GET_NR + 0x14
+CTRL_MSG_LEN        = CTRL_GET_NR + 0x18
+CTRL_DIGEST_H0      = CTRL_GET_NR + 0x1C # .. to H4 at +0x2C
+CTRL_IRQ_EN         = CTRL_GET_NR + 0x30
+CTRL_IRQ_STATUS     = CTRL_GET_NR + 0x34 # Write 1 to clear
+CTRL_MSG_HASHED     = CTRL_GET_NR + 0x4C # 0x38..0x48 are sha1_dma's
+CTRL_HMAC           = CTRL_GET_NR + 0x50
+CTRL_MSG_CFG        = CTRL_GET_NR + 0x54
+CTRL_PERF_BUSY      = CTRL_GET_NR + 0x58 # Write 0 to clear
+CTRL_PERF_BLOCKS    = CTRL_GET_NR + 0x5C
+CTRL_PERF_PADDED    = CTRL_GET_NR + 0x60
+CTRL_PERF_REJECTS   = CTRL_GET_NR + 0x64
+CTRL_PERF_EARLY     = CTRL_GET_NR + 0x68
+CTRL_PERF_PANICS    = CTRL_GET_NR + 0x6C
+
+# First version had only 4 commands, CTRL_MSG_LEN makes it 5,
+# CTRL_DIGEST_H0..H4 6, CTRL_IRQ_EN/STATUS 7 and CTRL_PERF_* 8.
+CTRL_NR             = 8
+
+# CTRL_SHA1_OPS
+ON                  = 1 << 0
+RESET               = 1 << 1
+CONTINUE            = 1 << 2 # Write only
+FINAL               = 1 << 3 # Write only
+DONE                = 1 << 3 # Read only
+
+# CTRL_IRQ_EN and CTRL_IRQ_STATUS
+IRQ_BLOCK           = 1 << 0
+IRQ_MSG             = 1 << 1
+IRQ_PANIC           = 1 << 2
+
+# CTRL_HMAC, the slot in [10:8]
+HMAC_OFF            = 0
+HMAC_MSG            = 1
+HMAC_KEY            = 2
+
+# CTRL_MSG_CFG
+MSG_SWAP            = 1 << 0
+
+EINVAL              = 0xfffffea
+EBUSY               = 0xfffffff0
+
+def sha1_blocks(msg):
+    # Pad as per RFC 3174 and split in blocks of 16 big-endian words.
+    length = len(msg) * 8
+    msg = msg + b'\x80' + b'\x00' * ((55 - len(msg)) % 64) + length.to_bytes(8, byteorder='big')
+    words = [int.from_bytes(msg[i:i+4], byteorder='big') for i in range(0, len(msg), 4)]
+    return [words[i:i+16] for i in range(0, len(words), 16)]
 
 async def test_id(dut, wbs):
     for i in range(10):
@@ -55,37 +121,81 @@ async def test_id(dut, wbs):
         val = await read_val(dut, wbs, cmd, exp);
         assert (val == exp);
         cmd = CTRL_GET_NR;
-        # First version has only 4 commands
         if (exp == 0x53484131):
-            exp = 4;
+            exp = CTRL_NR;
 
         val = await read_val(dut, wbs, cmd, exp);
         assert (val == exp);
 
-async def test_irq(dut, wbs, wrapper):
+async def wait_irq(dut, exp):
 
-    if wrapper:
-        name = dut.irq
-    else:
-        name = dut.irq_out;
+    # Watch the line, not the bus.
+    for i in range(200):
+        await ClockCycles(dut.wb_clk_i, 1)
+        if (dut.irq.value.integer & 1) == exp:
+            return
 
-    name <= 0;
-    await ClockCycles(dut.wb_clk_i, 5)
-    assert name == 0
+    assert False, "Timed out waiting for irq=%d" % exp
 
-    val = await write_val(dut, wbs, CTRL_SHA1_OPS, 1);
-    assert(val == 2);
+async def test_irq(dut, wbs, wrapper):
 
-    await ClockCycles(dut.wb_clk_i, 5)
-    assert (name == 1)
+    # Nothing enabled, nothing pending.
+    val = await write_val(dut, wbs, CTRL_SHA1_OPS, RESET);
+    assert (val & 0x3 == RESET);
+    val = await write_val(dut, wbs, CTRL_IRQ_STATUS, IRQ_BLOCK | IRQ_MSG | IRQ_PANIC);
+    assert (val == 1);
+    val = await read_val(dut, wbs, CTRL_IRQ_EN, 0);
+    assert (val == 0);
+    val = await read_val(dut, wbs, CTRL_IRQ_STATUS, 0);
+    assert (val == 0);
+    assert (dut.irq.value.integer & 1 == 0);
+
+    # "abc" with the causes latched, but not enabled ..
+    for exp in [0, 1]:
+        if exp:
+            val = await write_val(dut, wbs, CTRL_IRQ_EN, IRQ_MSG);
+            assert (val == 1);
+        val = await write_val(dut, wbs, CTRL_SHA1_OPS, RESET);
+        val = await write_val(dut, wbs, CTRL_MSG_LEN, 3);
+        val = await write_val(dut, wbs, CTRL_SHA1_OPS, FINAL);
+        val = await write_val(dut, wbs, CTRL_MSG_IN, 0x61626300);
+        assert (val == 1);
 
-    val = await write_val(dut, wbs, CTRL_SET_IRQ, 0);
-    assert(val == 1);
+        if exp:
+            # .. and enabled, no need to poll CTRL_SHA1_OPS.
+            await wait_irq(dut, 1);
+        else:
+            await wait_done(dut, wbs);
+            assert (dut.irq.value.integer & 1 == 0);
 
-    await ClockCycles(dut.wb_clk_i, 5)
-    dut._log.info("IRQ=%s" % (name.value));
+        val = await read_val(dut, wbs, CTRL_IRQ_STATUS, IRQ_BLOCK | IRQ_MSG);
+        assert (val == IRQ_BLOCK | IRQ_MSG);
+        val = await read_val(dut, wbs, CTRL_DIGEST_H0, 0xa9993e36);
+        assert (val == 0xa9993e36);
 
-    assert(name.value == 0);
+        # Only IRQ_MSG is enabled so it is the one to ack.
+        val = await write_val(dut, wbs, CTRL_IRQ_STATUS, IRQ_MSG);
+        assert (val == 1);
+        await wait_irq(dut, 0);
+        val = await read_val(dut, wbs, CTRL_IRQ_STATUS, IRQ_BLOCK);
+        assert (val == IRQ_BLOCK);
+        val = await write_val(dut, wbs, CTRL_IRQ_STATUS, IRQ_BLOCK);
+
+    # Panic sticks, but the cause is acked once.
+    val = await write_val(dut, wbs, CTRL_IRQ_EN, IRQ_PANIC);
+    assert (val == 1);
+    panics = await read_val(dut, wbs, CTRL_PERF_PANICS, 0);
+    val = await write_val(dut, wbs, CTRL_PANIC, 0xdead);
+    await wait_irq(dut, 1);
+    val = await read_val(dut, wbs, CTRL_PERF_PANICS, panics + 1);
+    assert (val == panics + 1);
+    val = await read_val(dut, wbs, CTRL_IRQ_STATUS, IRQ_PANIC);
+    assert (val == IRQ_PANIC);
+    val = await write_val(dut, wbs, CTRL_IRQ_STATUS, IRQ_PANIC);
+    await wait_irq(dut, 0);
+
+    val = await write_val(dut, wbs, CTRL_IRQ_EN, 0);
+    assert (val == 1);
 
 async def test_ops(dut, wbs, wrapper, gl):
 
@@ -129,9 +239,11 @@ async def test_msg(dut, wbs, wrapper, gl):
     if gl == 0:
         if wrapper:
             name = dut.wrapper_sha1.sha1_wishbone.message;
+            name_next = dut.wrapper_sha1.sha1_wishbone.message_next;
             idx = dut.wrapper_sha1.sha1_wishbone.sha1_msg_idx;
         else:
             name = dut.message;
+            name_next = dut.message_next;
             idx = dut.sha1_msg_idx;
 
     # Noting is running, right?
@@ -178,6 +290,12 @@ async def test_msg(dut, wbs, wrapper, gl):
             value = int(BinaryValue(str(idx.value)));
             assert (value == exp);
 
+            # Check that we wrote the value correctly in (basically loop values).
+            # Do it now as once running the engine reuses it for w[16..79].
+            value = int(BinaryValue(str(name[i].value)));
+            dut._log.info("msg[%x] = val=%x" % (i, value));
+            assert (value == i);
+
         cmd = CTRL_SHA1_OPS
         if i == 15:
           exp = 1;
@@ -194,12 +312,16 @@ async def test_msg(dut, wbs, wrapper, gl):
         val = await read_val(dut, wbs, cmd, exp);
         assert (val & 0xf == exp);
 
-    # Any writes after the sha1_on is set will return -EBUSY
+    # Any writes after the sha1_on is set go in the second buffer
     cmd = CTRL_MSG_IN;
-    exp = 0;
+    exp = 0x5a5a5a5a;
     val = await write_val(dut, wbs, cmd, exp);
 
-    assert (val == 0xfffffea);
+    assert (val == 1);
+
+    if gl == 0:
+        value = int(BinaryValue(str(name_next[0].value)));
+        assert (value == exp);
 
     # Stop the engine.
     cmd = CTRL_SHA1_OPS
@@ -215,21 +337,6 @@ async def test_msg(dut, wbs, wrapper, gl):
     val = await read_val(dut, wbs, cmd, exp);
     assert (val == exp);
 
-    if gl == 1:
-        return
-
-    #value = int(BinaryValue(str(name.value)));
-    #dut._log.info("msg=%s" % (value));
-
-    # Check that we wrote the value correctly in (basically loop values);
-    for i in range(16):
-       # dut._log.info("%d -> %d" % (512-(i*32), 512-((i+1)*32)))
-        value = str(name[i].value);
-        val = int(BinaryValue(value));
-        dut._log.info("msg[%x] = val=%x" % (i, val));
-
-        assert (val == i);
-
 
 async def test_engine(dut, wbs, wrapper, gl):
 
@@ -245,7 +352,7 @@ async def test_engine(dut, wbs, wrapper, gl):
     exp = 1 << 1 | 0; # Reset and OFF
     val = await write_val(dut, wbs, CTRL_SHA1_OPS, exp);
     assert(val == exp);
-    dut.status <= int.from_bytes(b'RESET', byteorder='big')
+    status(dut, "RESET");
 
     # Nothing is running, right?
     cmd = CTRL_SHA1_OPS
@@ -253,7 +360,11 @@ async def test_engine(dut, wbs, wrapper, gl):
     val = await read_val(dut, wbs, cmd, exp);
     assert (val == exp);
 
-    dut.status <= int.from_bytes(b'DATA_IN', byteorder='big')
+    # No digest yet.
+    val = await read_val(dut, wbs, CTRL_DIGEST_H0, EBUSY);
+    assert (val == EBUSY);
+
+    status(dut, "DATA_IN");
 
     for i in range(16):
         cmd = CTRL_MSG_IN;
@@ -267,7 +378,7 @@ async def test_engine(dut, wbs, wrapper, gl):
         val = await write_val(dut, wbs, cmd, exp);
         assert (val == 1);
 
-    dut.status <= int.from_bytes(b'COMPUTE_BEGIN', byteorder='big')
+    status(dut, "COMPUTE_BEGIN");
     cmd = CTRL_SHA1_OPS
     exp = 0x1; # It should be on
     val = await read_val(dut, wbs, cmd, exp);
@@ -290,7 +401,7 @@ async def test_engine(dut, wbs, wrapper, gl):
     exp = 1 << 3;
     val = await read_val(dut, wbs, CTRL_SHA1_OPS, exp);
     assert (val & exp);
-    dut.status <= int.from_bytes(b'COMPUTE_END', byteorder='big')
+    status(dut, "COMPUTE_END");
 
     # Five reads only
     for i in range(5):
@@ -310,7 +421,17 @@ async def test_engine(dut, wbs, wrapper, gl):
         dut._log.info("digest[%x] = val=0x%x idx=%s" % (i, val, idx));
         assert (val == exp);
 
-    dut.status <= int.from_bytes(b'DONE', byteorder='big')
+    # The same words one address each, backwards and one of them twice.
+    digest = [0xa9993e36, 0x4706816a, 0xba3e2571, 0x7850c26c, 0x9cd0d89d];
+    for i in [4, 3, 2, 2, 1, 0]:
+        val = await read_val(dut, wbs, CTRL_DIGEST_H0 + 4 * i, digest[i]);
+        assert (val == digest[i]);
+
+    # Which leaves CTRL_SHA1_DIGEST where it was.
+    val = await read_val(dut, wbs, CTRL_SHA1_DIGEST, digest[0]);
+    assert (val == digest[0]);
+
+    status(dut, "DONE");
 
 
 async def activate_wrapper(dut):
@@ -324,10 +445,7 @@ async def activate_wrapper(dut):
     dut.la_data_in <= 0
 
     dut._log.info("io_out=%s" % (dut.io_out.value));
-    # We get these annoying 'ZZ' in there, so we do this dance to get rid of it.
-    value = BinaryValue(str(dut.io_out.value)[:-8].replace('z','').replace('x',''));
-
-    assert(str(value) == "");
+    assert (io_off(dut.io_out.value));
 
     await ClockCycles(dut.wb_clk_i, 100)
 
@@ -346,17 +464,26 @@ async def activate_wrapper(dut):
 async def test_wb_logic(dut):
     clock = Clock(dut.wb_clk_i, 10, units="ns")
     cocotb.fork(clock.start())
+    signals_dict = {"cyc":  "cyc_i",
+                  "stb":  "stb_i",
+                  "we":   "we_i",
+                  "adr":  "adr_i",
+                  "datwr":"dat_i",
+                  "datrd":"dat_o",
+                  "ack":  "ack_o",
+                  "sel": "sel_i"}
+    # Only sha1_wb built with PIPELINED=1 (make test_wb_pipelined) has a stall.
+    pipelined = False
+    try:
+        pipelined = int(dut.PIPELINED.value) == 1
+    except:
+        pass
+    if pipelined:
+        signals_dict["stall"] = "stall_o"
     wbs = WishboneMaster(dut, "wbs", dut.wb_clk_i,
                           width=32,   # size of data bus
-                          timeout=10, # in clock cycle number
-                          signals_dict={"cyc":  "cyc_i",
-                                      "stb":  "stb_i",
-                                      "we":   "we_i",
-                                      "adr":  "adr_i",
-                                      "datwr":"dat_i",
-                                      "datrd":"dat_o",
-                                      "ack":  "ack_o",
-                                      "sel": "sel_i"})
+                          timeout=100, # in clock cycle number, CTRL_MSG_IN can hold off for a block
+                          signals_dict=signals_dict)
     gl = False
     try:
         dut.wrapper_sha1.vssd1 <= 0
@@ -390,3 +517,528 @@ async def test_wb_logic(dut):
     await test_msg(dut, wbs, wrapper, gl);
 
     await test_engine(dut, wbs, wrapper, gl);
+
+    await test_stream(dut, wbs);
+
+    await test_pad(dut, wbs);
+
+    await test_overlap(dut, wbs);
+
+    await test_burst(dut, wbs, pipelined);
+
+    await test_driver(dut, wbs, wrapper, gl);
+
+    if not gl:
+        await test_context(dut, wbs);
+        await test_hmac(dut, wbs);
+        await test_lanes(dut, wbs);
+        await test_perf(dut, wbs);
+
+    # Last, it leaves sha1_panic set.
+    await test_irq(dut, wbs, wrapper);
+
+async def wait_done(dut, wbs):
+
+    for i in range(200):
+        val = await read_val(dut, wbs, CTRL_SHA1_OPS, DONE);
+        if (val & DONE):
+            return val;
+
+    assert False, "Timed out waiting for DONE"
+
+async def sha1_digest(dut, wbs):
+
+    digest = 0
+    for i in range(5):
+        val = await read_val(dut, wbs, CTRL_SHA1_DIGEST, 0);
+        digest = digest << 32 | val;
+
+    return digest.to_bytes(20, byteorder='big')
+
+async def test_stream(dut, wbs):
+
+    # Nothing to continue from.
+    val = await write_val(dut, wbs, CTRL_SHA1_OPS, RESET);
+    assert (val & 0x3 == RESET);
+    val = await write_val(dut, wbs, CTRL_SHA1_OPS, CONTINUE);
+    assert (val == EINVAL);
+
+    random.seed(0x5a1)
+    for size in [0, 3, 55, 56, 64, 119, 1000, 4096]:
+        msg = bytes(random.getrandbits(8) for i in range(size))
+
+        status(dut, "STREAM %d" % (size));
+        # Start a new message.
+        val = await write_val(dut, wbs, CTRL_SHA1_OPS, RESET);
+        # DONE is still set from the previous message (until the reset is done).
+        assert (val & 0x3 == RESET);
+
+        for i, block in enumerate(sha1_blocks(msg)):
+            if i:
+                # Keep h0..h4 for the next block.
+                val = await write_val(dut, wbs, CTRL_SHA1_OPS, CONTINUE);
+                assert (val & 0xf == 0);
+
+            for word in block:
+                val = await write_val(dut, wbs, CTRL_MSG_IN, word);
+                assert (val == 1);
+
+            await wait_done(dut, wbs);
+
+        digest = await sha1_digest(dut, wbs);
+        dut._log.info("%d bytes: digest=%s" % (size, digest.hex()));
+        assert (digest == hashlib.sha1(msg).digest());
+
+async def test_pad(dut, wbs):
+
+    # FINAL pads with CTRL_MSG_LEN, without one since RESET it is EINVAL ..
+    val = await write_val(dut, wbs, CTRL_SHA1_OPS, RESET);
+    val = await write_val(dut, wbs, CTRL_SHA1_OPS, FINAL);
+    assert (val == EINVAL);
+    # .. and after it the length can not change under the padding.
+    val = await write_val(dut, wbs, CTRL_MSG_LEN, 3);
+    assert (val == 1);
+    val = await write_val(dut, wbs, CTRL_SHA1_OPS, FINAL);
+    assert (val & 0xf == 0);
+    val = await write_val(dut, wbs, CTRL_MSG_LEN, 4);
+    assert (val == EINVAL);
+    val = await write_val(dut, wbs, CTRL_MSG_IN, 0x61626300);
+    assert (val == 1);
+    await wait_done(dut, wbs);
+    assert (await sha1_digest(dut, wbs) == hashlib.sha1(b'abc').digest());
+
+    random.seed(0xf1a1)
+    for size in [0, 1, 2, 3, 4, 54, 55, 56, 57, 59, 60, 61, 62, 63, 64, 65, 119, 120, 127, 128, 1000]:
+        msg = bytes(random.getrandbits(8) for i in range(size))
+
+        status(dut, "PAD %d" % (size));
+        val = await write_val(dut, wbs, CTRL_SHA1_OPS, RESET);
+        assert (val & 0x3 == RESET);
+
+        val = await write_val(dut, wbs, CTRL_MSG_LEN, size);
+        assert (val == 1);
+        val = await read_val(dut, wbs, CTRL_MSG_LEN, size);
+        assert (val == size);
+
+        # The full blocks go in as before ..
+        full = size - size % 64;
+        for i in range(0, full, 64):
+            if i:
+                val = await write_val(dut, wbs, CTRL_SHA1_OPS, CONTINUE);
+                assert (val & 0xf == 0);
+            for j in range(i, i + 64, 4):
+                val = await write_val(dut, wbs, CTRL_MSG_IN, int.from_bytes(msg[j:j+4], byteorder='big'));
+                assert (val == 1);
+            await wait_done(dut, wbs);
+
+        # .. and the engine pads what is left.
+        ops = FINAL
+        if full:
+            ops |= CONTINUE
+        val = await write_val(dut, wbs, CTRL_SHA1_OPS, ops);
+        assert (val & 0xf == 0);
+
+        tail = msg[full:]
+        for j in range(0, len(tail), 4):
+            word = tail[j:j+4];
+            val = await write_val(dut, wbs, CTRL_MSG_IN, int.from_bytes(word + b'\x00' * (4 - len(word)), byteorder='big'));
+            assert (val == 1);
+
+        await wait_done(dut, wbs);
+
+        digest = await sha1_digest(dut, wbs);
+        dut._log.info("%d bytes: digest=%s" % (size, digest.hex()));
+        assert (digest == hashlib.sha1(msg).digest());
+
+async def test_overlap(dut, wbs):
+
+    random.seed(0xb10c)
+    for size in [64, 128, 640]:
+        msg = bytes(random.getrandbits(8) for i in range(size))
+
+        status(dut, "OVERLAP %d" % (size));
+        val = await write_val(dut, wbs, CTRL_SHA1_OPS, RESET);
+        assert (val & 0x3 == RESET);
+
+        val = await write_val(dut, wbs, CTRL_MSG_LEN, size);
+        assert (val == 1);
+
+        # No polling between the blocks: the second buffer takes the next
+        # block while this one is computed, and after that the bus is held.
+        for j in range(0, size, 4):
+            if j == 64:
+                start = get_sim_time(units='ns');
+            val = await write_val(dut, wbs, CTRL_MSG_IN, int.from_bytes(msg[j:j+4], byteorder='big'));
+            assert (val == 1);
+
+        await wait_done(dut, wbs);
+
+        if size > 64:
+            # From the start of the second block the engine should not
+            # have had to wait on the bus.
+            cycles = (get_sim_time(units='ns') - start) / 10;
+            blocks = size // 64 - 1;
+            dut._log.info("%d blocks in %d cycles" % (blocks, cycles));
+            assert (cycles < (blocks + 1) * 82 + 40);
+
+        val = await write_val(dut, wbs, CTRL_SHA1_OPS, FINAL | CONTINUE);
+        assert (val & 0xf == 0);
+        await wait_done(dut, wbs);
+
+        digest = await sha1_digest(dut, wbs);
+        dut._log.info("%d bytes: digest=%s" % (size, digest.hex()));
+        assert (digest == hashlib.sha1(msg).digest());
+
+async def wb_burst(dut, ops, pipelined):
+
+    # WishboneMaster waits for the ack of every operation before it starts
+    # the next one, so drive the bus by hand to keep it busy. ops is a list
+    # of (address, data), data is None for reads.
+    res = []
+    issued = 0
+    cycles = 0
+    dut.wbs_cyc_i <= 1
+    dut.wbs_sel_i <= 0xf
+    while len(res) < len(ops):
+        if issued < len(ops):
+            adr, dat = ops[issued]
+            dut.wbs_stb_i <= 1
+            dut.wbs_adr_i <= adr
+            dut.wbs_we_i <= int(dat is not None)
+            dut.wbs_dat_i <= dat if dat is not None else 0
+        else:
+            dut.wbs_stb_i <= 0
+
+        # What the slave sees on the next rising edge.
+        await FallingEdge(dut.wb_clk_i)
+        ack = dut.wbs_ack_o.value == 1
+        if ack:
+            res.append(dut.wbs_dat_o.value.integer)
+        if issued < len(ops):
+            if pipelined:
+                # Taken on this edge unless stalled, the ack comes later.
+                if dut.wbs_stall_o.value == 0:
+                    issued += 1
+            elif ack:
+                issued += 1
+
+        await RisingEdge(dut.wb_clk_i)
+        cycles += 1
+        assert cycles < 1000, "Burst timed out"
+
+    dut.wbs_stb_i <= 0
+    dut.wbs_cyc_i <= 0
+    dut.wbs_we_i <= 0
+    return res, cycles
+
+async def test_burst(dut, wbs, pipelined):
+
+    random.seed(0xb5)
+    size = 192
+    msg = bytes(random.getrandbits(8) for i in range(size))
+    words = [int.from_bytes(msg[j:j+4], byteorder='big') for j in range(0, size, 4)]
+
+    status(dut, "BURST %d" % (size));
+    val = await write_val(dut, wbs, CTRL_SHA1_OPS, RESET);
+    assert (val & 0x3 == RESET);
+    val = await write_val(dut, wbs, CTRL_MSG_LEN, size);
+    assert (val == 1);
+
+    # Both buffers take a block straight away ..
+    res, cycles = await wb_burst(dut, [(CTRL_MSG_IN, w) for w in words[:32]], pipelined);
+    assert (res == [1] * 32);
+    bus = 32 / cycles
+    dut._log.info("32 writes in %d cycles (%d%% of the bus)" % (cycles, 100 * bus));
+    if pipelined:
+        assert (cycles <= 32 + 1);
+
+    # .. and the third one waits (stall or no ack) until the engine takes one.
+    res, cycles = await wb_burst(dut, [(CTRL_MSG_IN, w) for w in words[32:]], pipelined);
+    assert (res == [1] * 16);
+    dut._log.info("16 writes held off for %d cycles" % (cycles));
+
+    await wait_done(dut, wbs);
+    val = await write_val(dut, wbs, CTRL_SHA1_OPS, FINAL | CONTINUE);
+    assert (val & 0xf == 0);
+    await wait_done(dut, wbs);
+
+    res, cycles = await wb_burst(dut, [(CTRL_SHA1_DIGEST, None)] * 5, pipelined);
+    dut._log.info("5 reads in %d cycles" % (cycles));
+    if pipelined:
+        assert (cycles <= 5 + 1);
+
+    digest = b''.join(val.to_bytes(4, byteorder='big') for val in res)
+    dut._log.info("%d bytes: digest=%s" % (size, digest.hex()));
+    assert (digest == hashlib.sha1(msg).digest());
+
+async def chunks(msg, sizes):
+    # Like a socket would hand them out.
+    j = 0
+    for size in sizes:
+        yield msg[j:j+size]
+        j += size
+    yield msg[j:]
+
+async def test_driver(dut, wbs, wrapper, gl):
+
+    if gl:
+        done = None
+    elif wrapper:
+        done = dut.wrapper_sha1.sha1_wishbone.done
+    else:
+        done = dut.done
+
+    random.seed(0xd71e)
+    for mode in ["poll", "done", "irq"]:
+        if mode == "done" and done is None:
+            continue
+        status(dut, "DRIVER %s" % (mode));
+        sha1 = Sha1Driver(dut, wbs, done=done if mode == "done" else None,
+                          irq=dut.irq if mode == "irq" else None)
+
+        for size in [0, 3, 55, 56, 64, 65, 200, 700]:
+            msg = bytes(random.getrandbits(8) for i in range(size))
+            await sha1.reset()
+            if size % 3 == 0:
+                await sha1.update(msg)
+            elif size % 3 == 1:
+                # Split at random, short ones and ones over a block.
+                cuts = sorted(random.sample(range(size + 1), 3))
+                await sha1.update(msg[i:j] for i, j in zip([0] + cuts, cuts + [size]))
+            else:
+                await sha1.update(chunks(msg, [random.randrange(100) for i in range(4)]))
+            digest = await sha1.hexdigest()
+            dut._log.info("%s %d bytes: digest=%s" % (mode, size, digest));
+            assert (digest == hashlib.sha1(msg).hexdigest());
+
+    # test_irq wants them off.
+    val = await write_val(dut, wbs, CTRL_IRQ_EN, 0);
+    assert (val == 1);
+
+async def test_context(dut, wbs):
+
+    # Not while a block is being hashed.
+    msg = bytes(range(64))
+    val = await write_val(dut, wbs, CTRL_SHA1_OPS, RESET);
+    for w in Sha1Driver.words(msg):
+        await write_val(dut, wbs, CTRL_MSG_IN, w);
+    val = await write_val(dut, wbs, CTRL_DIGEST_H0, 0x12345678);
+    assert (val == EBUSY);
+    await wait_done(dut, wbs);
+    val = await read_val(dut, wbs, CTRL_DIGEST_H0, 0);
+    assert (val != 0x12345678);
+    val = await read_val(dut, wbs, CTRL_MSG_HASHED, 64);
+    assert (val == 64);
+
+    # Streams taking turns on the one engine, a few blocks each time.
+    random.seed(0xc0de)
+    msgs = [bytes(random.getrandbits(8) for i in range(random.randrange(600))) for n in range(4)]
+    streams = [Sha1Driver(dut, wbs) for msg in msgs]
+    pos = [0] * len(msgs)
+    for s in streams:
+        await s.reset()
+        await s.save()
+    while any(pos[n] < len(msg) for n, msg in enumerate(msgs)):
+        n = random.choice([n for n, msg in enumerate(msgs) if pos[n] < len(msg)])
+        status(dut, "CONTEXT %d" % (n));
+        size = random.randrange(1, 200)
+        await streams[n].restore()
+        await streams[n].update(msgs[n][pos[n]:pos[n] + size])
+        await streams[n].save()
+        pos[n] += size
+
+    for n, msg in enumerate(msgs):
+        await streams[n].restore()
+        digest = await streams[n].hexdigest()
+        dut._log.info("stream %d %d bytes: digest=%s" % (n, len(msg), digest));
+        assert (digest == hashlib.sha1(msg).hexdigest());
+
+async def test_hmac(dut, wbs):
+
+    # No key in it yet.
+    val = await write_val(dut, wbs, CTRL_HMAC, HMAC_MSG | 1 << 8);
+    assert (val == EINVAL);
+
+    random.seed(0x4a4c)
+    keys = [b'key', bytes(range(64)), bytes(random.getrandbits(8) for i in range(100))]
+    sha1 = Sha1Driver(dut, wbs)
+    await sha1.set_key(0, keys[0])
+    await sha1.set_key(1, keys[1])
+    val = await read_val(dut, wbs, CTRL_HMAC, 0x31 << 8);
+    assert (val == (0x3 << 16 | 1 << 8 | HMAC_MSG));
+
+    # Slots past HMAC_SLOTS (2) are not there, with a key or without.
+    for op in [HMAC_MSG | 2 << 8, HMAC_MSG | 7 << 8, HMAC_KEY | 2 << 8]:
+        val = await write_val(dut, wbs, CTRL_HMAC, op);
+        assert (val == EINVAL);
+    val = await read_val(dut, wbs, CTRL_HMAC, 0x31 << 8);
+    assert (val == (0x3 << 16 | 1 << 8 | HMAC_MSG));
+
+    # Taking turns, with the extra block for the length and without.
+    slots = [keys[0], keys[1]]
+    for size in [0, 3, 55, 56, 64, 119, 120, 200]:
+        for slot in range(2):
+            status(dut, "HMAC %d %d" % (slot, size));
+            msg = bytes(random.getrandbits(8) for i in range(size))
+            await sha1.use_key(slot)
+            await sha1.reset()
+            await sha1.update(msg)
+            mac = await sha1.hexdigest()
+            dut._log.info("hmac slot %d %d bytes: %s" % (slot, size, mac));
+            assert (mac == hmac.new(slots[slot], msg, 'sha1').hexdigest());
+        if size == 64:
+            # A new key in a slot, one that is hashed first.
+            await sha1.set_key(0, keys[2])
+            slots[0] = keys[2]
+
+    # And back to plain SHA-1.
+    await sha1.use_key(None)
+    await sha1.reset()
+    await sha1.update(b'abc')
+    assert (await sha1.hexdigest() == hashlib.sha1(b'abc').hexdigest());
+
+def lane_ops(data, swap):
+    # data as CTRL_MSG_IN writes of one to four bytes, in random lanes and
+    # with junk in the others. Without MSG_SWAP the first byte is in the
+    # top lane written, with it in the bottom one.
+    ops = []
+    j = 0
+    while j < len(data):
+        chunk = data[j:j + random.randrange(1, 5)]
+        lanes = sorted(random.sample(range(4), len(chunk)), reverse=not swap)
+        dat = random.getrandbits(32)
+        sel = 0
+        for lane, byte in zip(lanes, chunk):
+            dat = dat & ~(0xff << 8 * lane) | byte << 8 * lane
+            sel |= 1 << lane
+        ops.append(WBOp(CTRL_MSG_IN, dat=dat, sel=sel))
+        j += len(chunk)
+    return ops
+
+async def test_lanes(dut, wbs):
+
+    val = await read_val(dut, wbs, CTRL_MSG_CFG, 0);
+    assert (val == 0);
+
+    # Half a word waits for the rest, RESET drops it.
+    val = await write_val(dut, wbs, CTRL_SHA1_OPS, RESET);
+    wbRes = await wbs.send_cycle([WBOp(CTRL_MSG_IN, dat=0x1234, sel=0x3)]);
+    assert (wbRes[0].datrd.integer == 1);
+    val = await read_val(dut, wbs, CTRL_MSG_CFG, 2 << 4);
+    assert (val == 2 << 4);
+    val = await write_val(dut, wbs, CTRL_SHA1_OPS, RESET);
+    val = await read_val(dut, wbs, CTRL_MSG_CFG, 0);
+    assert (val == 0);
+
+    random.seed(0x5e1)
+    for swap in [0, MSG_SWAP]:
+        val = await write_val(dut, wbs, CTRL_MSG_CFG, swap);
+        assert (val == 1);
+        for size in [0, 1, 3, 6, 55, 56, 63, 64, 65, 130, 200]:
+            msg = bytes(random.getrandbits(8) for i in range(size))
+
+            status(dut, "LANES %d %d" % (swap, size));
+            val = await write_val(dut, wbs, CTRL_SHA1_OPS, RESET);
+            val = await write_val(dut, wbs, CTRL_MSG_LEN, size);
+
+            # The full blocks in one go, the bus is held while both buffers are full ..
+            full = size - size % 64;
+            if full:
+                wbRes = await wbs.send_cycle(lane_ops(msg[:full], swap));
+                assert all(r.datrd.integer == 1 for r in wbRes);
+                await wait_done(dut, wbs);
+
+            # .. and the rest, the last word short of bytes.
+            val = await write_val(dut, wbs, CTRL_SHA1_OPS, FINAL | CONTINUE if full else FINAL);
+            assert (val & 0xf == 0);
+            if full < size:
+                wbRes = await wbs.send_cycle(lane_ops(msg[full:], swap));
+                assert all(r.datrd.integer == 1 for r in wbRes);
+            await wait_done(dut, wbs);
+
+            digest = await sha1_digest(dut, wbs);
+            dut._log.info("swap %d %d bytes: digest=%s" % (swap, size, digest.hex()));
+            assert (digest == hashlib.sha1(msg).digest());
+
+    # The words of a byte buffer as they are in memory.
+    msg = b'abc'
+    val = await write_val(dut, wbs, CTRL_SHA1_OPS, RESET);
+    val = await write_val(dut, wbs, CTRL_MSG_LEN, len(msg));
+    val = await write_val(dut, wbs, CTRL_SHA1_OPS, FINAL);
+    val = await write_val(dut, wbs, CTRL_MSG_IN, int.from_bytes(msg + b'\x00', byteorder='little'));
+    assert (val == 1);
+    await wait_done(dut, wbs);
+    assert (await sha1_digest(dut, wbs) == hashlib.sha1(msg).digest());
+
+    val = await write_val(dut, wbs, CTRL_MSG_CFG, 0);
+    assert (val == 1);
+
+async def perf_counters(dut, wbs):
+    wbRes = await wbs.send_cycle([WBOp(adr) for adr in range(CTRL_PERF_BUSY, CTRL_PERF_PANICS + 4, 4)]);
+    return [r.datrd.integer for r in wbRes]
+
+async def test_perf(dut, wbs):
+
+    # They count from reset, clear them.
+    wbRes = await wbs.send_cycle([WBOp(adr, dat=0) for adr in range(CTRL_PERF_BUSY, CTRL_PERF_PANICS + 4, 4)]);
+    assert all(r.datrd.integer == 1 for r in wbRes);
+
+    # Nothing to read or continue from yet.
+    val = await write_val(dut, wbs, CTRL_SHA1_OPS, RESET);
+    val = await read_val(dut, wbs, CTRL_SHA1_DIGEST, EBUSY);
+    assert (val == EBUSY);
+    val = await read_val(dut, wbs, CTRL_DIGEST_H0 + 8, EBUSY);
+    assert (val == EBUSY);
+    val = await write_val(dut, wbs, CTRL_SHA1_OPS, CONTINUE);
+    assert (val == EINVAL);
+    busy, blocks, padded, rejects, early, panics = await perf_counters(dut, wbs)
+    assert ((busy, blocks, padded, rejects, early, panics) == (0, 0, 0, 1, 2, 0));
+
+    # One block, two with the length in the second, and three more the
+    # host padded itself that PADDED does not count.
+    for msg in [b'abc', bytes(range(60))]:
+        val = await write_val(dut, wbs, CTRL_SHA1_OPS, RESET);
+        val = await write_val(dut, wbs, CTRL_MSG_LEN, len(msg));
+        val = await write_val(dut, wbs, CTRL_SHA1_OPS, FINAL);
+        for w in Sha1Driver.words(msg):
+            val = await write_val(dut, wbs, CTRL_MSG_IN, w);
+            assert (val == 1);
+        await wait_done(dut, wbs);
+        assert (await sha1_digest(dut, wbs) == hashlib.sha1(msg).digest());
+
+    msg = bytes(range(130))
+    val = await write_val(dut, wbs, CTRL_SHA1_OPS, RESET);
+    for i, block in enumerate(sha1_blocks(msg)):
+        if i:
+            val = await write_val(dut, wbs, CTRL_SHA1_OPS, CONTINUE);
+        for word in block:
+            val = await write_val(dut, wbs, CTRL_MSG_IN, word);
+        # Not while it is hashing.
+        if i == 0:
+            val = await write_val(dut, wbs, CTRL_DIGEST_H0, 0);
+            assert (val == EBUSY);
+        await wait_done(dut, wbs);
+    assert (await sha1_digest(dut, wbs) == hashlib.sha1(msg).digest());
+
+    busy, blocks, padded, rejects, early, panics = await perf_counters(dut, wbs)
+    dut._log.info("perf: busy %d blocks %d padded %d rejects %d early %d panics %d" %
+                  (busy, blocks, padded, rejects, early, panics));
+    assert ((blocks, padded, rejects, early, panics) == (6, 2, 2, 2, 0));
+    # 82 clocks a block, and the padding.
+    assert (busy >= blocks * 82 and busy < blocks * 82 + 200);
+
+    try:
+        perf_la = int(dut.PERF_LA.value) == 1
+    except:
+        perf_la = False
+    if perf_la:
+        val = dut.chicken_bits_out.value.integer
+        assert (val == (blocks & 0x1ff) << 7 | (rejects & 0xf) << 3 | (panics & 0x3) << 1);
+
+    # Cleared one at a time.
+    val = await write_val(dut, wbs, CTRL_PERF_BLOCKS, 0);
+    assert (val == 1);
+    val = await read_val(dut, wbs, CTRL_PERF_BLOCKS, 0);
+    assert (val == 0);
+    val = await read_val(dut, wbs, CTRL_PERF_PADDED, padded);
+    assert (val == padded);
@@ -17,6 +17,8 @@ from cocotb.clock import Clock
 from cocotb.binary import BinaryValue
 from cocotb.triggers import ClockCycles
 
+from test.test_wb_logic import io_off
+
 @cocotb.test()
 async def test_wrapper(dut):
     clock = Clock(dut.wb_clk_i, 10, units="ns")
@@ -64,10 +66,7 @@ async def test_wrapper(dut):
     dut.la_data_in <= 0
 
     dut._log.info("io_out=%s" % (dut.io_out.value));
-    # We get these annoying 'ZZ' in there, so we do this dance to get rid of it.
-    value = BinaryValue(str(dut.io_out.value)[:-8].replace('z','').replace('x',''));
-
-    assert(str(value) == "");
+    assert (io_off(dut.io_out.value));
 
     await ClockCycles(dut.wb_clk_i, 100)
 
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2021 Konrad Rzeszutek Wilk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Synthesizes sha1_wb as it is in a git revision and as it is now, and says
+# what fmax each gets: yosys and abc onto the sky130 cells, OpenSTA for the
+# worst path at CLOCK_PERIOD from config.tcl. Without OpenSTA (or the PDK)
+# it is the gate levels (yosys' ltp, Kogge-Stone adders, no abc) of the
+# logic going into the round registers a and ekw_s/ekw_c instead.
+#
+# There is no default for --before, against itself it would say nothing;
+# make timing picks the revision before the round adder was retimed.
+#
+#   python3 -m test.timing --before HEAD~1
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT        = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE      = "src/sha1_wb.v"
+LIBERTY     = os.path.join(os.environ.get("PDK_ROOT", ""), "sky130A/libs.ref/sky130_fd_sc_hd/lib",
+                           "sky130_fd_sc_hd__tt_025C_1v80.lib")
+
+def clock_period():
+    with open(os.path.join(ROOT, "config.tcl")) as f:
+        m = re.search(r'CLOCK_PERIOD\)\s+"([0-9.]+)"', f.read())
+    return float(m.group(1)) if m else 10.0
+
+def source(rev, tmp):
+    # The working tree for None, else what git has.
+    if rev is None:
+        return os.path.join(ROOT, SOURCE)
+    path = os.path.join(tmp, "sha1_wb_%s.v" % re.sub(r'\W', '_', rev))
+    with open(path, "wb") as f:
+        f.write(subprocess.check_output(["git", "-C", ROOT, "show", "%s:%s" % (rev, SOURCE)]))
+    return path
+
+def yosys(script, log):
+    subprocess.check_call(["yosys", "-q", "-l", log, "-p", script])
+    with open(log) as f:
+        return f.read()
+
+def sta(netlist, period, tmp):
+    # Worst setup slack on wb_clk_i, the inputs and outputs are left alone.
+    tcl = os.path.join(tmp, "sta.tcl")
+    with open(tcl, "w") as f:
+        f.write("read_liberty %s\n" % LIBERTY)
+        f.write("read_verilog %s\n" % netlist)
+        f.write("link_design sha1_wb\n")
+        f.write("create_clock -name wb_clk_i -period %f [get_ports wb_clk_i]\n" % period)
+        f.write("report_checks -path_delay max -group_count 1 -format end\n")
+        f.write("report_worst_slack -max -digits 3\n")
+        f.write("exit\n")
+    out = subprocess.check_output(["sta", "-no_splash", "-exit", tcl], text=True)
+    m = re.search(r'worst slack\s+(-?[0-9.]+)', out)
+    return float(m.group(1))
+
+def measure(path, period, tmp, use_sta):
+    name = os.path.splitext(os.path.basename(path))[0]
+    read = "read_verilog -DMPRJ_IO_PADS=38 %s; " % path
+    if use_sta:
+        netlist = os.path.join(tmp, name + ".netlist.v")
+        yosys(read + "synth -top sha1_wb -flatten; dfflibmap -liberty %s; "
+              "abc -D %d -liberty %s; opt_clean -purge; write_verilog -noattr %s"
+              % (LIBERTY, period * 1000, LIBERTY, netlist), os.path.join(tmp, name + ".log"))
+        slack = sta(netlist, period, tmp)
+        return {"path": "%.3f ns" % (period - slack), "fmax": "%.1f MHz" % (1000.0 / (period - slack))}
+
+    # abc would make the adders ripple-carry for the area, and the bus
+    # decode from wbs_adr_i is longer than any of it.
+    log = yosys(read + "synth -top sha1_wb -flatten -run begin:fine; memory_map; opt -fast; "
+                "techmap -map +/choices/kogge-stone.v -map +/techmap.v; opt -fast; "
+                "select -set round w:a w:ekw* %u %ci1 %ci*:-[Q]; ltp -noff @round",
+                os.path.join(tmp, name + ".log"))
+    m = re.search(r'Longest topological path in \S+ \(length=(\d+)\)', log)
+    return {"path": "%s levels" % m.group(1), "fmax": "-"}
+
+def main():
+    parser = argparse.ArgumentParser(description="fmax of sha1_wb before and after")
+    parser.add_argument("--before", required=True, help="git revision to compare against")
+    parser.add_argument("--period", type=float, default=clock_period(), help="clock period in ns")
+    args = parser.parse_args()
+
+    if shutil.which("yosys") is None:
+        print("yosys is needed", file=sys.stderr)
+        return 1
+    use_sta = shutil.which("sta") is not None and os.path.exists(LIBERTY)
+    if not use_sta:
+        print("No OpenSTA or %s, logic depth only" % LIBERTY, file=sys.stderr)
+
+    tmp = tempfile.mkdtemp(prefix="timing")
+    try:
+        print("%-20s %14s %12s" % ("sha1_wb", "worst path", "fmax"))
+        for label, rev in [(args.before, args.before), ("working tree", None)]:
+            r = measure(source(rev, tmp), args.period, tmp, use_sta)
+            print("%-20s %14s %12s" % (label, r["path"], r["fmax"]))
+    finally:
+        shutil.rmtree(tmp)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())